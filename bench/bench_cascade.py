@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк каскада моделей: точность и время при разных порогах эскалации.
+Заглушка отвечает за две модели: быстрая ошибается на части товаров
+(с низкой уверенностью), точная медленнее в несколько раз.
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python bench/bench_cascade.py
+    python bench/bench_cascade.py --error-rate 0.3 --thresholds 0.6,0.7,0.8,0.9
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "src"))
+
+from cascade import DEFAULT_FAST_MODEL
+from ml_model import ProductClassifier
+from ollama_stub import OllamaStubServer, noisy_responder
+
+ACCURATE_MODEL = "t-pro-it-2.0-optimized"
+
+
+def load_examples() -> list:
+    """Размеченные товары из примеров для дообучения"""
+    with open(ROOT / "data" / "training_examples.json", 'r', encoding='utf-8') as f:
+        return [({"name": item["input"], "description": ""}, json.loads(item["output"])["category"])
+                for item in json.load(f)]
+
+
+def make_responder(error_rate: float, fast_latency: float, accurate_latency: float):
+    """Ответы заглушки: шум для быстрой модели, задержка на товар для каждой модели"""
+    noisy = noisy_responder(error_rate, models=[DEFAULT_FAST_MODEL])
+
+    def respond(prompt: str, payload: dict) -> str:
+        items = max(prompt.count("Товар:"), 1)
+        fast = payload.get("model", "").startswith(DEFAULT_FAST_MODEL)
+        time.sleep(items * (fast_latency if fast else accurate_latency))
+        return noisy(prompt, payload)
+
+    return respond
+
+
+def run(host: str, examples: list, batch_size: int, model: str = ACCURATE_MODEL,
+        cascade: bool = False, threshold: float = 0.8) -> dict:
+    """Классифицировать примеры батчами; точность, время и доля эскалаций"""
+    classifier = ProductClassifier(backend="http", host=host, model=model, keep_warm=False,
+                                   cascade=cascade or None, cascade_thresholds=threshold)
+    classifier.load_model()
+    correct = 0
+    start_time = time.perf_counter()
+    for offset in range(0, len(examples), batch_size):
+        batch = examples[offset:offset + batch_size]
+        results = classifier.classify_products_batch([product for product, _ in batch], show_progress=False)
+        correct += sum(result.get("predicted_category") == label for result, (_, label) in zip(results, batch))
+    elapsed_time = time.perf_counter() - start_time
+    stats = classifier.cascade.get_stats() if classifier.cascade is not None else {}
+    classifier.close()
+    return {
+        "accuracy": correct / len(examples),
+        "ms_per_item": elapsed_time / len(examples) * 1000,
+        "escalation_rate": stats.get("escalation_rate", 0.0),
+    }
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Бенчмарк каскада быстрой и точной модели")
+    parser.add_argument("--error-rate", type=float, default=0.25, help="Доля ошибок быстрой модели")
+    parser.add_argument("--fast-latency", type=float, default=0.005, help="Быстрая модель, сек на товар")
+    parser.add_argument("--accurate-latency", type=float, default=0.03, help="Точная модель, сек на товар")
+    parser.add_argument("--thresholds", default="0.6,0.7,0.8,0.9")
+    parser.add_argument("--batch-size", type=int, default=7)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    examples = load_examples() * args.repeats
+    stub = OllamaStubServer(
+        models=[f"{ACCURATE_MODEL}:latest", f"{DEFAULT_FAST_MODEL}:latest"],
+        responder=make_responder(args.error_rate, args.fast_latency, args.accurate_latency)
+    ).start()
+    try:
+        rows = [
+            ("точная модель", run(stub.url, examples, args.batch_size)),
+            ("быстрая модель", run(stub.url, examples, args.batch_size, model=DEFAULT_FAST_MODEL)),
+        ]
+        for threshold in (float(value) for value in args.thresholds.split(",")):
+            rows.append((f"каскад, порог {threshold:g}",
+                         run(stub.url, examples, args.batch_size, cascade=True, threshold=threshold)))
+    finally:
+        stub.stop()
+
+    print(f"📦 {len(examples)} размеченных товаров, батч {args.batch_size}, "
+          f"ошибки быстрой модели {args.error_rate:.0%}")
+    for name, row in rows:
+        print(f"{name:>20}: точность {row['accuracy']:6.1%}, {row['ms_per_item']:6.1f} мс/товар, "
+              f"эскалаций {row['escalation_rate']:5.1%}")
+
+
+if __name__ == "__main__":
+    main()
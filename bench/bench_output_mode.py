@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк режимов ответа: подробный JSON с обоснованием, компактные строки
+и один токен с вероятностями (logprob)
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python bench/bench_output_mode.py                       # встроенная заглушка Ollama
+    python bench/bench_output_mode.py --host 127.0.0.1:11434 --batch 10
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "src"))
+
+from ml_model import ProductClassifier
+from ollama_stub import OllamaStubServer
+
+
+def load_products() -> list:
+    """Товары из примера сырых данных"""
+    with open(ROOT / "data" / "example_raw_data.json", 'r', encoding='utf-8') as f:
+        return [{"name": item["name"], "description": ""} for item in json.load(f)]
+
+
+def run_mode(classifier: ProductClassifier, products: list, batch: int, repeats: int) -> dict:
+    """Прогнать товары одиночными запросами (batch=1) или батчами и собрать счетчики"""
+    if classifier.output_mode == "logprob":
+        # Режим logprob всегда оценивает товары по одному
+        batch = 1
+    totals = {"requests": 0, "eval_count": 0, "prompt_eval_count": 0, "wall": 0.0, "correct": 0}
+    for _ in range(repeats):
+        for start in range(0, len(products), batch):
+            chunk = products[start:start + batch]
+            if batch == 1:
+                prompt = classifier._create_classification_prompt(chunk[0])
+                format, options = classifier._output_format(), classifier._generation_options()
+            else:
+                prompt = classifier._create_batch_prompt(chunk)
+                format = classifier._output_format(batch=True)
+                options = classifier._generation_options(len(chunk))
+
+            top_logprobs = classifier._top_logprobs() if classifier.output_mode == "logprob" else 0
+            start_time = time.perf_counter()
+            reply = classifier.backend.generate(
+                classifier.model_name, prompt, timeout=300, options=options, format=format,
+                top_logprobs=top_logprobs
+            )
+            totals["wall"] += time.perf_counter() - start_time
+            totals["requests"] += 1
+            totals["eval_count"] += reply.get("eval_count", 0)
+            totals["prompt_eval_count"] += reply.get("prompt_eval_count", 0)
+
+            response = reply.get("response", "")
+            if top_logprobs:
+                result = classifier._build_scored_result(chunk[0], reply, 0.0, {})
+                parsed = [{"category": result["predicted_category"]}]
+            elif batch == 1:
+                parsed = [classifier._parse_classification_response(response)]
+            else:
+                parsed = [
+                    {"category": result["predicted_category"]}
+                    for result in classifier._parse_batch_response(response, chunk, 0.0, {})
+                ]
+            totals["correct"] += sum(1 for item in parsed if item.get("category") != "unknown")
+    return totals
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Бенчмарк режимов ответа verbose, compact и logprob")
+    parser.add_argument("--host", default=None, help="Адрес Ollama (по умолчанию - заглушка)")
+    parser.add_argument("--batch", type=int, default=1, help="Товаров в запросе (1 - одиночные)")
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+
+    products = load_products()
+    stub = None
+    host = args.host
+    if host is None:
+        stub = OllamaStubServer().start()
+        host = stub.url
+
+    try:
+        for mode in ("verbose", "compact", "logprob"):
+            classifier = ProductClassifier(backend="http", host=host, output_mode=mode)
+            try:
+                totals = run_mode(classifier, products, args.batch, args.repeats)
+                stats = classifier.get_parse_stats()
+            finally:
+                classifier.close()
+
+            items = len(products) * args.repeats
+            print(f"📝 {mode:8}: {totals['eval_count'] / items:7.1f} ток/товар на выходе, "
+                  f"{totals['prompt_eval_count'] / items:7.1f} ток/товар на входе, "
+                  f"{totals['wall'] / items * 1000:8.1f} мс/товар, "
+                  f"распознано {totals['correct']}/{items}, "
+                  f"запасной разбор {stats['fallback_rate']:.0%}")
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    if stub is not None:
+        print("ℹ️  Заглушка оценивает токены по длине текста; время - только на реальной модели (--host)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк кэша префикса: инструкции в начале промпта против инструкций после товара.
+Сравнивает prompt_eval_count и prompt_eval_duration из ответов Ollama.
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python bench/bench_prompt_prefix.py                       # заглушка с имитацией KV-кэша
+    python bench/bench_prompt_prefix.py --host 127.0.0.1:11434 --mode compact
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "src"))
+
+from ml_model import ProductClassifier
+from ollama_stub import OllamaStubServer
+
+
+def load_products() -> list:
+    """Товары из примера сырых данных"""
+    with open(ROOT / "data" / "example_raw_data.json", 'r', encoding='utf-8') as f:
+        return [{"name": item["name"], "description": ""} for item in json.load(f)]
+
+
+def run_order(classifier: ProductClassifier, products: list, prefix_first: bool) -> dict:
+    """Отправить товары по одному и усреднить тайминги промпта"""
+    prefix = classifier._prompt_prefix()
+    start = len(classifier.eval_log)
+    for product in products:
+        prompt = classifier._create_classification_prompt(product)
+        if not prefix_first:
+            # Прежний порядок: товар, затем инструкции - префикс меняется с каждым товаром
+            prompt = f"{prompt[len(prefix):].strip()}\n\n{prefix}"
+        classifier._generate(prompt, timeout=120, format=classifier._output_format(),
+                             options=classifier._generation_options(), kind="bench")
+    calls = list(classifier.eval_log)[start:]
+    return {
+        "prompt_eval_count": sum(call["prompt_eval_count"] for call in calls) / len(calls),
+        "prompt_eval_ms": sum(call["prompt_eval_ms"] for call in calls) / len(calls),
+        "eval_ms": sum(call["eval_ms"] for call in calls) / len(calls),
+    }
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Бенчмарк кэша префикса промпта")
+    parser.add_argument("--host", default=None, help="Адрес Ollama (по умолчанию - заглушка)")
+    parser.add_argument("--mode", choices=["verbose", "compact", "logprob"], default="verbose")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    products = load_products() * args.repeats
+    # Заглушка: 0.5 мс на токен промпта вне кэша, один слот - как у последовательных запросов
+    stub = None if args.host else OllamaStubServer(prompt_token_latency=0.0005, cache_slots=1).start()
+    try:
+        classifier = ProductClassifier(backend="http", host=args.host or stub.url, output_mode=args.mode)
+        # Первый запрос прогревает кэш, в замеры не входит
+        classifier._generate(classifier._create_classification_prompt(products[0]), timeout=120)
+        results = {
+            "инструкции после товара": run_order(classifier, products, prefix_first=False),
+            "инструкции в начале": run_order(classifier, products, prefix_first=True),
+        }
+        classifier.close()
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    print(f"📦 {len(products)} запросов, режим {args.mode}")
+    for name, result in results.items():
+        print(f"{name:>24}: промпт {result['prompt_eval_count']:6.1f} ток. "
+              f"за {result['prompt_eval_ms']:7.2f} мс, генерация {result['eval_ms']:7.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк разбора батч-ответа: вложенный поиск по index против ResponseMapping
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python bench/bench_response_mapping.py --items 1000
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "src"))
+
+from response_mapping import ResponseMapping
+
+CATEGORIES = ["iphone", "processors", "videocards", "motherboards",
+              "playstation", "nintendo-switch", "steam-deck"]
+
+
+def make_response(count: int, seed: int = 42) -> str:
+    """Сгенерировать ответ модели на count товаров (в перемешанном порядке)"""
+    rng = random.Random(seed)
+    items = [
+        {
+            "index": i,
+            "category": rng.choice(CATEGORIES),
+            "confidence": round(rng.uniform(0.5, 1.0), 2),
+            "reasoning": "обоснование выбора категории для товара " * 2
+        }
+        for i in range(1, count + 1)
+    ]
+    rng.shuffle(items)
+    return "Вот результат:\n" + json.dumps(items, ensure_ascii=False, indent=2)
+
+
+def legacy_parse(response: str, products: list) -> list:
+    """Прежний разбор: json.loads массива и линейный поиск по index для каждого товара"""
+    start = response.find('[')
+    end = response.rfind(']') + 1
+    parsed_results = json.loads(response[start:end])
+
+    results = []
+    for i, product in enumerate(products):
+        product_result = None
+        for result in parsed_results:
+            if result.get('index') == i + 1:
+                product_result = result
+                break
+        product_result = product_result or {}
+        results.append({
+            "product_name": product["name"],
+            "predicted_category": product_result.get("category", "unknown"),
+            "confidence": product_result.get("confidence", 0.0),
+            "full_response": response,
+        })
+    return results
+
+
+def mapping_parse(response: str, products: list) -> list:
+    """Новый разбор: ResponseMapping за один проход, фрагменты вместо копий"""
+    mapping = ResponseMapping.from_text(response, len(products), names=[p["name"] for p in products])
+    results = []
+    for i, product in enumerate(products):
+        product_result = mapping.get(i) or {}
+        results.append({
+            "product_name": product["name"],
+            "predicted_category": product_result.get("category", "unknown"),
+            "confidence": product_result.get("confidence", 0.0),
+            "full_response": mapping.raw_slice(i),
+            "response_offsets": mapping.span(i),
+        })
+    return results
+
+
+def measure(function, response: str, products: list, repeats: int) -> tuple:
+    """Лучшее время из repeats запусков и размер результатов в JSON"""
+    best = float("inf")
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        results = function(response, products)
+        best = min(best, time.perf_counter() - start_time)
+    size = len(json.dumps(results, ensure_ascii=False))
+    return best, size, results
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора батч-ответа")
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    response = make_response(args.items)
+    products = [{"name": f"Товар {i}"} for i in range(args.items)]
+
+    legacy_time, legacy_size, legacy = measure(legacy_parse, response, products, args.repeats)
+    mapping_time, mapping_size, mapped = measure(mapping_parse, response, products, args.repeats)
+
+    same = all(a["predicted_category"] == b["predicted_category"] for a, b in zip(legacy, mapped))
+
+    print(f"📄 Ответ: {args.items} элементов, {len(response) / 1024:.0f} КБ")
+    print(f"🐢 Вложенный поиск:  {legacy_time * 1000:8.2f} мс, результаты {legacy_size / 1024 / 1024:.1f} МБ")
+    print(f"🚀 ResponseMapping: {mapping_time * 1000:8.2f} мс, результаты {mapping_size / 1024 / 1024:.1f} МБ")
+    print(f"{'✅' if same else '❌'} Категории совпадают: {same}")
+
+
+if __name__ == "__main__":
+    main()
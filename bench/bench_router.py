@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк RouterBackend: несколько заглушек Ollama с разной задержкой и
+ограниченным числом слотов и один недоступный узел. Сравнивает пропускную
+способность с одним сервером и показывает распределение запросов по узлам.
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python bench/bench_router.py
+    python bench/bench_router.py --latencies 0.02,0.02,0.1 --clients 16 --requests 400
+"""
+
+import argparse
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "src"))
+
+from backends import HTTPBackend
+from ollama_stub import OllamaStubServer
+from router import RouterBackend
+
+MODEL = "t-pro-it-2.0-optimized"
+
+
+def free_port() -> int:
+    """Порт, на котором никто не слушает - недоступный узел"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run(backend, clients: int, requests: int) -> tuple:
+    """requests запросов из clients потоков; (секунды, ошибки)"""
+    def call(i: int) -> bool:
+        try:
+            backend.generate(MODEL, f"Товар {i}", timeout=5)
+            return True
+        except Exception:
+            return False
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        ok = sum(executor.map(call, range(requests)))
+    return time.perf_counter() - start_time, requests - ok
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Бенчмарк распределения запросов между узлами")
+    parser.add_argument("--latencies", default="0.02,0.02,0.08", help="Задержки заглушек через запятую, сек")
+    parser.add_argument("--parallel", type=int, default=2, help="Параллельных слотов каждой заглушки")
+    parser.add_argument("--clients", type=int, default=12)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    stubs = [OllamaStubServer(latency=float(latency), parallel=args.parallel).start()
+             for latency in args.latencies.split(",")]
+    dead = f"http://127.0.0.1:{free_port()}"
+    try:
+        single = HTTPBackend(stubs[0].url, pool_size=args.clients)
+        single_time, single_errors = run(single, args.clients, args.requests)
+        single.close()
+
+        router = RouterBackend([stub.url for stub in stubs] + [dead], pool_size=args.clients)
+        router_time, router_errors = run(router, args.clients, args.requests)
+        stats = router.get_stats()
+        router.close()
+    finally:
+        for stub in stubs:
+            stub.stop()
+
+    print(f"📦 {args.requests} запросов из {args.clients} потоков")
+    print(f"🖥️  один узел:  {args.requests / single_time:7.1f} запросов/сек, ошибок {single_errors}")
+    print(f"🔀 роутер:     {args.requests / router_time:7.1f} запросов/сек, ошибок {router_errors}")
+    for node in stats["nodes"]:
+        state = "✅" if node["available"] else "❌"
+        print(f"   {state} {node['host']}: {node['requests']:4d} запросов, ошибок {node['errors']}, "
+              f"время ответа {node['latency_ms']:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк быстрой классификации правилами (микросекунд на товар)
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python bench/bench_rules.py --count 100000
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "src"))
+
+from rules import RuleEngine
+
+EXTRA_NAMES = [
+    "iPhone 15 Pro Max 256GB", "RTX 4070", "Ryzen 9 7950X", "Z790", "Steam Deck",
+    "AMD RX 7900 XTX", "Nintendo Switch Lite", "PS5 Digital Edition",
+    "Чехол для iPhone 15", "DualSense Controller", "Xbox Series X",
+]
+# Товары, которые правила не должны уверенно относить к категории упомянутого
+# устройства: None - ниже порога (решает модель)
+REGRESSION_CASES = [
+    ("Z790", "motherboards"),
+    ("ASUS PRIME Z790-P", "motherboards"),
+    ("RTX 4070", "videocards"),
+    ("Блок питания для RTX 4090", None),
+    ("Ноутбук ASUS ROG с RTX 4070", None),
+    ("Игра The Last of Us Part II для PS5", None),
+    ("Телевизор Sony для PlayStation 5", None),
+    ("Карта памяти для Nintendo Switch", None),
+    ("Ноутбук Lenovo Core i7-13700H", None),
+    ("Smartphone X570 Pro Max", None),
+    ("Samsung Galaxy A520", None),
+    ("Lenovo ThinkPad X230", None),
+    ("Термопаста Arctic MX-4", None),
+]
+NOISE = ["", " 256GB", " черный", " новый", " (оригинал)", " Б/У", " OEM", " BOX"]
+
+
+def make_products(count: int, seed: int = 42) -> list:
+    """Сгенерировать синтетический поток товаров"""
+    with open(ROOT / "data" / "example_raw_data.json", 'r', encoding='utf-8') as f:
+        names = [item["name"] for item in json.load(f)] + EXTRA_NAMES
+
+    rng = random.Random(seed)
+    return [
+        {"name": rng.choice(names) + rng.choice(NOISE), "description": ""}
+        for _ in range(count)
+    ]
+
+
+def check_regressions(engine: RuleEngine, threshold: float) -> list:
+    """Случаи из REGRESSION_CASES, где правила ошиблись: (название, ожидалось, получено)"""
+    failures = []
+    for name, expected in REGRESSION_CASES:
+        match = engine.match({"name": name, "description": ""})
+        got = match["category"] if match["confidence"] >= threshold else None
+        if got != expected:
+            failures.append((name, expected, f"{match['category']} {match['confidence']:.2f}"))
+    return failures
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Бенчмарк правил классификации")
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--rules", default=None, help="Файл правил (по умолчанию data/rules.json)")
+    parser.add_argument("--threshold", type=float, default=0.9)
+    args = parser.parse_args()
+
+    engine = RuleEngine.load(args.rules)
+    products = make_products(args.count)
+
+    start_time = time.perf_counter()
+    matches = [engine.match(product) for product in products]
+    elapsed_time = time.perf_counter() - start_time
+
+    confident = [m for m in matches if m["confidence"] >= args.threshold]
+    categories = Counter(m["category"] for m in confident)
+
+    print(f"📏 Правил: {len(engine.rules)}, товаров: {len(products)}")
+    print(f"⏱️ Время: {elapsed_time:.3f} сек ({elapsed_time / len(products) * 1e6:.2f} мкс/товар)")
+    print(f"✅ Без модели: {len(confident) / len(products) * 100:.1f}% (порог {args.threshold})")
+    for category, count in categories.most_common():
+        print(f"   {category}: {count}")
+
+    failures = check_regressions(engine, args.threshold)
+    print(f"🧪 Контрольные случаи: {len(REGRESSION_CASES) - len(failures)}/{len(REGRESSION_CASES)}")
+    for name, expected, got in failures:
+        print(f"   ❌ {name}: ожидалось {expected or 'ниже порога'}, получено {got}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
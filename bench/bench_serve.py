@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест сервиса классификации: параллельные клиенты с повторяющимися
+товарами, объединение одинаковых запросов и ответы 429 при переполнении очереди
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python bench/bench_serve.py                              # заглушка Ollama, 50 мс на ответ
+    python bench/bench_serve.py --clients 64 --requests 20 --max-pending 16
+    python bench/bench_serve.py --url http://127.0.0.1:8080  # запущенный serve.py
+"""
+
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "src"))
+
+from ml_model import ProductClassifier
+from ollama_stub import OllamaStubServer
+from resource_monitor import percentile
+from service import ClassificationServer, ClassificationService
+
+
+def load_products() -> list:
+    """Товары из примера сырых данных"""
+    with open(ROOT / "data" / "example_raw_data.json", 'r', encoding='utf-8') as f:
+        return [{"name": item["name"], "description": ""} for item in json.load(f)]
+
+
+def run_client(url: str, products: list, count: int, seed: int, stats: dict, lock: threading.Lock):
+    """
+    Один клиент: count запросов /classify по keep-alive соединению, 429 - повтор через Retry-After.
+    Сброшенное соединение - ошибка запроса и новое соединение
+    """
+    rng = random.Random(seed)
+    address = urlparse(url)
+    connection = http.client.HTTPConnection(address.hostname, address.port, timeout=300)
+    latencies, rejected, errors = [], 0, 0
+    for _ in range(count):
+        body = json.dumps(rng.choice(products), ensure_ascii=False).encode('utf-8')
+        start_time = time.perf_counter()
+        try:
+            while True:
+                connection.request("POST", "/classify", body, {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                data = json.loads(response.read())
+                if response.status != 429:
+                    break
+                rejected += 1
+                time.sleep(float(response.getheader("Retry-After", "1")) / 10)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection(address.hostname, address.port, timeout=300)
+            continue
+        latencies.append(time.perf_counter() - start_time)
+        if response.status != 200 or "error" in data:
+            errors += 1
+    connection.close()
+    with lock:
+        stats["latencies"].extend(latencies)
+        stats["rejected"] += rejected
+        stats["errors"] += errors
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сервиса классификации")
+    parser.add_argument("--url", default=None, help="Адрес запущенного serve.py (по умолчанию - сервис на заглушке)")
+    parser.add_argument("--clients", type=int, default=32, help="Параллельных клиентов")
+    parser.add_argument("--requests", type=int, default=25, help="Запросов на клиента")
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа заглушки, сек")
+    args = parser.parse_args()
+
+    products = load_products()
+    stub = classifier = server = None
+    if args.url is None:
+        stub = OllamaStubServer(latency=args.latency).start()
+        classifier = ProductClassifier(backend="http", host=stub.url, micro_batch=True, keep_warm=False)
+        classifier.load_model()
+        service = ClassificationService(classifier, max_pending=args.max_pending)
+        server = ClassificationServer(service, port=0).start()
+        url = server.url
+    else:
+        url = args.url
+
+    stats = {"latencies": [], "rejected": 0, "errors": 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_client, args=(url, products, args.requests, seed, stats, lock))
+        for seed in range(args.clients)
+    ]
+    start_time = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed_time = time.perf_counter() - start_time
+    finally:
+        if server is not None:
+            server.stop()
+            classifier.close()
+        if stub is not None:
+            stub.stop()
+
+    latencies = sorted(stats["latencies"])
+    total = len(latencies)
+    print(f"📦 {args.clients} клиентов x {args.requests} запросов, {len(products)} разных товаров")
+    print(f"⚡ {total / elapsed_time:.1f} запросов/сек за {elapsed_time:.2f} сек")
+    print(f"⏱️  p50 {percentile(latencies, 50) * 1000:.1f} мс, p95 {percentile(latencies, 95) * 1000:.1f} мс")
+    print(f"🚦 Ответов 429: {stats['rejected']}, ошибок: {stats['errors']}")
+    if stub is not None:
+        model_calls = sum(1 for request in stub.requests
+                          if request["path"] in ("/api/generate", "/api/chat") and request["payload"].get("prompt") != "")
+        registry = classifier.metrics.registry.render()
+        coalesced = next((line.split()[-1] for line in registry.splitlines()
+                          if line.startswith("service_coalesced_total")), "0")
+        print(f"🤖 Запросов к модели: {model_calls}, объединено одинаковых товаров: {coalesced}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Набор бенчмарков классификатора: одиночные запросы и батчи разного размера,
+уровни параллельности, холодный и прогретый кэш. Результаты - в JSON для
+сравнения между запусками.
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python bench/bench_suite.py --output bench_results.json
+    python bench/bench_suite.py --batch-sizes 1,8,64 --concurrency 1,4 --compare bench_results.json
+    python bench/bench_suite.py --host 127.0.0.1:11434 --items 32 --output real.json
+
+По умолчанию модель - детерминированная заглушка: время вычисления промпта
+пропорционально токенам вне кэша префикса, время генерации - токенам ответа.
+"""
+
+import argparse
+import io
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "src"))
+
+from cache import ClassificationCache
+from ml_model import ProductClassifier
+from ollama_stub import OllamaStubServer
+from resource_monitor import percentile
+
+# Пороги регрессии при сравнении с прошлым запуском
+DEFAULT_TOLERANCE = 0.15
+
+SUFFIXES = ["", "черный", "256GB", "OEM", "новый", "Ростест", "BOX", "white"]
+
+
+def make_products(count: int, seed: int) -> List[Dict[str, str]]:
+    """Уникальные товары на основе примеров: одинаковые при одном seed"""
+    names = []
+    for filename, field in (("example_raw_data.json", "name"), ("training_examples.json", "input")):
+        with open(ROOT / "data" / filename, 'r', encoding='utf-8') as f:
+            names.extend(item[field] for item in json.load(f))
+    rng = random.Random(seed)
+    products = []
+    for i in range(count):
+        name = f"{rng.choice(names)} {rng.choice(SUFFIXES)} {i}".replace("  ", " ")
+        description = " ".join(rng.choice(names) for _ in range(rng.randint(0, 3)))
+        products.append({"name": name, "description": description})
+    return products
+
+
+def run_workload(host: str, products: list, mode: str, batch_size: int, concurrency: int,
+                 cache: str, output_mode: str) -> Dict[str, Any]:
+    """Один прогон: время каждого вызова, пропускная способность и качество разбора"""
+    classifier = ProductClassifier(
+        backend="http", host=host, keep_warm=False, output_mode=output_mode,
+        max_concurrency=concurrency, cache=ClassificationCache(":memory:")
+    )
+    if not classifier.load_model():
+        raise RuntimeError("Модель не загружена")
+    size = 1 if mode == "single" else batch_size
+    calls = [products[i:i + size] for i in range(0, len(products), size)]
+
+    def call(batch: list) -> tuple:
+        start_time = time.perf_counter()
+        if mode == "single":
+            results = [classifier.classify_product(batch[0])]
+        else:
+            results = classifier.classify_products_batch(batch, show_progress=False)
+        return time.perf_counter() - start_time, results
+
+    if cache == "warm":
+        # Прогрев: те же товары один раз, в замеры не входит
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(call, calls))
+    parse_before = classifier.get_parse_stats()
+    eval_before = classifier.get_eval_stats()
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        measured = list(executor.map(call, calls))
+    elapsed_time = time.perf_counter() - start_time
+
+    parse_stats = classifier.get_parse_stats()
+    eval_stats = classifier.get_eval_stats()
+    classifier.close()
+
+    latencies = sorted(latency for latency, _ in measured)
+    results = [result for _, batch_results in measured for result in batch_results]
+    parsed = parse_stats["items"] - parse_before["items"]
+    failures = sum(parse_stats[key] - parse_before[key] for key in ("text_fallback", "missing"))
+    fallbacks = parsed - (parse_stats["valid"] - parse_before["valid"])
+    return {
+        "name": f"{mode}-b{size}-c{concurrency}-{cache}",
+        "mode": mode,
+        "batch_size": size,
+        "concurrency": concurrency,
+        "cache": cache,
+        "items": len(products),
+        "calls": len(calls),
+        "seconds": round(elapsed_time, 4),
+        "items_per_sec": round(len(products) / elapsed_time, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "errors": sum(1 for result in results if "error" in result),
+        "cached": sum(1 for result in results if result.get("cached")),
+        "parsed_items": parsed,
+        "parse_failure_rate": round(failures / parsed, 4) if parsed else 0.0,
+        "parse_fallback_rate": round(fallbacks / parsed, 4) if parsed else 0.0,
+        "prompt_tokens": eval_stats.get("prompt_eval_count", 0) - eval_before.get("prompt_eval_count", 0),
+        "generated_tokens": eval_stats.get("eval_count", 0) - eval_before.get("eval_count", 0),
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Текущий коммит репозитория, если он есть"""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout.strip() or None
+
+
+def compare(results: list, baseline_path: str, tolerance: float) -> List[str]:
+    """Сравнить с прошлым запуском; список регрессий"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {row["name"]: row for row in json.load(f)["results"]}
+    regressions = []
+    print(f"\n📐 Сравнение с {baseline_path} (допуск {tolerance:.0%})")
+    for row in results:
+        old = baseline.get(row["name"])
+        if old is None:
+            continue
+        throughput = row["items_per_sec"] / old["items_per_sec"] - 1 if old["items_per_sec"] else 0.0
+        p95 = row["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+        failures = row["parse_failure_rate"] - old["parse_failure_rate"]
+        worse = throughput < -tolerance or p95 > tolerance or failures > 0.01
+        mark = "❌" if worse else "✅"
+        print(f"{mark} {row['name']:>24}: товаров/сек {throughput:+7.1%}, p95 {p95:+7.1%}, "
+              f"ошибки разбора {failures:+.2%}")
+        if worse:
+            regressions.append(row["name"])
+    return regressions
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Набор бенчмарков классификатора")
+    parser.add_argument("--host", default=None, help="Адрес Ollama (по умолчанию - заглушка)")
+    parser.add_argument("--modes", default="single,batch", help="single, batch")
+    parser.add_argument("--batch-sizes", default="1,8,32,64")
+    parser.add_argument("--concurrency", default="1,4")
+    parser.add_argument("--cache", default="cold,warm", help="cold, warm")
+    parser.add_argument("--items", type=int, default=64, help="Товаров в каждом прогоне")
+    parser.add_argument("--output-mode", choices=["verbose", "compact", "logprob"], default="verbose")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0001,
+                        help="Заглушка: сек на токен промпта вне кэша префикса")
+    parser.add_argument("--token-latency", type=float, default=0.0005, help="Заглушка: сек на токен ответа")
+    parser.add_argument("--parallel", type=int, default=4, help="Заглушка: одновременно вычисляемых запросов")
+    parser.add_argument("--output", default=None, help="Записать результаты в JSON")
+    parser.add_argument("--compare", default=None, help="JSON прошлого запуска для сравнения")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Допустимое ухудшение товаров/сек и p95")
+    args = parser.parse_args()
+
+    products = make_products(args.items, args.seed)
+    workloads = []
+    for mode in args.modes.split(","):
+        sizes = [1] if mode == "single" else [int(size) for size in args.batch_sizes.split(",")]
+        for size in sizes:
+            for concurrency in (int(value) for value in args.concurrency.split(",")):
+                for cache in args.cache.split(","):
+                    workloads.append((mode, size, concurrency, cache))
+
+    stub = None
+    if args.host is None:
+        stub = OllamaStubServer(prompt_token_latency=args.prompt_token_latency,
+                                token_latency=args.token_latency, parallel=args.parallel).start()
+    results = []
+    try:
+        for mode, size, concurrency, cache in workloads:
+            # Одиночные запросы рисуют анимацию ожидания - в отчет она не попадает
+            with redirect_stdout(io.StringIO()):
+                row = run_workload(args.host or stub.url, products, mode, size, concurrency, cache,
+                                   args.output_mode)
+            results.append(row)
+            print(f"{row['name']:>24}: {row['items_per_sec']:8.1f} товаров/сек, p50 {row['p50_ms']:8.1f} мс, "
+                  f"p95 {row['p95_ms']:8.1f} мс, p99 {row['p99_ms']:8.1f} мс, "
+                  f"ошибки разбора {row['parse_failure_rate']:.1%}, ошибок {row['errors']}")
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.host or "stub",
+            "output_mode": args.output_mode,
+            "items": args.items,
+            "seed": args.seed,
+            "stub": None if args.host else {
+                "prompt_token_latency": args.prompt_token_latency,
+                "token_latency": args.token_latency,
+                "parallel": args.parallel,
+            },
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Результаты: {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"❌ Регрессии: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк QueryValidator: сколько пар отсеивается без модели и сколько
+запросов к модели остается
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python bench/bench_validator.py                          # встроенная заглушка Ollama
+    python bench/bench_validator.py --listings 10000 --queries 500 --batch-size 20
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "src"))
+
+from ml_model import ProductClassifier
+from ollama_stub import OllamaStubServer
+from validator import REASON_ACCESSORY, REASON_BRAND, REASON_MODEL, QueryValidator
+
+# Семейства товаров: шаблон названия и номера моделей
+FAMILIES = [
+    ("Sony PlayStation {}", ["4", "5", "5 Slim", "5 Pro"]),
+    ("Microsoft Xbox Series {}", ["X", "S"]),
+    ("Nintendo Switch {}", ["OLED", "Lite", "2"]),
+    ("Apple iPhone {}", ["13", "14", "15 Pro", "15 Pro Max", "16"]),
+    ("NVIDIA GeForce RTX {}", ["3060", "4060", "4070 Ti", "4090"]),
+    ("AMD Ryzen 7 {}", ["5800X3D", "7800X3D", "9700X"]),
+    ("Intel Core i9-{}", ["13900K", "14900K"]),
+]
+ACCESSORIES = ["Чехол для {}", "Геймпад для {}", "Кабель для {}"]
+
+# Пары (запрос, товар) и ожидаемая причина отсева, None - товар решает модель
+CONTROL_PAIRS = [
+    ("playstation 5", "Sony PlayStation 5 Slim + DualSense", None),
+    ("playstation 5", "Sony PlayStation 5 Slim", None),
+    ("playstation 5", "Геймпад DualSense", REASON_ACCESSORY),
+    ("playstation 5", "Microsoft Xbox Series X", REASON_BRAND),
+    ("playstation 5", "Sony PlayStation VR2", REASON_MODEL),
+]
+
+
+def make_listings(count: int, rng: random.Random) -> list:
+    """Синтетические объявления: сами товары и аксессуары к ним"""
+    listings = []
+    for _ in range(count):
+        template, models = rng.choice(FAMILIES)
+        name = template.format(rng.choice(models))
+        if rng.random() < 0.3:
+            name = rng.choice(ACCESSORIES).format(name)
+        listings.append({"name": name, "description": ""})
+    return listings
+
+
+def make_queries(count: int, rng: random.Random) -> list:
+    """Поисковые запросы вида 'playstation 5' в нижнем регистре"""
+    queries = []
+    for _ in range(count):
+        template, models = rng.choice(FAMILIES)
+        queries.append(template.format(rng.choice(models)).split(" ", 1)[1].lower())
+    return queries
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Бенчмарк QueryValidator")
+    parser.add_argument("--listings", type=int, default=10000, help="Объявлений")
+    parser.add_argument("--queries", type=int, default=500, help="Поисковых запросов")
+    parser.add_argument("--batch-size", type=int, default=20, help="Товаров одного запроса в промпте")
+    parser.add_argument("--host", default=None, help="Адрес Ollama (по умолчанию - заглушка)")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    listings = make_listings(args.listings, rng)
+    queries = make_queries(args.queries, rng)
+    # Каждое объявление - кандидат в выдаче случайного запроса
+    pairs = [(rng.choice(queries), listing) for listing in listings]
+
+    stub = None if args.host else OllamaStubServer().start()
+    try:
+        classifier = ProductClassifier(backend="http", host=args.host or stub.url)
+        validator = QueryValidator(classifier, batch_size=args.batch_size)
+
+        start_time = time.perf_counter()
+        reasons = validator.prefilter(pairs)
+        prefilter_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        results = validator.validate(pairs)
+        total_time = time.perf_counter() - start_time
+        stats = validator.get_stats()
+        classifier.close()
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    valid = sum(1 for result in results if result.get("is_valid"))
+    print(f"📦 Пар: {len(pairs)} ({args.listings} объявлений, {args.queries} запросов)")
+    print(f"⚡ Отсев без модели: {prefilter_time * 1000:.0f} мс, "
+          f"{sum(reason is not None for reason in reasons)} пар ({stats['prefilter_rate']:.1%})")
+    print(f"🤖 Запросов к модели: {stats['model_requests']} вместо {len(pairs)} "
+          f"({stats['model_pairs']} пар батчами по {args.batch_size})")
+    print(f"⏱️  Всего: {total_time:.2f} сек, валидных: {valid}, ошибок: {stats['errors']}")
+
+    control = validator.prefilter([(query, {"name": name, "description": ""}) for query, name, _ in CONTROL_PAIRS])
+    failures = [(query, name, expected, got) for (query, name, expected), got in zip(CONTROL_PAIRS, control)
+                if got != expected]
+    print(f"🧪 Контрольные пары: {len(CONTROL_PAIRS) - len(failures)}/{len(CONTROL_PAIRS)}")
+    for query, name, expected, got in failures:
+        print(f"   ❌ {query!r} / {name!r}: ожидалось {expected or 'модель'}, получено {got or 'модель'}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк индекса ближайших соседей: поиск батчем против поиска по одному
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python bench/bench_vector_index.py --size 100000 --dim 768
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "src"))
+
+from vector_index import VectorIndex
+
+CATEGORIES = ["iphone", "processors", "videocards", "motherboards",
+              "playstation", "nintendo-switch", "steam-deck"]
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Бенчмарк VectorIndex")
+    parser.add_argument("--size", type=int, default=100000, help="Примеров в индексе")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((args.size, args.dim), dtype=np.float32)
+    labels = [CATEGORIES[i % len(CATEGORIES)] for i in range(args.size)]
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    index = VectorIndex()
+    start_time = time.perf_counter()
+    for start in range(0, args.size, 1000):
+        index.add(vectors[start:start + 1000], labels[start:start + 1000])
+    add_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    batched = index.classify(queries, k=args.k)
+    batch_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    single = [index.classify(query[None, :], k=args.k)[0] for query in queries]
+    single_time = time.perf_counter() - start_time
+
+    with tempfile.TemporaryDirectory() as directory:
+        start_time = time.perf_counter()
+        index.save(directory)
+        save_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        loaded = VectorIndex.load(directory)
+        load_time = time.perf_counter() - start_time
+        same = loaded.classify(queries[:8], k=args.k) == batched[:8]
+        del loaded
+
+    same = same and all(a["category"] == b["category"] for a, b in zip(batched, single))
+    print(f"📚 Индекс: {args.size} x {args.dim}, добавление пачками по 1000: {add_time:.2f} сек")
+    print(f"🐢 По одному:  {single_time / args.queries * 1000:8.2f} мс/запрос")
+    print(f"🚀 Батчем:     {batch_time / args.queries * 1000:8.2f} мс/запрос")
+    print(f"💾 Сохранение: {save_time * 1000:.0f} мс, загрузка (mmap): {load_time * 1000:.1f} мс")
+    print(f"{'✅' if same else '❌'} Результаты совпадают: {same}")
+
+
+if __name__ == "__main__":
+    main()
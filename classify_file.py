@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Classify File - Пакетная классификация каталога товаров из JSON/JSONL
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python classify_file.py data/example_raw_data.json results.jsonl
+    python classify_file.py catalog.jsonl results.csv --workers 4 --batch-size 16
+    python classify_file.py catalog.jsonl results.parquet --rules --cache
+
+После сбоя тот же запуск продолжает с последнего чекпоинта (--restart - заново).
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Настройка кодировки для Windows
+if sys.platform == "win32":
+    os.environ['PYTHONIOENCODING'] = 'utf-8'
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from ml_model import ProductClassifier
+from cascade import parse_thresholds
+from catalog import Checkpoint, iter_products, open_sink
+from metrics import MetricsServer
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
+logger = logging.getLogger(__name__)
+
+# Поля результата классификатора, которые попадают в выходной файл
+RESULT_FIELDS = ("predicted_category", "confidence", "method", "error")
+
+
+def iter_batches(records, batch_size: int):
+    """Группировать (товар, смещение) по batch_size"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def to_output(index: int, item: dict, result: dict) -> dict:
+    """Плоская запись результата: исходные поля товара и поля классификации"""
+    record = {"index": index}
+    record.update({key: value for key, value in item.items() if key not in RESULT_FIELDS})
+    for field in RESULT_FIELDS:
+        record[field] = result.get(field)
+    return record
+
+
+def input_signature(path: Path) -> dict:
+    """Признаки входного файла, по которым чекпоинт считается к нему относящимся"""
+    stat = path.stat()
+    return {"input": str(path.resolve()), "input_size": stat.st_size, "input_mtime": stat.st_mtime}
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Классификация каталога товаров из файла")
+    parser.add_argument("input", help="JSON-массив или JSONL с товарами (поля name, description)")
+    parser.add_argument("output", help="Результат: .jsonl, .csv или .parquet (каталог)")
+    parser.add_argument("--format", choices=["jsonl", "csv", "parquet"], default=None,
+                        help="Формат вывода (по умолчанию - по расширению)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Товаров в одном запросе к модели")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Одновременных запросов (по умолчанию OLLAMA_NUM_PARALLEL или 4)")
+    parser.add_argument("--checkpoint-every", type=int, default=256,
+                        help="Сохранять чекпоинт каждые N товаров")
+    parser.add_argument("--restart", action="store_true", help="Игнорировать чекпоинт и начать заново")
+    parser.add_argument("--limit", type=int, default=None, help="Обработать не больше N товаров")
+    parser.add_argument("--backend", default=None, help="http или subprocess")
+    parser.add_argument("--host", default=None, help="Адрес Ollama (несколько - через запятую)")
+    parser.add_argument("--output-mode", choices=["verbose", "compact", "logprob"], default="verbose")
+    parser.add_argument("--rules", action="store_true", help="Классифицировать очевидные товары правилами")
+    parser.add_argument("--cache", action="store_true", help="Кэш результатов в .cache/")
+    parser.add_argument("--knn", action="store_true", help="Ближайшие соседи по эмбеддингам до модели")
+    parser.add_argument("--model", default="t-pro-it-2.0-optimized", help="Модель Ollama")
+    parser.add_argument("--cascade", nargs="?", const=True, default=None, metavar="MODEL",
+                        help="Сначала быстрая модель (по умолчанию t-pro-it-2.0-fast), неуверенные ответы - --model")
+    parser.add_argument("--cascade-thresholds", default=None,
+                        help="Порог уверенности каскада или JSON с порогами по категориям")
+    parser.add_argument("--dedup", nargs="?", type=float, const=True, default=None, metavar="THRESHOLD",
+                        help="Спрашивать модель об одном товаре из группы почти одинаковых названий")
+    parser.add_argument("--num-ctx", type=int, default=4096,
+                        help="Контекст модели в токенах: по нему делятся батчи, 0 - без ограничений")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Отдавать метрики Prometheus на http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--verbose", action="store_true", help="Подробный лог")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        encoding='utf-8'
+    )
+
+    input_path = Path(args.input)
+    signature = input_signature(input_path)
+    checkpoint = Checkpoint(f"{args.output}.checkpoint.json")
+    state = None if args.restart else checkpoint.load()
+    if state is not None and any(state.get(key) != value for key, value in signature.items()):
+        print(f"❌ Чекпоинт {checkpoint.path} относится к другому входному файлу, запустите с --restart")
+        sys.exit(1)
+    if state is not None and state.get("completed"):
+        print(f"✅ {args.input} уже обработан ({state['records']} товаров), --restart - заново")
+        return
+
+    try:
+        sink = open_sink(args.output, args.format)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    classifier = ProductClassifier(
+        backend=args.backend, host=args.host, max_concurrency=args.workers,
+        output_mode=args.output_mode, rules=args.rules or None, cache=args.cache or None,
+        knn=args.knn or None, model=args.model, cascade=args.cascade,
+        cascade_thresholds=parse_thresholds(args.cascade_thresholds), dedup=args.dedup,
+        packer=args.num_ctx or False
+    )
+    if not classifier.load_model():
+        print("❌ Не удалось загрузить модель")
+        sys.exit(1)
+    workers = classifier.max_concurrency
+    metrics_server = None
+    if args.metrics_port is not None:
+        metrics_server = MetricsServer(classifier.metrics.registry, port=args.metrics_port).start()
+
+    sink.restore(state["sink"] if state else {})
+    offset = state["offset"] if state else 0
+    done = state["records"] if state else 0
+    if state:
+        print(f"↩️  Продолжаем с товара {done} (байт {offset})")
+
+    methods: Counter = Counter()
+    since_checkpoint = 0
+    start_time = time.time()
+    started_from = done
+    progress = tqdm(total=signature["input_size"], initial=offset, unit="B", unit_scale=True) if tqdm else None
+
+    def save_checkpoint(completed: bool = False):
+        checkpoint.save({
+            **signature,
+            "offset": offset,
+            "records": done,
+            "sink": sink.flush(),
+            "completed": completed,
+        })
+
+    def classify(batch):
+        return classifier.classify_products_batch(
+            [{"name": item.get("name", ""), "description": item.get("description", "")} for item, _ in batch],
+            show_progress=False
+        )
+
+    records = iter_products(input_path, offset)
+    if args.limit is not None:
+        records = (record for _, record in zip(range(args.limit), records))
+
+    in_flight: deque = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="classify") as executor:
+            try:
+                batches = iter_batches(records, args.batch_size)
+                while True:
+                    # Держим очередь запросов полной, а результаты пишем строго по порядку -
+                    # тогда записанное всегда образует непрерывный префикс входного файла
+                    while len(in_flight) < workers * 2:
+                        batch = next(batches, None)
+                        if batch is None:
+                            break
+                        in_flight.append((batch, executor.submit(classify, batch)))
+                    if not in_flight:
+                        break
+
+                    batch, future = in_flight.popleft()
+                    results = future.result()
+                    sink.write([
+                        to_output(done + i, item, result)
+                        for i, ((item, _), result) in enumerate(zip(batch, results))
+                    ])
+                    methods.update(result.get("method", "error") if "error" not in result else "error"
+                                   for result in results)
+                    if progress is not None:
+                        progress.update(batch[-1][1] - offset)
+                    done += len(batch)
+                    offset = batch[-1][1]
+                    since_checkpoint += len(batch)
+                    if since_checkpoint >= args.checkpoint_every:
+                        save_checkpoint()
+                        since_checkpoint = 0
+            except KeyboardInterrupt:
+                # Выход из with ждет все задачи пула - очередные батчи отменяем сразу,
+                # ждать придется только уже отправленные в модель
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+        save_checkpoint(completed=args.limit is None)
+    except KeyboardInterrupt:
+        print(f"\n⏸️  Прервано, продолжение - с последнего чекпоинта")
+        sys.exit(130)
+    finally:
+        if progress is not None:
+            progress.close()
+        sink.close()
+        classifier.close()
+        if metrics_server is not None:
+            metrics_server.stop()
+
+    elapsed_time = time.time() - start_time
+    processed = done - started_from
+    print(f"✅ Обработано {processed} товаров за {elapsed_time:.1f} сек "
+          f"({processed / elapsed_time if elapsed_time else 0:.1f} товаров/сек), всего {done}")
+    print(f"📊 Методы: {dict(methods)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Evaluate - Точность и стоимость конфигураций классификатора на размеченном наборе
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python evaluate.py --build-dataset data/eval_dataset.jsonl
+    python evaluate.py data/eval_dataset.jsonl --configs verbose,compact,rules,cascade
+    python evaluate.py data/eval_dataset.jsonl --config-file configs.json --output report.json
+    python evaluate.py --stub --configs verbose,compact,logprob,cascade   # без Ollama
+
+configs.json: {"имя": {аргументы ProductClassifier}, ...}
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Настройка кодировки для Windows
+if sys.platform == "win32":
+    os.environ['PYTHONIOENCODING'] = 'utf-8'
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from ml_model import ProductClassifier
+from cascade import DEFAULT_FAST_MODEL
+from evaluation import (
+    PRESETS, TRAINING_SOURCE, build_dataset, evaluate, format_pareto, format_report, load_dataset,
+    save_dataset
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET = Path(__file__).parent / "data" / "eval_dataset.jsonl"
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Оценка конфигураций классификатора")
+    parser.add_argument("dataset", nargs="?", default=str(DEFAULT_DATASET),
+                        help="Размеченный JSONL (поля name, description, label)")
+    parser.add_argument("--build-dataset", metavar="PATH", default=None,
+                        help="Собрать набор из примеров для дообучения и data/example_raw_data.json")
+    parser.add_argument("--configs", default="verbose",
+                        help=f"Готовые конфигурации через запятую: {', '.join(PRESETS)}")
+    parser.add_argument("--config-file", default=None, help="JSON с конфигурациями {имя: аргументы}")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4, help="Параллельных батчей")
+    parser.add_argument("--parallel", type=int, default=1,
+                        help="Конфигураций одновременно (время при этом сравнивать осторожно)")
+    parser.add_argument("--backend", default=None, help="http или subprocess")
+    parser.add_argument("--host", default=None, help="Адрес Ollama (несколько - через запятую)")
+    parser.add_argument("--stub", action="store_true", help="Заглушка Ollama вместо модели")
+    parser.add_argument("--details", action="store_true", help="Матрица ошибок и метрики по категориям")
+    parser.add_argument("--output", default=None, help="Записать отчеты в JSON")
+    parser.add_argument("--verbose", action="store_true", help="Подробный лог")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        encoding='utf-8'
+    )
+
+    if args.build_dataset:
+        dataset = build_dataset()
+        save_dataset(dataset, args.build_dataset)
+        labels = {}
+        for item in dataset:
+            labels[item["label"]] = labels.get(item["label"], 0) + 1
+        print(f"✅ {len(dataset)} товаров в {args.build_dataset}: {labels}")
+        return
+
+    try:
+        dataset = load_dataset(args.dataset)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    configs = {}
+    for name in filter(None, args.configs.split(",")):
+        if name not in PRESETS:
+            print(f"❌ Неизвестная конфигурация {name}, есть: {', '.join(PRESETS)}")
+            sys.exit(1)
+        configs[name] = PRESETS[name]
+    if args.config_file:
+        with open(args.config_file, 'r', encoding='utf-8') as f:
+            configs.update(json.load(f))
+
+    stub = None
+    if args.stub:
+        from ollama_stub import OllamaStubServer, noisy_responder
+        # Быстрая модель каскада в заглушке ошибается на части товаров
+        stub = OllamaStubServer(
+            models=["t-pro-it-2.0-optimized:latest", f"{DEFAULT_FAST_MODEL}:latest"],
+            responder=noisy_responder(0.25, models=[DEFAULT_FAST_MODEL])
+        ).start()
+
+    def run(name: str, options: dict):
+        classifier = ProductClassifier(backend="http" if stub else args.backend,
+                                       host=stub.url if stub else args.host, **options)
+        try:
+            if not classifier.load_model():
+                print(f"❌ {name}: не удалось загрузить модель")
+                return None
+            report = evaluate(classifier, dataset, batch_size=args.batch_size,
+                              workers=args.workers, name=name)
+        finally:
+            classifier.close()
+        report["config"] = options
+        return report
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(args.parallel, 1)) as executor:
+            reports = [report for report in executor.map(lambda item: run(*item), configs.items())
+                       if report is not None]
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    for report in reports:
+        print(format_report(report, details=args.details))
+    if not reports:
+        sys.exit(1)
+    seen = sum(1 for item in dataset if item.get("source") == TRAINING_SOURCE)
+    print(f"\n🏁 {len(dataset)} товаров из {args.dataset}" +
+          (f", точность в таблице - без {seen} примеров для дообучения" if 0 < seen < len(dataset) else ""))
+    print(format_pareto(reports))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"💾 Отчеты: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,45 +9,14 @@ import subprocess
 import os
 from pathlib import Path
 
+# Пары "товар -> ответ модели"; из них же собирается индекс ближайших соседей
+TRAINING_EXAMPLES = Path(__file__).parent / "data" / "training_examples.json"
+
 def create_training_data():
     """Создать данные для дообучения"""
     
-    training_data = [
-        # iPhone
-        {"input": "iPhone 15 Pro Max 256GB", "output": "{\"category\": \"iphone\", \"confidence\": 0.98, \"reasoning\": \"iPhone 15 Pro Max - флагманский смартфон Apple\"}"},
-        {"input": "iPhone 14 128GB", "output": "{\"category\": \"iphone\", \"confidence\": 0.98, \"reasoning\": \"iPhone 14 - смартфон Apple\"}"},
-        {"input": "iPhone SE 2022", "output": "{\"category\": \"iphone\", \"confidence\": 0.98, \"reasoning\": \"iPhone SE - компактный смартфон Apple\"}"},
-        
-        # Processors
-        {"input": "Intel Core i9-14900K", "output": "{\"category\": \"processors\", \"confidence\": 0.98, \"reasoning\": \"Intel Core i9 - процессор для настольных ПК\"}"},
-        {"input": "AMD Ryzen 9 7950X", "output": "{\"category\": \"processors\", \"confidence\": 0.98, \"reasoning\": \"AMD Ryzen 9 - процессор для настольных ПК\"}"},
-        {"input": "Intel Core i7-13700K", "output": "{\"category\": \"processors\", \"confidence\": 0.98, \"reasoning\": \"Intel Core i7 - процессор для настольных ПК\"}"},
-        
-        # Videocards
-        {"input": "NVIDIA RTX 4070 Ti", "output": "{\"category\": \"videocards\", \"confidence\": 0.98, \"reasoning\": \"NVIDIA RTX - видеокарта для игр\"}"},
-        {"input": "AMD RX 7900 XTX", "output": "{\"category\": \"videocards\", \"confidence\": 0.98, \"reasoning\": \"AMD RX - видеокарта для игр\"}"},
-        {"input": "NVIDIA RTX 4090", "output": "{\"category\": \"videocards\", \"confidence\": 0.98, \"reasoning\": \"NVIDIA RTX - флагманская видеокарта\"}"},
-        
-        # Motherboards
-        {"input": "ASUS ROG STRIX Z790-E", "output": "{\"category\": \"motherboards\", \"confidence\": 0.98, \"reasoning\": \"ASUS ROG - материнская плата для Intel\"}"},
-        {"input": "MSI MPG B650", "output": "{\"category\": \"motherboards\", \"confidence\": 0.98, \"reasoning\": \"MSI MPG - материнская плата для AMD\"}"},
-        {"input": "Gigabyte AORUS X670E", "output": "{\"category\": \"motherboards\", \"confidence\": 0.98, \"reasoning\": \"Gigabyte AORUS - материнская плата для AMD\"}"},
-        
-        # PlayStation
-        {"input": "PlayStation 5", "output": "{\"category\": \"playstation\", \"confidence\": 0.98, \"reasoning\": \"PlayStation 5 - игровая консоль Sony\"}"},
-        {"input": "PS5 Digital Edition", "output": "{\"category\": \"playstation\", \"confidence\": 0.98, \"reasoning\": \"PS5 Digital - цифровая версия консоли Sony\"}"},
-        {"input": "PlayStation 4 Pro", "output": "{\"category\": \"playstation\", \"confidence\": 0.98, \"reasoning\": \"PlayStation 4 Pro - игровая консоль Sony\"}"},
-        
-        # Nintendo Switch
-        {"input": "Nintendo Switch OLED", "output": "{\"category\": \"nintendo-switch\", \"confidence\": 0.98, \"reasoning\": \"Nintendo Switch OLED - гибридная консоль Nintendo\"}"},
-        {"input": "Nintendo Switch Lite", "output": "{\"category\": \"nintendo-switch\", \"confidence\": 0.98, \"reasoning\": \"Nintendo Switch Lite - портативная консоль Nintendo\"}"},
-        {"input": "Nintendo Switch", "output": "{\"category\": \"nintendo-switch\", \"confidence\": 0.98, \"reasoning\": \"Nintendo Switch - гибридная консоль Nintendo\"}"},
-        
-        # Steam Deck
-        {"input": "Steam Deck 512GB", "output": "{\"category\": \"steam-deck\", \"confidence\": 0.98, \"reasoning\": \"Steam Deck - портативная игровая консоль Valve\"}"},
-        {"input": "Steam Deck 256GB", "output": "{\"category\": \"steam-deck\", \"confidence\": 0.98, \"reasoning\": \"Steam Deck - портативная игровая консоль Valve\"}"},
-        {"input": "Steam Deck 64GB", "output": "{\"category\": \"steam-deck\", \"confidence\": 0.98, \"reasoning\": \"Steam Deck - портативная игровая консоль Valve\"}"},
-    ]
+    with open(TRAINING_EXAMPLES, 'r', encoding='utf-8') as f:
+        training_data = json.load(f)
     
     # Сохраняем в JSON
     with open('training_data.json', 'w', encoding='utf-8') as f:
@@ -9,8 +9,6 @@ import sys
 import json
 import logging
 import time
-import subprocess
-import threading
 from pathlib import Path
 
 # Настройка кодировки для Windows
@@ -22,7 +20,8 @@ if sys.platform == "win32":
 # Добавляем путь к модулям
 sys.path.append(str(Path(__file__).parent / "src"))
 
-from ml_model import ProductClassifier
+from ml_model import ProductClassifier, loading_animation
+from validator import QueryValidator
 
 # Настройка логирования
 logging.basicConfig(
@@ -32,48 +31,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def parse_validation_response(response: str, products: list, elapsed_time: float) -> list:
-    """Парсить ответ валидации"""
-    try:
-        start = response.find('{')
-        end = response.rfind('}') + 1
-        
-        if start != -1 and end != 0:
-            json_str = response[start:end]
-            parsed = json.loads(json_str)
-            
-            results = []
-            for i, product in enumerate(products):
-                # Ищем результат по индексу
-                product_result = None
-                for result in parsed.get('results', []):
-                    if result.get('index') == i + 1:
-                        product_result = result
-                        break
-                
-                if product_result:
-                    results.append({
-                        "product_name": product.get("name", ""),
-                        "is_valid": product_result.get("is_valid", False),
-                        "reason": product_result.get("reason", ""),
-                        "processing_time": elapsed_time / len(products)
-                    })
-                else:
-                    results.append({
-                        "product_name": product.get("name", ""),
-                        "is_valid": False,
-                        "reason": "Не найден в ответе",
-                        "processing_time": elapsed_time / len(products)
-                    })
-            
-            return results
-        else:
-            # Fallback
-            return [{"error": "Не удалось распарсить ответ"}] * len(products)
-            
-    except json.JSONDecodeError:
-        return [{"error": "Ошибка парсинга JSON"}] * len(products)
-
 def main():
     """Основная функция"""
     try:
@@ -155,82 +112,18 @@ def main():
         logger.info(f"\n🔍 ВАЛИДАЦИЯ: Запрос '{query}' vs {len(test_batch)} товаров")
         logger.info(f"   Ожидаем: PlayStation товары = валидны, остальные = невалидны")
         
-        # Создаем промпт для валидации
-        validation_prompt = f"""
-Запрос пользователя: "{query}"
-
-Проверь каждый товар - подходит ли он под этот запрос?
-
-Товары:
-"""
-        
-        for i, product in enumerate(test_batch, 1):
-            validation_prompt += f"""
-{i}. {product['name']}
-   Описание: {product['description']}
-"""
-        
-        validation_prompt += f"""
-
-Ответ в формате JSON:
-{{
-  "query": "{query}",
-  "results": [
-    {{
-      "index": 1,
-      "product_name": "название товара",
-      "is_valid": true/false,
-      "reason": "обоснование"
-    }}
-  ]
-}}
-
-Валидными считаются только основные товары PlayStation 5, аксессуары - невалидны.
-"""
-        
-        # Отправляем запрос модели
+        # Явные несовпадения (аксессуары, другие бренды) отсеиваются без модели,
+        # остальное уходит модели одним батчем
+        validator = QueryValidator(classifier)
         logger.info(f"⏳ Отправляем запрос модели...")
-        
-        # ASCII-арт анимация
-        loading_frames = ["8uu==3", "8==uu3"]
-        current_frame = 0
-        animation_running = True
-        
-        def animate():
-            nonlocal current_frame
-            while animation_running:
-                frame = loading_frames[current_frame % len(loading_frames)]
-                sys.stdout.write(f"\r⏳ {frame} Валидация запроса '{query}'...")
-                sys.stdout.flush()
-                current_frame += 1
-                time.sleep(0.3)
-        
-        animation_thread = threading.Thread(target=animate, daemon=True)
-        animation_thread.start()
-        
         start_time = time.time()
-        
-        result = subprocess.run(
-            ["ollama", "run", "t-pro-it-2.0-optimized", validation_prompt],
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            timeout=300
-        )
-        
-        animation_running = False
-        sys.stdout.write("\r" + " " * 80 + "\r")
-        sys.stdout.flush()
-        
+        with loading_animation(f"Валидация запроса '{query}'..."):
+            batch_results = validator.validate_query(query, test_batch)
         elapsed_time = time.time() - start_time
-        
-        if result.returncode != 0:
-            logger.error(f"❌ Ошибка валидации: {result.stderr}")
-            batch_results = [{"error": "Ошибка валидации"}] * len(test_batch)
-        else:
-            response = result.stdout.strip()
-            logger.info(f"✅ Валидация готова! Время: {elapsed_time:.2f} сек")
-            batch_results = parse_validation_response(response, test_batch, elapsed_time)
+        logger.info(f"✅ Валидация готова! Время: {elapsed_time:.2f} сек")
+        stats = validator.get_stats()
+        logger.info(f"   Отсеяно без модели: {stats['prefiltered']}/{stats['pairs']}, "
+                    f"запросов к модели: {stats['model_requests']}")
         
         batch_time = 0
         for i, result in enumerate(batch_results, 1):
@@ -241,7 +134,7 @@ def main():
                 is_valid = result.get('is_valid', False)
                 reason = result.get('reason', '')
                 status = "✅ ВАЛИДЕН" if is_valid else "❌ НЕВАЛИДЕН"
-                logger.info(f"{status} {i}: {product_name}")
+                logger.info(f"{status} {i}: {product_name} ({result.get('method', '')})")
                 if reason:
                     logger.info(f"   Причина: {reason}")
                 batch_time += result.get('processing_time', 0)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Serve - HTTP-сервис классификации для нескольких клиентов
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python serve.py --port 8080 --rules --cache
+    curl -X POST http://127.0.0.1:8080/classify -d '{"name": "iPhone 15 Pro"}'
+
+Один прогретый классификатор, кэш и очередь микробатчинга на всех клиентов.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+# Настройка кодировки для Windows
+if sys.platform == "win32":
+    os.environ['PYTHONIOENCODING'] = 'utf-8'
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from ml_model import ProductClassifier
+from cascade import parse_thresholds
+from service import ClassificationServer, ClassificationService
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="HTTP-сервис классификации товаров")
+    parser.add_argument("--listen", default="127.0.0.1", help="Адрес сервиса")
+    parser.add_argument("--port", type=int, default=8080, help="Порт сервиса")
+    parser.add_argument("--max-pending", type=int, default=256,
+                        help="Товаров в работе, сверх которых запросы получают 429")
+    parser.add_argument("--max-batch", type=int, default=1000, help="Товаров в одном запросе /classify/batch")
+    parser.add_argument("--timeout", type=float, default=300, help="Ожидание результата, сек")
+    parser.add_argument("--backend", default=None, help="http или subprocess")
+    parser.add_argument("--host", default=None, help="Адрес Ollama (несколько - через запятую)")
+    parser.add_argument("--output-mode", choices=["verbose", "compact", "logprob"], default="verbose")
+    parser.add_argument("--rules", action="store_true", help="Классифицировать очевидные товары правилами")
+    parser.add_argument("--cache", action="store_true", help="Кэш результатов в .cache/")
+    parser.add_argument("--knn", action="store_true", help="Ближайшие соседи по эмбеддингам до модели")
+    parser.add_argument("--model", default="t-pro-it-2.0-optimized", help="Модель Ollama")
+    parser.add_argument("--cascade", nargs="?", const=True, default=None, metavar="MODEL",
+                        help="Сначала быстрая модель (по умолчанию t-pro-it-2.0-fast), неуверенные ответы - --model")
+    parser.add_argument("--cascade-thresholds", default=None,
+                        help="Порог уверенности каскада или JSON с порогами по категориям")
+    parser.add_argument("--dedup", nargs="?", type=float, const=True, default=None, metavar="THRESHOLD",
+                        help="Спрашивать модель об одном товаре из группы почти одинаковых названий")
+    parser.add_argument("--num-ctx", type=int, default=4096,
+                        help="Контекст модели в токенах: по нему делятся батчи, 0 - без ограничений")
+    parser.add_argument("--verbose", action="store_true", help="Подробный лог")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        encoding='utf-8'
+    )
+
+    classifier = ProductClassifier(
+        backend=args.backend, host=args.host, micro_batch=True,
+        output_mode=args.output_mode, rules=args.rules or None, cache=args.cache or None,
+        knn=args.knn or None, model=args.model, cascade=args.cascade,
+        cascade_thresholds=parse_thresholds(args.cascade_thresholds), dedup=args.dedup,
+        packer=args.num_ctx or False
+    )
+    if not classifier.load_model():
+        print("❌ Не удалось загрузить модель")
+        sys.exit(1)
+
+    service = ClassificationService(classifier, max_pending=args.max_pending, timeout=args.timeout)
+    server = ClassificationServer(service, host=args.listen, port=args.port, max_batch=args.max_batch)
+    print(f"🚀 Сервис классификации: {server.url} (/classify, /classify/batch, /health, /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Остановка сервиса")
+    finally:
+        server.stop()
+        classifier.close()
+
+
+if __name__ == "__main__":
+    main()
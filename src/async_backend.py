@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Async Backend - Асинхронный HTTP-клиент к Ollama API на asyncio
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import asyncio
+import json
+import logging
+import socket
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from backends import BackendError, BackendHTTPError, BackendTimeout, normalize_host
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHTTPBackend:
+    """Асинхронный клиент Ollama с пулом keep-alive соединений"""
+
+    name = "async_http"
+
+    def __init__(self, host: Optional[str] = None, keep_alive: Any = "30m",
+                 pool_size: int = 8, connect_timeout: float = 5.0):
+        self.host = normalize_host(host)
+        parts = urlsplit(self.host)
+        self._hostname = parts.hostname
+        self._port = parts.port
+        self._ssl = parts.scheme == "https"
+        self.keep_alive = keep_alive
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self._pool: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _acquire(self):
+        """Взять соединение из пула или открыть новое"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Соединения привязаны к циклу событий - старые не переиспользуем
+            self.close()
+            self._loop = loop
+
+        while self._pool:
+            reader, writer = self._pool.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self._hostname, self._port, ssl=self._ssl or None),
+                timeout=self.connect_timeout
+            )
+        except asyncio.TimeoutError as e:
+            raise BackendTimeout(f"Таймаут подключения к {self.host}") from e
+        except OSError as e:
+            raise BackendError(f"Ollama недоступна ({self.host}): {e}") from e
+        return reader, writer, False
+
+    def _release(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Вернуть соединение в пул"""
+        if len(self._pool) < self.pool_size:
+            self._pool.append((reader, writer))
+        else:
+            writer.close()
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str], bytes]:
+        """Прочитать HTTP/1.1 ответ (Content-Length или chunked)"""
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Соединение закрыто сервером")
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError) as e:
+            raise BackendError(f"Некорректная строка статуса: {status_line[:80]!r}") from e
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode('latin-1').partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                line = await reader.readline()
+                try:
+                    size = int(line.split(b";")[0], 16)
+                except ValueError as e:
+                    raise BackendError(f"Некорректный размер блока: {line[:80]!r}") from e
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            headers["connection"] = "close"
+
+        return status, headers, body
+
+    async def request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None,
+                      timeout: float = 120) -> Dict[str, Any]:
+        """Выполнить JSON-запрос к API"""
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else b""
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self._hostname}:{self._port}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: keep-alive\r\n\r\n"
+        ).encode('latin-1')
+
+        while True:
+            reader, writer, reused = await self._acquire()
+
+            async def exchange() -> Tuple[int, Dict[str, str], bytes]:
+                # Запись тоже под таймаутом: сервер может перестать читать
+                writer.write(head + body)
+                await writer.drain()
+                return await self._read_response(reader)
+
+            try:
+                status, headers, data = await asyncio.wait_for(exchange(), timeout)
+            except asyncio.TimeoutError as e:
+                writer.close()
+                raise BackendTimeout(f"Таймаут {timeout} сек") from e
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if reused:
+                    # Сервер закрыл простаивающее соединение - пробуем новым
+                    continue
+                raise BackendError(f"Соединение с Ollama прервано: {e}") from e
+            except (asyncio.CancelledError, BackendError):
+                writer.close()
+                raise
+
+            if headers.get("connection", "").lower() == "close":
+                writer.close()
+            else:
+                self._release(reader, writer)
+            break
+
+        if status != 200:
+            try:
+                message = json.loads(data).get("error", "")
+            except ValueError:
+                message = data.decode('utf-8', errors='replace')
+            raise BackendHTTPError(status, message)
+
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise BackendError(f"Некорректный ответ Ollama: {e}") from e
+
+    async def generate(self, model: str, prompt: str, timeout: float = 120,
+                       options: Optional[Dict[str, Any]] = None,
+                       system: Optional[str] = None,
+                       format: Optional[Any] = None,
+                       top_logprobs: int = 0) -> Dict[str, Any]:
+        """Запрос к /api/generate"""
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+        }
+        if options:
+            payload["options"] = options
+        if system:
+            payload["system"] = system
+        if format is not None:
+            payload["format"] = format
+        if top_logprobs:
+            payload["logprobs"] = True
+            payload["top_logprobs"] = top_logprobs
+        return await self.request("POST", "/api/generate", payload, timeout=timeout)
+
+    async def chat(self, model: str, messages: List[Dict[str, str]], timeout: float = 120,
+                   options: Optional[Dict[str, Any]] = None,
+                   format: Optional[Any] = None) -> Dict[str, Any]:
+        """Запрос к /api/chat"""
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+        }
+        if options:
+            payload["options"] = options
+        if format is not None:
+            payload["format"] = format
+        result = await self.request("POST", "/api/chat", payload, timeout=timeout)
+        result["response"] = result.get("message", {}).get("content", "")
+        return result
+
+    async def aclose(self):
+        """Закрыть все соединения пула"""
+        self.close()
+
+    def close(self):
+        """Закрыть соединения пула, в том числе после завершения их цикла событий"""
+        pool, self._pool = self._pool, []
+        for _, writer in pool:
+            try:
+                writer.close()
+            except RuntimeError:
+                # Цикл событий уже закрыт: транспорт не закрыть штатно - завершаем
+                # соединение на сокете, дескриптор закроется вместе с транспортом
+                sock = writer.get_extra_info("socket")
+                if sock is not None:
+                    try:
+                        sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Backends - Слой инференса для обращения к Ollama
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import json
+import logging
+import os
+import queue
+import socket
+import subprocess
+import http.client
+from typing import Dict, Any, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OLLAMA_HOST = "http://127.0.0.1:11434"
+
+
+class BackendError(Exception):
+    """Ошибка обращения к модели"""
+
+
+class BackendTimeout(BackendError):
+    """Таймаут обращения к модели"""
+
+
+class BackendHTTPError(BackendError):
+    """Ollama ответила кодом ошибки"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+def normalize_host(host: Optional[str] = None) -> str:
+    """Привести адрес Ollama к виду http://host:port"""
+    host = host or os.environ.get("OLLAMA_HOST") or DEFAULT_OLLAMA_HOST
+    if "://" not in host:
+        host = f"http://{host}"
+    parts = urlsplit(host)
+    port = parts.port or 11434
+    hostname = parts.hostname or "127.0.0.1"
+    if hostname == "0.0.0.0":
+        hostname = "127.0.0.1"
+    return f"{parts.scheme}://{hostname}:{port}"
+
+
+class InferenceBackend:
+    """Базовый интерфейс бэкенда инференса"""
+
+    name = "base"
+
+    def generate(self, model: str, prompt: str, timeout: float = 120,
+                 options: Optional[Dict[str, Any]] = None,
+                 system: Optional[str] = None,
+                 format: Optional[Any] = None,
+                 top_logprobs: int = 0) -> Dict[str, Any]:
+        """
+        Сгенерировать ответ. Возвращает словарь с ключом 'response'.
+        top_logprobs > 0 - вернуть в 'logprobs' вероятности стольких
+        альтернатив для каждого токена, если бэкенд это умеет.
+        """
+        raise NotImplementedError
+
+    def chat(self, model: str, messages: List[Dict[str, str]], timeout: float = 120,
+             options: Optional[Dict[str, Any]] = None,
+             format: Optional[Any] = None) -> Dict[str, Any]:
+        """Чат-запрос. По умолчанию склеивает сообщения в один промпт"""
+        system = "\n".join(m["content"] for m in messages if m.get("role") == "system")
+        prompt = "\n\n".join(m["content"] for m in messages if m.get("role") != "system")
+        return self.generate(model, prompt, timeout=timeout, options=options,
+                             system=system or None, format=format)
+
+    def generate_stream(self, model: str, prompt: str, timeout: float = 120,
+                        options: Optional[Dict[str, Any]] = None,
+                        system: Optional[str] = None,
+                        format: Optional[Any] = None) -> Iterator[Dict[str, Any]]:
+        """Потоковая генерация. По умолчанию - один кусок с полным ответом"""
+        yield self.generate(model, prompt, timeout=timeout, options=options,
+                            system=system, format=format)
+
+    def embed(self, model: str, inputs: List[str], timeout: float = 120) -> List[List[float]]:
+        """Векторы текстов (по одному на каждый элемент inputs)"""
+        raise BackendError(f"Бэкенд {self.name} не поддерживает эмбеддинги")
+
+    def list_models(self) -> List[str]:
+        """Список доступных моделей"""
+        raise NotImplementedError
+
+    def load(self, model: str, timeout: float = 600,
+             options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Загрузить модель в память без генерации (ответ с load_duration, если он есть)"""
+        raise BackendError(f"Бэкенд {self.name} не умеет загружать модель без запроса")
+
+    def list_running(self) -> List[Dict[str, Any]]:
+        """Модели, загруженные в память сервера (как /api/ps)"""
+        raise BackendError(f"Бэкенд {self.name} не сообщает о загруженных моделях")
+
+    def has_model(self, model: str) -> bool:
+        """Проверить наличие модели (с тегом или без)"""
+        for name in self.list_models():
+            if name == model or name.split(":")[0] == model:
+                return True
+        return False
+
+    def close(self):
+        """Освободить ресурсы"""
+
+
+class SubprocessBackend(InferenceBackend):
+    """Запуск `ollama run` отдельным процессом на каждый запрос (запасной вариант)"""
+
+    name = "subprocess"
+
+    def __init__(self, executable: str = "ollama"):
+        self.executable = executable
+
+    def generate(self, model: str, prompt: str, timeout: float = 120,
+                 options: Optional[Dict[str, Any]] = None,
+                 system: Optional[str] = None,
+                 format: Optional[Any] = None,
+                 top_logprobs: int = 0) -> Dict[str, Any]:
+        """Сгенерировать ответ через CLI (options и logprobs не поддерживаются)"""
+        if system:
+            prompt = f"{system}\n\n{prompt}"
+        command = [self.executable, "run", model]
+        if format is not None:
+            # CLI понимает только "json", схема не поддерживается
+            command += ["--format", "json"]
+        command.append(prompt)
+
+        try:
+            result = subprocess.run(
+                command,
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                timeout=timeout
+            )
+        except subprocess.TimeoutExpired as e:
+            raise BackendTimeout(f"Таймаут {timeout} сек") from e
+        except FileNotFoundError as e:
+            raise BackendError(f"Не найден {self.executable}") from e
+
+        if result.returncode != 0:
+            raise BackendError(result.stderr.strip())
+
+        return {"model": model, "response": result.stdout.strip(), "done": True}
+
+    def list_models(self) -> List[str]:
+        """Список моделей из `ollama list`"""
+        try:
+            result = subprocess.run(
+                [self.executable, "list"],
+                capture_output=True,
+                text=True,
+                encoding='utf-8'
+            )
+        except FileNotFoundError as e:
+            raise BackendError(f"Не найден {self.executable}") from e
+
+        if result.returncode != 0:
+            raise BackendError(result.stderr.strip())
+
+        models = []
+        for line in result.stdout.strip().split('\n')[1:]:
+            if line.strip():
+                models.append(line.split()[0])
+        return models
+
+    def list_running(self) -> List[Dict[str, Any]]:
+        """Загруженные модели из `ollama ps` (только имена)"""
+        try:
+            result = subprocess.run(
+                [self.executable, "ps"],
+                capture_output=True,
+                text=True,
+                encoding='utf-8'
+            )
+        except FileNotFoundError as e:
+            raise BackendError(f"Не найден {self.executable}") from e
+
+        if result.returncode != 0:
+            raise BackendError(result.stderr.strip())
+
+        return [{"name": line.split()[0]} for line in result.stdout.strip().split('\n')[1:] if line.strip()]
+
+
+class HTTPBackend(InferenceBackend):
+    """HTTP-клиент к Ollama API с пулом keep-alive соединений"""
+
+    name = "http"
+
+    # Ошибки, при которых соединение из пула считается "протухшим"
+    _STALE_ERRORS = (
+        http.client.RemoteDisconnected,
+        http.client.CannotSendRequest,
+        http.client.BadStatusLine,
+        BrokenPipeError,
+        ConnectionResetError,
+        ConnectionAbortedError,
+    )
+
+    def __init__(self, host: Optional[str] = None, keep_alive: Any = "30m",
+                 pool_size: int = 4, connect_timeout: float = 5.0):
+        self.host = normalize_host(host)
+        parts = urlsplit(self.host)
+        self._hostname = parts.hostname
+        self._port = parts.port
+        self._https = parts.scheme == "https"
+        self.keep_alive = keep_alive
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self._pool: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=pool_size)
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        """Создать новое соединение"""
+        connection_class = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        return connection_class(self._hostname, self._port, timeout=self.connect_timeout)
+
+    def _acquire(self):
+        """Взять соединение из пула или открыть новое"""
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(), False
+
+    def _release(self, connection: http.client.HTTPConnection):
+        """Вернуть соединение в пул"""
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _send(self, method: str, path: str, payload: Optional[Dict[str, Any]],
+              timeout: float):
+        """Отправить запрос, вернуть соединение и ответ с прочитанными заголовками"""
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+
+        while True:
+            connection, reused = self._acquire()
+            try:
+                if connection.sock is None:
+                    connection.connect()
+                connection.sock.settimeout(timeout)
+                connection.request(method, path, body=body, headers=headers)
+                return connection, connection.getresponse()
+            except socket.timeout as e:
+                connection.close()
+                raise BackendTimeout(f"Таймаут {timeout} сек") from e
+            except self._STALE_ERRORS as e:
+                connection.close()
+                if reused:
+                    # Сервер закрыл простаивающее соединение - пробуем новым
+                    continue
+                raise BackendError(f"Соединение с Ollama прервано: {e}") from e
+            except OSError as e:
+                connection.close()
+                raise BackendError(f"Ollama недоступна ({self.host}): {e}") from e
+
+    @staticmethod
+    def _raise_for_status(status: int, data: bytes):
+        """Ошибка API по коду ответа"""
+        if status == 200:
+            return
+        try:
+            message = json.loads(data).get("error", "")
+        except ValueError:
+            message = data.decode('utf-8', errors='replace')
+        raise BackendHTTPError(status, message)
+
+    def request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None,
+                timeout: float = 120) -> Dict[str, Any]:
+        """Выполнить JSON-запрос к API"""
+        connection, response = self._send(method, path, payload, timeout)
+        try:
+            data = response.read()
+        except socket.timeout as e:
+            connection.close()
+            raise BackendTimeout(f"Таймаут {timeout} сек") from e
+        except OSError as e:
+            connection.close()
+            raise BackendError(f"Соединение с Ollama прервано: {e}") from e
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+
+        self._raise_for_status(response.status, data)
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise BackendError(f"Некорректный ответ Ollama: {e}") from e
+
+    def _generate_payload(self, model: str, prompt: str, stream: bool,
+                          options: Optional[Dict[str, Any]],
+                          system: Optional[str],
+                          format: Optional[Any],
+                          top_logprobs: int = 0) -> Dict[str, Any]:
+        """Тело запроса к /api/generate"""
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }
+        if options:
+            payload["options"] = options
+        if system:
+            payload["system"] = system
+        if format is not None:
+            payload["format"] = format
+        if top_logprobs:
+            payload["logprobs"] = True
+            payload["top_logprobs"] = top_logprobs
+        return payload
+
+    def generate(self, model: str, prompt: str, timeout: float = 120,
+                 options: Optional[Dict[str, Any]] = None,
+                 system: Optional[str] = None,
+                 format: Optional[Any] = None,
+                 top_logprobs: int = 0) -> Dict[str, Any]:
+        """Запрос к /api/generate"""
+        payload = self._generate_payload(model, prompt, False, options, system, format, top_logprobs)
+        return self.request("POST", "/api/generate", payload, timeout=timeout)
+
+    def generate_stream(self, model: str, prompt: str, timeout: float = 120,
+                        options: Optional[Dict[str, Any]] = None,
+                        system: Optional[str] = None,
+                        format: Optional[Any] = None) -> Iterator[Dict[str, Any]]:
+        """Потоковый запрос к /api/generate (timeout - между кусками ответа)"""
+        payload = self._generate_payload(model, prompt, True, options, system, format)
+        connection, response = self._send("POST", "/api/generate", payload, timeout)
+        if response.status != 200:
+            data = response.read()
+            connection.close()
+            self._raise_for_status(response.status, data)
+
+        completed = False
+        try:
+            for line in response:
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise BackendError(chunk["error"])
+                yield chunk
+                if chunk.get("done"):
+                    completed = True
+                    break
+        except socket.timeout as e:
+            raise BackendTimeout(f"Таймаут {timeout} сек") from e
+        except ValueError as e:
+            raise BackendError(f"Некорректный ответ Ollama: {e}") from e
+        except OSError as e:
+            raise BackendError(f"Соединение с Ollama прервано: {e}") from e
+        finally:
+            if completed and not response.will_close:
+                # Дочитываем конец chunked-ответа, чтобы вернуть соединение в пул
+                response.read()
+                self._release(connection)
+            else:
+                connection.close()
+
+    def chat(self, model: str, messages: List[Dict[str, str]], timeout: float = 120,
+             options: Optional[Dict[str, Any]] = None,
+             format: Optional[Any] = None) -> Dict[str, Any]:
+        """Запрос к /api/chat"""
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+        }
+        if options:
+            payload["options"] = options
+        if format is not None:
+            payload["format"] = format
+        result = self.request("POST", "/api/chat", payload, timeout=timeout)
+        result["response"] = result.get("message", {}).get("content", "")
+        return result
+
+    def embed(self, model: str, inputs: List[str], timeout: float = 120) -> List[List[float]]:
+        """Запрос к /api/embed"""
+        payload = {"model": model, "input": inputs, "keep_alive": self.keep_alive}
+        result = self.request("POST", "/api/embed", payload, timeout=timeout)
+        embeddings = result.get("embeddings")
+        if not isinstance(embeddings, list) or len(embeddings) != len(inputs):
+            raise BackendError("Некорректный ответ /api/embed")
+        return embeddings
+
+    def list_models(self) -> List[str]:
+        """Список моделей из /api/tags"""
+        result = self.request("GET", "/api/tags", timeout=self.connect_timeout)
+        return [model.get("name", "") for model in result.get("models", [])]
+
+    def load(self, model: str, timeout: float = 600,
+             options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Пустой промпт в /api/generate - Ollama только загружает модель и продлевает keep_alive"""
+        payload = {"model": model, "prompt": "", "stream": False, "keep_alive": self.keep_alive}
+        if options:
+            # С другим num_ctx Ollama перезагрузит модель на первом же запросе
+            payload["options"] = options
+        return self.request("POST", "/api/generate", payload, timeout=timeout)
+
+    def list_running(self) -> List[Dict[str, Any]]:
+        """Загруженные модели из /api/ps"""
+        result = self.request("GET", "/api/ps", timeout=self.connect_timeout)
+        return result.get("models", [])
+
+    def close(self):
+        """Закрыть все соединения пула"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+BACKENDS = ("http", "subprocess")
+
+
+def create_backend(kind: Optional[str] = None, host: Optional[str] = None,
+                   keep_alive: Any = "30m", pool_size: int = 4) -> InferenceBackend:
+    """Создать бэкенд по имени ('http' или 'subprocess')"""
+    kind = kind or os.environ.get("ML_CLASSIFIER_BACKEND", "http")
+    if kind == "http":
+        return HTTPBackend(host=host, keep_alive=keep_alive, pool_size=pool_size)
+    if kind == "subprocess":
+        return SubprocessBackend()
+    raise ValueError(f"Неизвестный бэкенд: {kind}")
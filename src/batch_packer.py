@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Batch Packer - Оценка токенов промпта и разбиение батча по размеру контекста модели
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import logging
+import math
+import threading
+from typing import Dict, Any, Callable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# num_ctx из Modelfile.optimized
+DEFAULT_CONTEXT_WINDOW = 4096
+DEFAULT_DESCRIPTION_TOKENS = 256
+# Номер, "Товар:", "Описание:" и переносы строк одного товара в батч-промпте
+ITEM_OVERHEAD_TOKENS = 12
+# Запас на неточность оценки и служебные токены шаблона чата
+RESERVE_TOKENS = 128
+# Ответов Ollama, после которых множитель оценки подстраивается, и его пределы
+MIN_CALIBRATION_SAMPLES = 3
+SCALE_LIMITS = (0.5, 2.0)
+
+# Символов на токен для BPE-словаря T-pro (Qwen): латиница сжимается лучше
+# кириллицы, цифры идут по одной, знаки препинания - почти всегда отдельно
+CHARS_PER_TOKEN = {
+    "latin": 4.0,
+    "cyrillic": 3.0,
+    "other": 2.0,
+}
+
+
+def estimate_tokens(text: str, scale: float = 1.0) -> int:
+    """Оценка числа токенов по письменностям, без токенизатора"""
+    latin = cyrillic = digits = other = 0
+    for char in text or "":
+        if char.isspace():
+            continue
+        if "a" <= char.lower() <= "z":
+            latin += 1
+        elif "а" <= char.lower() <= "я" or char in "ёЁ":
+            cyrillic += 1
+        elif char.isdigit():
+            digits += 1
+        else:
+            other += 1
+    tokens = latin / CHARS_PER_TOKEN["latin"] + cyrillic / CHARS_PER_TOKEN["cyrillic"] + \
+        digits + other / CHARS_PER_TOKEN["other"]
+    return int(tokens * scale + 0.999)
+
+
+def load_tokenizer(path: str) -> Callable[[str], int]:
+    """Счетчик токенов по tokenizer.json модели (нужен пакет tokenizers)"""
+    # tokenizers нужен только для точного подсчета
+    from tokenizers import Tokenizer
+    tokenizer = Tokenizer.from_file(path)
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+class BatchPacker:
+    """
+    Обрезает описания до бюджета токенов и делит товары на батчи, каждый из
+    которых вместе с ответом модели помещается в контекст (num_ctx).
+    """
+
+    def __init__(self, context_window: int = DEFAULT_CONTEXT_WINDOW,
+                 max_description_tokens: int = DEFAULT_DESCRIPTION_TOKENS,
+                 max_items: Optional[int] = None, reserve_tokens: int = RESERVE_TOKENS,
+                 tokenizer: Union[Callable[[str], int], str, None] = None, scale: float = 1.0):
+        """
+        context_window: размер контекста модели в токенах (промпт + ответ)
+        max_description_tokens: бюджет описания одного товара, длиннее - обрезается
+        max_items: не больше стольких товаров в батче (None - только по токенам)
+        tokenizer: функция текст -> число токенов или путь к tokenizer.json;
+                   без него - оценка по письменностям с множителем scale
+        """
+        self.context_window = context_window
+        self.max_description_tokens = max_description_tokens
+        self.max_items = max_items
+        self.reserve_tokens = reserve_tokens
+        self.tokenizer = load_tokenizer(tokenizer) if isinstance(tokenizer, str) else tokenizer
+        self.scale = scale
+        self._lock = threading.Lock()
+        # Оценка без множителя и prompt_eval_count по всем учтенным промптам
+        self._estimated = self._counted = 0
+        self.stats = {
+            "items": 0,
+            "batches": 0,
+            "split_calls": 0,
+            "truncated": 0,
+            "calibration_samples": 0,
+        }
+
+    def count(self, text: str) -> int:
+        """Число токенов текста"""
+        if self.tokenizer is not None:
+            return self.tokenizer(text)
+        return estimate_tokens(text, self.scale)
+
+    def calibrate(self, texts: List[str], counts: List[int]) -> float:
+        """Подобрать множитель оценки по точным числам токенов (prompt_eval_count холодных запросов)"""
+        for text, count in zip(texts, counts):
+            self._add_sample(estimate_tokens(text), count)
+        return self.scale
+
+    def observe(self, text: str, count: int, cached_prefix: str = ""):
+        """
+        Учесть prompt_eval_count ответа на промпт text. Ollama не считает токены
+        префикса из своего кэша, поэтому число сравнивается с оценкой всего
+        промпта или промпта без cached_prefix - с той, что ближе к текущему множителю
+        """
+        if self.tokenizer is not None or not count or not text:
+            return
+        estimates = [estimate_tokens(text)]
+        if cached_prefix and text.startswith(cached_prefix):
+            estimates.append(estimate_tokens(text[len(cached_prefix):]))
+        estimated = min((value for value in estimates if value),
+                        key=lambda value: abs(math.log(count / (value * self.scale))), default=0)
+        if estimated:
+            self._add_sample(estimated, count)
+
+    def _add_sample(self, estimated: int, count: int):
+        """Пересчитать множитель оценки по всем учтенным промптам"""
+        with self._lock:
+            self._estimated += estimated
+            self._counted += count
+            self.stats["calibration_samples"] += 1
+            if self.stats["calibration_samples"] >= MIN_CALIBRATION_SAMPLES and self._estimated:
+                low, high = SCALE_LIMITS
+                self.scale = min(high, max(low, self._counted / self._estimated))
+
+    def truncate(self, text: str, budget: int) -> str:
+        """Текст целыми словами в пределах budget токенов"""
+        if not text or self.count(text) <= budget:
+            return text or ""
+        words = text.split()
+        low, high = 0, len(words)
+        # Самый длинный префикс слов, который влезает вместе с многоточием
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(" ".join(words[:middle]) + " …") <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        return " ".join(words[:low]) + " …" if low else ""
+
+    def description(self, product: Dict[str, str]) -> str:
+        """Описание товара в пределах бюджета"""
+        return self.truncate(product.get("description", ""), self.max_description_tokens)
+
+    def item_tokens(self, product: Dict[str, str]) -> int:
+        """Токены товара в батч-промпте (с обрезанным описанием)"""
+        description = min(self.count(product.get("description", "")), self.max_description_tokens)
+        return self.count(product.get("name", "")) + description + ITEM_OVERHEAD_TOKENS
+
+    def pack(self, products: list, prompt_tokens: int = 0, output_tokens: int = 0) -> List[List[int]]:
+        """
+        Индексы товаров по батчам в исходном порядке.
+        prompt_tokens: инструкция без товаров, output_tokens: ответ модели на один товар
+        """
+        budget = self.context_window - self.reserve_tokens - prompt_tokens
+        batches: List[List[int]] = []
+        current: List[int] = []
+        used = truncated = 0
+        for i, product in enumerate(products):
+            # Описание обрезается при каждой сборке промпта - считаем товар здесь, один раз
+            truncated += self.count(product.get("description", "")) > self.max_description_tokens
+            tokens = self.item_tokens(product) + output_tokens
+            full = self.max_items is not None and len(current) >= self.max_items
+            if current and (used + tokens > budget or full):
+                batches.append(current)
+                current, used = [], 0
+            # Товар больше бюджета все равно уходит - отдельным батчем
+            current.append(i)
+            used += tokens
+        if current:
+            batches.append(current)
+        with self._lock:
+            self.stats["items"] += len(products)
+            self.stats["batches"] += len(batches)
+            self.stats["split_calls"] += 1 if len(batches) > 1 else 0
+            self.stats["truncated"] += truncated
+        return batches
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Сколько батчей пришлось разбить и описаний обрезать"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["context_window"] = self.context_window
+        stats["max_description_tokens"] = self.max_description_tokens
+        stats["tokenizer"] = "local" if self.tokenizer is not None else f"heuristic x{self.scale:.2f}"
+        return stats
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Batcher - Адаптивная сборка одиночных запросов в батчи
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def is_parse_failure(result: Dict[str, Any]) -> bool:
+    """Результат батча, который модель не вернула или вернула неразборчиво"""
+    # unknown с нулевой уверенностью - обычный ответ модели, а не сбой разбора
+    return "error" in result or bool(result.get("missing")) or \
+        result.get("method", "").endswith("_fallback")
+
+
+class MicroBatcher:
+    """
+    Фоновый сборщик батчей.
+
+    Одиночные запросы копятся в очереди, пока не наберется batch_size товаров
+    или не пройдет max_wait_ms с первого из них, затем уходят одним батч-промптом.
+    Результаты раздаются в Future каждого вызывающего.
+
+    Размер батча подбирается автоматически: для каждого размера хранится
+    скользящее среднее времени на товар, батч растет, пока это время падает,
+    и уменьшается вдвое, если доля неразобранных ответов выше max_failure_rate.
+    """
+
+    def __init__(self, dispatch: Callable[[List[Dict[str, str]]], List[Dict[str, Any]]],
+                 max_batch_size: int = 32, min_batch_size: int = 1,
+                 initial_batch_size: int = 8, max_wait_ms: float = 50,
+                 max_in_flight: int = 1, max_failure_rate: float = 0.2,
+                 on_queue_wait: Optional[Callable[[float], None]] = None):
+        """
+        dispatch: функция классификации списка товаров (например, батч-промптом)
+        max_in_flight: сколько батчей одновременно отправляется модели
+        on_queue_wait: вызывается для каждого товара со временем от submit до отправки, сек
+        """
+        self.dispatch = dispatch
+        self.on_queue_wait = on_queue_wait
+        self.max_batch_size = max_batch_size
+        self.min_batch_size = min_batch_size
+        self.batch_size = max(min_batch_size, min(initial_batch_size, max_batch_size))
+        self.max_wait = max_wait_ms / 1000
+        self.max_failure_rate = max_failure_rate
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="batch")
+        self._lock = threading.Lock()
+        self._latency: Dict[int, float] = {}
+        self._failure_rate = 0.0
+        self._closed = False
+        self.stats = {
+            "batches": 0,
+            "items": 0,
+            "failures": 0,
+            "errors": 0,
+        }
+
+        self._thread = threading.Thread(target=self._collect_loop, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, product: Dict[str, str]) -> Future:
+        """Поставить товар в очередь, вернуть Future с результатом"""
+        future: Future = Future()
+        # Под блокировкой: иначе товар может встать в очередь после _STOP и не получить ответ
+        with self._lock:
+            if not self._closed:
+                self._queue.put((product, future, time.monotonic()))
+                return future
+        future.set_result({"error": "Батчер остановлен"})
+        return future
+
+    def _collect_loop(self):
+        """Собирать батчи и отправлять их на классификацию"""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            target = self.batch_size
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while len(batch) < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            # Ждем свободный слот - пока модель занята, очередь продолжает копиться
+            self._slots.acquire()
+            self._executor.submit(self._run_batch, batch)
+            if stop:
+                break
+
+        self._drain()
+
+    def _run_batch(self, batch: List[tuple]):
+        """Классифицировать батч и раздать результаты"""
+        products = [product for product, _, _ in batch]
+        if self.on_queue_wait is not None:
+            now = time.monotonic()
+            for _, _, submitted in batch:
+                self.on_queue_wait(now - submitted)
+        try:
+            start_time = time.time()
+            try:
+                results = self.dispatch(products)
+            except Exception as e:
+                logger.error(f"❌ Ошибка батча: {e}")
+                results = [{"error": f"Ошибка батч классификации: {e}"}] * len(products)
+                with self._lock:
+                    self.stats["errors"] += 1
+            elapsed_time = time.time() - start_time
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+            for _, future, _ in batch[len(results):]:
+                future.set_result({"error": "Нет результата в ответе батча"})
+
+            failures = sum(1 for result in results if is_parse_failure(result))
+            failures += len(batch) - len(results)
+            self._adapt(len(batch), elapsed_time, failures)
+        finally:
+            self._slots.release()
+
+    def _adapt(self, size: int, elapsed_time: float, failures: int):
+        """Подстроить размер батча по времени на товар и доле сбоев"""
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["items"] += size
+            self.stats["failures"] += failures
+
+            alpha = 0.3
+            self._failure_rate = (1 - alpha) * self._failure_rate + alpha * failures / size
+            per_item = elapsed_time / size
+            previous = self._latency.get(size)
+            self._latency[size] = per_item if previous is None else (1 - alpha) * previous + alpha * per_item
+
+            if self._failure_rate > self.max_failure_rate:
+                new_size = max(self.min_batch_size, self.batch_size // 2)
+                # Сбрасываем статистику, чтобы снова расти осторожно
+                self._failure_rate = 0.0
+            elif size < self.batch_size:
+                # Неполный батч - нагрузки мало, о размере судить рано
+                return
+            else:
+                smaller = self._latency.get(size - 1)
+                if smaller is not None and self._latency[size] > smaller * 1.05:
+                    new_size = max(self.min_batch_size, self.batch_size - 1)
+                else:
+                    new_size = min(self.max_batch_size, self.batch_size + 1)
+
+            if new_size != self.batch_size:
+                logger.debug(f"📦 Размер батча: {self.batch_size} -> {new_size}")
+                self.batch_size = new_size
+
+    def _drain(self):
+        """Завершить запросы, оставшиеся в очереди после остановки"""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                item[1].set_result({"error": "Батчер остановлен"})
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика батчера"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["batch_size"] = self.batch_size
+            stats["failure_rate"] = self._failure_rate
+            stats["avg_batch"] = stats["items"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def close(self):
+        """Остановить батчер, дождавшись отправленных батчей"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+        self._executor.shutdown(wait=True)
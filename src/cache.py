@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Cache - Двухуровневый кэш результатов классификации (LRU в памяти + SQLite)
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / ".cache" / "classifications.sqlite3"
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Нормализовать текст товара для ключа кэша"""
+    return _SPACES_RE.sub(" ", (text or "").lower()).strip()
+
+
+def make_fingerprint(*parts: Any) -> str:
+    """Отпечаток конфигурации (модель, категории, шаблон промпта)"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def make_key(product: Dict[str, str], fingerprint: str) -> str:
+    """Ключ кэша: хэш нормализованных названия и описания + отпечаток"""
+    text = normalize_text(product.get("name", "")) + "\x1f" + normalize_text(product.get("description", ""))
+    return hashlib.sha256(f"{fingerprint}\x1f{text}".encode('utf-8')).hexdigest()
+
+
+class ClassificationCache:
+    """Кэш результатов: LRU в памяти поверх SQLite на диске"""
+
+    def __init__(self, path: Optional[str] = None, memory_size: int = 10000,
+                 max_rows: int = 1000000, ttl: Optional[float] = 7 * 24 * 3600):
+        """
+        path: файл SQLite; None - путь по умолчанию, ":memory:" - без диска
+        memory_size: максимум записей в LRU
+        max_rows: максимум записей на диске (вытесняются давно не использованные)
+        ttl: время жизни записи в секундах (None - бессрочно)
+        """
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evicted": 0,
+        }
+
+        path = str(path or DEFAULT_CACHE_PATH)
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS classifications (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_accessed ON classifications (accessed_at)"
+        )
+        self._db.commit()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get(self, product: Dict[str, str], fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Найти результат в кэше"""
+        key = make_key(product, fingerprint)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._is_expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return dict(value)
+                del self._memory[key]
+
+            row = self._db.execute(
+                "SELECT value, created_at FROM classifications WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            value, created_at = json.loads(row[0]), row[1]
+            if self._is_expired(created_at, now):
+                self._db.execute("DELETE FROM classifications WHERE key = ?", (key,))
+                self._db.commit()
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self._db.execute(
+                "UPDATE classifications SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._db.commit()
+            self._remember(key, value, created_at)
+            self.stats["disk_hits"] += 1
+            return dict(value)
+
+    def put(self, product: Dict[str, str], fingerprint: str, value: Dict[str, Any]):
+        """Сохранить результат в кэш"""
+        key = make_key(product, fingerprint)
+        now = time.time()
+
+        with self._lock:
+            self._remember(key, value, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO classifications VALUES (?, ?, ?, ?, ?)",
+                (key, fingerprint, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._writes += 1
+            # Проверяем размер не на каждую запись
+            if self._writes % 100 == 0:
+                self._evict_disk()
+            self._db.commit()
+
+    def _remember(self, key: str, value: Dict[str, Any], created_at: float):
+        """Положить запись в LRU с вытеснением"""
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def _evict_disk(self):
+        """Удалить просроченные и лишние записи на диске"""
+        if self.ttl is not None:
+            cursor = self._db.execute(
+                "DELETE FROM classifications WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            self.stats["expired"] += max(cursor.rowcount, 0)
+
+        count = self._db.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+        excess = count - self.max_rows
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM classifications WHERE key IN ("
+                "SELECT key FROM classifications ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            )
+            self.stats["evicted"] += excess
+
+    def clear(self):
+        """Очистить кэш полностью"""
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM classifications")
+            self._db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий и промахов"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_items"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        total = hits + stats["misses"]
+        stats["hit_rate"] = hits / total if total else 0.0
+        return stats
+
+    def close(self):
+        """Закрыть базу (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self._db is None:
+                return
+            self._db.commit()
+            self._db.close()
+            self._db = None
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Cascade - Каскад из быстрой и точной модели с эскалацией по уверенности
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Dict, Any, Callable, List, Optional, Union
+
+from metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FAST_MODEL = "t-pro-it-2.0-fast"
+DEFAULT_THRESHOLD = 0.8
+
+
+def load_thresholds(path: str) -> Dict[str, float]:
+    """Пороги из JSON: {"категория": порог, ..., "default": порог}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return {category: float(value) for category, value in json.load(f).items()}
+
+
+def parse_thresholds(value: Optional[str]) -> Union[float, str, None]:
+    """Порог из командной строки: число или путь к JSON с порогами"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+class ModelCascade:
+    """
+    Быстрая модель отвечает первой; товары, у которых ее уверенность ниже порога
+    своей категории (ошибки и unknown - всегда), переспрашиваются у точной модели.
+    Правила, кэш и соседи по эмбеддингам работают до каскада, как и без него.
+    """
+
+    def __init__(self, classifier, thresholds: Union[float, Dict[str, float], None] = None,
+                 registry: Optional[MetricsRegistry] = None):
+        """
+        classifier: ProductClassifier быстрой модели (без своих кэша и правил)
+        thresholds: общий порог или {категория: порог}, ключ "default" - для остальных
+        """
+        self.classifier = classifier
+        if isinstance(thresholds, dict):
+            self.thresholds = {key: value for key, value in thresholds.items() if key != "default"}
+            self.default_threshold = thresholds.get("default", DEFAULT_THRESHOLD)
+        else:
+            self.thresholds = {}
+            self.default_threshold = DEFAULT_THRESHOLD if thresholds is None else thresholds
+        self._lock = threading.Lock()
+        self.stats = {
+            "items": 0,
+            "escalated": 0,
+            "changed": 0,
+            "fast_time": 0.0,
+            "accurate_time": 0.0,
+        }
+        self._escalations = None
+        if registry is not None:
+            self._escalations = registry.counter(
+                "classifier_cascade_escalations_total",
+                "Товары, переданные точной модели, по категории быстрой модели", ("category",))
+
+    @property
+    def fast_model(self) -> str:
+        return self.classifier.model_name
+
+    def threshold(self, category: str) -> float:
+        """Порог уверенности категории"""
+        return self.thresholds.get(category, self.default_threshold)
+
+    def should_escalate(self, result: Dict[str, Any]) -> bool:
+        """Нужна ли точная модель для ответа быстрой"""
+        if "error" in result:
+            return True
+        category = result.get("predicted_category", "unknown")
+        if category == "unknown":
+            return True
+        return result.get("confidence", 0.0) < self.threshold(category)
+
+    def merge(self, fast: Dict[str, Any], accurate: Dict[str, Any]) -> Dict[str, Any]:
+        """Ответ точной модели с пометкой, что ответила быстрая"""
+        if "error" in accurate and "error" not in fast:
+            # Точная модель не ответила - лучше неуверенный ответ, чем никакого
+            return fast
+        accurate["escalated_from"] = {
+            "model": self.fast_model,
+            "category": fast.get("predicted_category", "unknown"),
+            "confidence": fast.get("confidence", 0.0),
+        }
+        return accurate
+
+    def record(self, fast: List[Dict[str, Any]], escalated: List[Dict[str, Any]],
+               fast_time: float, accurate_time: float = 0.0):
+        """Учесть вызов каскада: ответы быстрой модели и эскалированные из них"""
+        changed = sum(1 for result in escalated if "escalated_from" in result
+                      and result.get("predicted_category") != result["escalated_from"]["category"])
+        with self._lock:
+            self.stats["items"] += len(fast)
+            self.stats["escalated"] += len(escalated)
+            self.stats["changed"] += changed
+            self.stats["fast_time"] += fast_time
+            self.stats["accurate_time"] += accurate_time
+        if self._escalations is not None:
+            for result in escalated:
+                category = result.get("escalated_from", {}).get("category", "unknown")
+                self._escalations.labels(category).inc()
+
+    def run(self, products: list, fast: Callable[[list], list], accurate: Callable[[list], list]) -> list:
+        """Классифицировать быстрой моделью и переспросить точную для неуверенных ответов"""
+        start_time = time.perf_counter()
+        results = fast(products)
+        fast_time = time.perf_counter() - start_time
+        pending = [i for i, result in enumerate(results) if self.should_escalate(result)]
+        if not pending:
+            self.record(results, [], fast_time)
+            return results
+
+        logger.info(f"⬆️ Каскад: {len(pending)} из {len(products)} товаров - точной модели")
+        start_time = time.perf_counter()
+        second = accurate([products[i] for i in pending])
+        accurate_time = time.perf_counter() - start_time
+        escalated = []
+        for i, result in zip(pending, second):
+            results[i] = self.merge(results[i], result)
+            escalated.append(results[i])
+        self.record(results, escalated, fast_time, accurate_time)
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Доля эскалаций и время каждой ступени"""
+        with self._lock:
+            stats = dict(self.stats)
+        items = stats["items"]
+        stats["fast_model"] = self.fast_model
+        stats["escalation_rate"] = stats["escalated"] / items if items else 0.0
+        stats["avg_fast_time"] = stats["fast_time"] / items if items else 0.0
+        stats["avg_accurate_time"] = stats["accurate_time"] / stats["escalated"] if stats["escalated"] else 0.0
+        stats["thresholds"] = {**self.thresholds, "default": self.default_threshold}
+        return stats
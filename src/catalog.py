@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Catalog - Потоковое чтение каталогов товаров и запись результатов с чекпоинтами
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import codecs
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
+
+PathLike = Union[str, Path]
+
+# Товар и смещение в байтах сразу после него - с него продолжается чтение
+Record = Tuple[Dict[str, Any], int]
+
+_SEPARATORS = " \t\r\n,["
+
+
+def detect_format(path: PathLike) -> str:
+    """'jsonl' или 'json' (массив) по расширению, иначе по первому символу"""
+    suffix = Path(path).suffix.lower()
+    if suffix in (".jsonl", ".ndjson"):
+        return "jsonl"
+    with open(path, 'rb') as f:
+        head = f.read(4096).lstrip()
+    return "json" if head.startswith(b"[") else "jsonl"
+
+
+def iter_jsonl(path: PathLike, offset: int = 0) -> Iterator[Record]:
+    """Товары из JSONL по одному на строку"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            if line.strip():
+                yield json.loads(line), offset
+
+
+def iter_json_array(path: PathLike, offset: int = 0, chunk_size: int = 1 << 16) -> Iterator[Record]:
+    """
+    Товары из JSON-массива без загрузки файла целиком.
+    Файл читается кусками, каждый элемент разбирается raw_decode по месту;
+    смещения считаются в байтах, чтобы продолжить чтение через seek.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        buffer, pos, eof = "", 0, False
+        while True:
+            # Разделители между элементами - ASCII, один байт на символ
+            while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+                pos += 1
+                offset += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+
+            try:
+                if pos == len(buffer):
+                    raise ValueError("буфер пуст")
+                item, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if eof:
+                    if pos < len(buffer):
+                        raise ValueError(f"Некорректный JSON около байта {offset}")
+                    return
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + utf8.decode(chunk, final=eof)
+                pos = 0
+                continue
+
+            offset += len(buffer[pos:end].encode('utf-8'))
+            pos = end
+            if isinstance(item, dict):
+                yield item, offset
+
+
+def iter_products(path: PathLike, offset: int = 0) -> Iterator[Record]:
+    """Товары из JSON-массива или JSONL, начиная со смещения"""
+    if detect_format(path) == "json":
+        return iter_json_array(path, offset)
+    return iter_jsonl(path, offset)
+
+
+class JSONLSink:
+    """Результаты в JSONL; при продолжении хвост после чекпоинта обрезается"""
+
+    def __init__(self, path: PathLike):
+        self.path = Path(path)
+        self._file = open(self.path, 'ab')
+
+    def restore(self, state: Dict[str, Any]):
+        """Вернуть файл к состоянию из чекпоинта"""
+        self._file.truncate(state.get("bytes", 0))
+        self._file.seek(0, os.SEEK_END)
+
+    def write(self, records: List[Dict[str, Any]]):
+        """Дописать записи"""
+        self._file.write("".join(
+            json.dumps(record, ensure_ascii=False) + "\n" for record in records
+        ).encode('utf-8'))
+
+    def flush(self) -> Dict[str, Any]:
+        """Сбросить на диск, вернуть состояние для чекпоинта"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"bytes": self._file.tell()}
+
+    def close(self):
+        """Закрыть файл"""
+        self._file.close()
+
+
+class CSVSink(JSONLSink):
+    """Результаты в CSV; колонки - по первой записи"""
+
+    def __init__(self, path: PathLike):
+        super().__init__(path)
+        self.fields: Optional[List[str]] = None
+
+    def restore(self, state: Dict[str, Any]):
+        super().restore(state)
+        self.fields = state.get("fields")
+
+    def write(self, records: List[Dict[str, Any]]):
+        if not records:
+            return
+        lines = _LineBuffer()
+        if self.fields is None:
+            self.fields = list(records[0])
+        writer = csv.DictWriter(lines, fieldnames=self.fields, extrasaction="ignore")
+        if self._file.tell() == 0:
+            writer.writeheader()
+        writer.writerows(records)
+        self._file.write(lines.getvalue().encode('utf-8'))
+
+    def flush(self) -> Dict[str, Any]:
+        state = super().flush()
+        state["fields"] = self.fields
+        return state
+
+
+class _LineBuffer(list):
+    """Минимальный файловый объект для csv.writer"""
+
+    def write(self, text: str):
+        self.append(text)
+
+    def getvalue(self) -> str:
+        return "".join(self)
+
+
+class ParquetSink:
+    """
+    Результаты в Parquet: каталог с файлом part-NNNNN.parquet на каждый
+    чекпоинт (Parquet нельзя дописывать). Нужен pyarrow.
+    """
+
+    def __init__(self, path: PathLike):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise RuntimeError("Для записи Parquet нужен pyarrow: pip install pyarrow") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.parts = 0
+        self._pending: List[Dict[str, Any]] = []
+
+    def restore(self, state: Dict[str, Any]):
+        """Удалить части, записанные после чекпоинта"""
+        self.parts = state.get("parts", 0)
+        for part in self.path.glob("part-*.parquet"):
+            if int(part.stem.split("-")[1]) >= self.parts:
+                part.unlink()
+
+    def write(self, records: List[Dict[str, Any]]):
+        self._pending.extend(records)
+
+    def flush(self) -> Dict[str, Any]:
+        if self._pending:
+            table = self._pa.Table.from_pylist(self._pending)
+            temporary = self.path / f".part-{self.parts:05d}.tmp"
+            self._pq.write_table(table, temporary)
+            temporary.replace(self.path / f"part-{self.parts:05d}.parquet")
+            self.parts += 1
+            self._pending = []
+        return {"parts": self.parts}
+
+    def close(self):
+        self._pending = []
+
+
+SINKS = {"jsonl": JSONLSink, "csv": CSVSink, "parquet": ParquetSink}
+
+
+def open_sink(path: PathLike, format: Optional[str] = None):
+    """Открыть приемник результатов; формат - по расширению, если не задан"""
+    format = format or {".csv": "csv", ".parquet": "parquet"}.get(Path(path).suffix.lower(), "jsonl")
+    if format not in SINKS:
+        raise ValueError(f"Неизвестный формат вывода: {format}")
+    return SINKS[format](path)
+
+
+class Checkpoint:
+    """Состояние обработки в JSON рядом с результатом, запись атомарная"""
+
+    def __init__(self, path: PathLike):
+        self.path = Path(path)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Прочитать чекпоинт (None - начинать сначала)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, state: Dict[str, Any]):
+        """Записать чекпоинт"""
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        temporary.replace(self.path)
+
+    def clear(self):
+        """Удалить чекпоинт"""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
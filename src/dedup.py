@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Dedup - Нормализация названий товаров и объединение почти одинаковых перед моделью
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import hashlib
+import logging
+import random
+import re
+import threading
+from typing import Dict, Any, Callable, FrozenSet, List, Optional
+
+from metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.8
+
+# Кириллические буквы, похожие на латинские: в токенах с латиницей или
+# цифрами ("iРhone", "RТX 4080") заменяются, чтобы ключ не зависел от раскладки
+HOMOGLYPHS = str.maketrans("авсекмнорстухі", "abcekmhopctyxi")
+
+UNITS = {
+    "гб": "gb", "gb": "gb",
+    "тб": "tb", "tb": "tb",
+    "мб": "mb", "mb": "mb",
+    "мгц": "mhz", "mhz": "mhz", "ггц": "ghz", "ghz": "ghz",
+    "вт": "w", "w": "w",
+    "дюйм": "in", "дюйма": "in", "дюймов": "in", "\"": "in",
+}
+
+COLORS = {
+    "black", "white", "silver", "gold", "gray", "grey", "graphite", "blue", "red", "green",
+    "purple", "pink", "yellow", "midnight", "starlight", "titanium", "natural", "desert", "space",
+    "черный", "белый", "серебристый", "серебряный", "золотой", "золотистый", "серый", "графитовый",
+    "синий", "голубой", "красный", "зеленый", "фиолетовый", "розовый", "желтый", "титановый",
+    "натуральный", "космический", "темная", "ночь",
+}
+
+# Слова продавцов, которые не меняют товар
+SELLER_NOISE = {
+    "новый", "новая", "новое", "new", "оригинал", "оригинальный", "original", "ростест", "eac",
+    "гарантия", "официальный", "официальная", "в", "наличии", "доставка", "быстрая", "бесплатная",
+    "скидка", "акция", "sale", "хит", "топ", "global", "ru", "рст", "sealed", "запечатанный", "шт",
+}
+
+# Тип товара и аксессуары (начала слов): чехол для iPhone - не iPhone, поэтому
+# такие слова, как и числа, у объединяемых товаров должны совпадать
+TYPE_STEMS = (
+    "для", "for",
+    "чехл", "чехол", "кейс", "case", "cover", "бампер", "накладк", "стекл", "glass", "пленк", "film",
+    "кабел", "cable", "шнур", "провод", "заряд", "charger", "адаптер", "adapter", "переходник",
+    "шлейф", "кулер", "cooler", "вентилятор", "термопаст", "термопрокладк", "радиатор",
+    "подставк", "stand", "держател", "holder", "крепл", "кронштейн", "корпус", "блок", "сумк", "bag",
+    "наушник", "гарнитур", "геймпад", "gamepad", "джойстик", "контроллер", "controller", "dualsense",
+    "стилус", "клавиатур", "мыш", "dock", "станци", "хаб", "hub", "ремонт", "запчаст", "дисплей",
+    "экран", "аккумулятор", "батаре", "карта", "картридж", "наклейк", "скин", "коробк",
+    "видеокарт", "процессор", "материнск", "ноутбук", "laptop", "смартфон", "телефон", "приставк",
+    "консол", "планшет",
+)
+
+_TOKEN_RE = re.compile(r"[0-9a-zа-я]+|\"")
+_UNIT_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(гб|gb|тб|tb|мб|mb|мгц|mhz|ггц|ghz|вт|w|дюйм\w*|\")(?![0-9a-zа-я])")
+_BRACKETS_RE = re.compile(r"[\(\[\{][^\)\]\}]*[\)\]\}]")
+
+_PRIME = (1 << 61) - 1
+
+
+def normalize_name(text: str) -> str:
+    """Название без регистра, цветов, шума продавцов, с едиными единицами и латиницей"""
+    text = (text or "").lower().replace("ё", "е")
+    # Пометки продавцов в скобках: "(новый, ростест)", "[в наличии]"
+    text = _BRACKETS_RE.sub(" ", text)
+    text = _UNIT_RE.sub(lambda match: match.group(1).replace(",", ".") + UNITS.get(
+        match.group(2), "in") + " ", text)
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        if re.search(r"[0-9a-z]", token):
+            token = token.translate(HOMOGLYPHS)
+        if token in COLORS or token in SELLER_NOISE or token == "\"":
+            continue
+        tokens.append(token)
+    return " ".join(tokens)
+
+
+def product_types(tokens) -> FrozenSet[str]:
+    """Слова типа товара и аксессуаров среди слов названия"""
+    return frozenset(stem for stem in TYPE_STEMS if any(token.startswith(stem) for token in tokens))
+
+
+def canonical_key(product: Dict[str, str]) -> str:
+    """Ключ точного дубликата: множество слов нормализованного названия"""
+    return " ".join(sorted(set(normalize_name(product.get("name", "")).split())))
+
+
+def _hash64(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), "big")
+
+
+def simhash(tokens: FrozenSet[str]) -> int:
+    """64-битный SimHash множества слов"""
+    weights = [0] * 64
+    for token in tokens:
+        value = _hash64(token)
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def jaccard(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    """Доля общих слов"""
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+class MinHasher:
+    """MinHash множества слов с разбиением на полосы для поиска кандидатов (LSH)"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на bands")
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, tokens: FrozenSet[str]) -> List[int]:
+        """Минимум каждой из num_perm хэш-функций по словам"""
+        hashes = [_hash64(token) for token in tokens] or [0]
+        return [min((a * value + b) % _PRIME for value in hashes) for a, b in self._params]
+
+    def band_keys(self, signature: List[int]) -> List[tuple]:
+        """Ключи полос: у похожих множеств совпадает хотя бы одна с высокой вероятностью"""
+        return [(band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+                for band in range(self.bands)]
+
+
+class Deduplicator:
+    """
+    Объединяет в батче товары с одинаковым нормализованным названием или
+    похожие по словам (Jaccard не ниже порога при совпадающих числах - модель,
+    объем - и словах типа товара: чехол, кабель, кулер), модели отправляется один представитель каждой группы.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = 64, bands: int = 16,
+                 simhash_distance: int = 3, registry: Optional[MetricsRegistry] = None):
+        """
+        threshold: минимальная доля общих слов для объединения
+        simhash_distance: кандидаты по SimHash - не больше стольких различных бит
+        """
+        self.threshold = threshold
+        self.simhash_distance = simhash_distance
+        self.minhasher = MinHasher(num_perm, bands)
+        self._lock = threading.Lock()
+        self.stats = {
+            "items": 0,
+            "clusters": 0,
+            "exact": 0,
+            "near": 0,
+        }
+        self._deduplicated = None
+        if registry is not None:
+            self._deduplicated = registry.counter(
+                "classifier_dedup_items_total",
+                "Товары, получившие категорию своего дубликата без запроса к модели", ("kind",))
+
+    def signatures(self, product: Dict[str, str]) -> Dict[str, Any]:
+        """Нормализованное название, ключ точного дубликата и сигнатуры"""
+        normalized = normalize_name(product.get("name", ""))
+        tokens = frozenset(normalized.split())
+        return {
+            "normalized": normalized,
+            "key": " ".join(sorted(tokens)),
+            "tokens": tokens,
+            "numbers": frozenset(token for token in tokens if any(char.isdigit() for char in token)),
+            "types": product_types(tokens),
+            "minhash": self.minhasher.signature(tokens),
+            "simhash": simhash(tokens),
+        }
+
+    def _similar(self, first: Dict[str, Any], second: Dict[str, Any]) -> bool:
+        """Почти дубликаты: те же числа и тип товара, достаточно общих слов или близкий SimHash"""
+        if first["numbers"] != second["numbers"] or first["types"] != second["types"]:
+            return False
+        if bin(first["simhash"] ^ second["simhash"]).count("1") <= self.simhash_distance:
+            return True
+        return jaccard(first["tokens"], second["tokens"]) >= self.threshold
+
+    def cluster(self, products: list) -> List[int]:
+        """Для каждого товара - индекс представителя его группы (первого товара группы)"""
+        parent = list(range(len(products)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i: int, j: int):
+            first, second = find(i), find(j)
+            if first != second:
+                parent[max(first, second)] = min(first, second)
+
+        signatures = [self.signatures(product) for product in products]
+        by_key: Dict[str, int] = {}
+        buckets: Dict[tuple, List[int]] = {}
+        for i, signature in enumerate(signatures):
+            if not signature["tokens"]:
+                continue
+            if signature["key"] in by_key:
+                union(by_key[signature["key"]], i)
+                continue
+            by_key[signature["key"]] = i
+            candidates = set()
+            for band_key in self.minhasher.band_keys(signature["minhash"]):
+                candidates.update(buckets.setdefault(band_key, []))
+                buckets[band_key].append(i)
+            # SimHash: 4 блока по 16 бит, при расстоянии до 3 бит совпадает хотя бы один
+            for block in range(4):
+                band_key = ("simhash", block, signature["simhash"] >> (16 * block) & 0xFFFF)
+                candidates.update(buckets.setdefault(band_key, []))
+                buckets[band_key].append(i)
+            for j in candidates:
+                if find(i) != find(j) and self._similar(signatures[j], signature):
+                    union(j, i)
+        return [find(i) for i in range(len(products))]
+
+    def run(self, products: list, classify: Callable[[list], list]) -> list:
+        """Классифицировать представителей групп и раздать их категории остальным"""
+        if len(products) < 2:
+            return classify(products)
+        representatives = self.cluster(products)
+        keys = [canonical_key(product) for product in products]
+        unique = sorted(set(representatives))
+        if len(unique) < len(products):
+            logger.info(f"🧬 Дубликаты: {len(products) - len(unique)} из {len(products)} товаров "
+                        f"получат категорию своей группы")
+        fresh = dict(zip(unique, classify([products[i] for i in unique])))
+
+        results = []
+        exact = near = 0
+        for i, product in enumerate(products):
+            representative = representatives[i]
+            if representative == i:
+                results.append(fresh[i])
+                continue
+            result = dict(fresh[representative])
+            result["product_name"] = product.get("name", "")
+            result["duplicate_of"] = products[representative].get("name", "")
+            results.append(result)
+            if keys[i] == keys[representative]:
+                exact += 1
+            else:
+                near += 1
+        self.record(len(products), len(unique), exact, near)
+        return results
+
+    def record(self, items: int, clusters: int, exact: int, near: int):
+        """Учесть вызов: товаров, групп и объединенных дубликатов"""
+        with self._lock:
+            self.stats["items"] += items
+            self.stats["clusters"] += clusters
+            self.stats["exact"] += exact
+            self.stats["near"] += near
+        if self._deduplicated is not None:
+            if exact:
+                self._deduplicated.labels("exact").inc(exact)
+            if near:
+                self._deduplicated.labels("near").inc(near)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Доля товаров, обошедшихся без запроса к модели"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["threshold"] = self.threshold
+        stats["dedup_rate"] = (stats["exact"] + stats["near"]) / stats["items"] if stats["items"] else 0.0
+        return stats
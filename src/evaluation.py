@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Evaluation - Оценка точности и стоимости конфигураций классификатора на размеченных данных
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Union
+
+PathLike = Union[str, Path]
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+# Источник строк, на которых модель дообучена и которыми наполнен индекс соседей:
+# точность на них завышена, поэтому конфигурации сравниваются по остальным
+TRAINING_SOURCE = "training_examples"
+
+# Категории example_raw_data.json -> категории классификатора; смартфоны и
+# консоли уточняются по названию, остальное (аксессуары, Samsung) - unknown
+RAW_CATEGORY_MAP = {
+    "процессоры": "processors",
+    "видеокарты": "videocards",
+    "материнские платы": "motherboards",
+}
+NAME_CATEGORY_KEYWORDS = [
+    ("iphone", ("iphone",)),
+    ("playstation", ("playstation", "ps5", "ps4")),
+    ("nintendo-switch", ("nintendo", "switch")),
+    ("steam-deck", ("steam deck",)),
+]
+REFINED_CATEGORIES = ("смартфоны", "консоли")
+
+# Конфигурации ProductClassifier для сравнения (аргументы конструктора)
+PRESETS: Dict[str, Dict[str, Any]] = {
+    "verbose": {},
+    "compact": {"output_mode": "compact"},
+    "logprob": {"output_mode": "logprob"},
+    "rules": {"rules": True},
+    "cascade": {"cascade": True},
+    "dedup": {"dedup": True},
+}
+
+
+def map_raw_category(name: str, category: str) -> str:
+    """Категория классификатора для товара из сырых данных маркетплейса"""
+    if category in RAW_CATEGORY_MAP:
+        return RAW_CATEGORY_MAP[category]
+    if category in REFINED_CATEGORIES:
+        text = name.lower()
+        for slug, keywords in NAME_CATEGORY_KEYWORDS:
+            if any(keyword in text for keyword in keywords):
+                return slug
+    return "unknown"
+
+
+def build_dataset(data_dir: PathLike = DATA_DIR) -> List[Dict[str, Any]]:
+    """Размеченные товары: примеры для дообучения и сырые данные с приведенными категориями"""
+    data_dir = Path(data_dir)
+    dataset = []
+    # Тот же файл, что собирает fine_tune.create_training_data
+    with open(data_dir / "training_examples.json", 'r', encoding='utf-8') as f:
+        for item in json.load(f):
+            dataset.append({
+                "name": item["input"],
+                "description": "",
+                "label": json.loads(item["output"])["category"],
+                "source": TRAINING_SOURCE,
+            })
+    with open(data_dir / "example_raw_data.json", 'r', encoding='utf-8') as f:
+        for item in json.load(f):
+            dataset.append({
+                "name": item["name"],
+                "description": item.get("description", ""),
+                "label": map_raw_category(item["name"], item["category"]),
+                "source": "example_raw_data",
+            })
+    return dataset
+
+
+def save_dataset(dataset: Iterable[Dict[str, Any]], path: PathLike):
+    """Записать набор в JSONL"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in dataset:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+def load_dataset(path: PathLike) -> List[Dict[str, Any]]:
+    """Размеченный набор из JSONL (поля name, description, label)"""
+    dataset = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                if "label" not in item:
+                    raise ValueError(f"{path}: нет поля label у товара {item.get('name', '')!r}")
+                dataset.append(item)
+    return dataset
+
+
+def confusion_matrix(labels: List[str], predictions: List[str],
+                     categories: List[str]) -> Dict[str, Dict[str, int]]:
+    """Матрица ошибок: {истинная категория: {предсказанная: число}}"""
+    matrix = {label: {predicted: 0 for predicted in categories} for label in categories}
+    for label, predicted in zip(labels, predictions):
+        matrix.setdefault(label, {predicted: 0 for predicted in categories})
+        matrix[label][predicted] = matrix[label].get(predicted, 0) + 1
+    return matrix
+
+
+def per_category(matrix: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, float]]:
+    """Точность, полнота и F1 по категориям"""
+    metrics = {}
+    for category in matrix:
+        true_positive = matrix[category].get(category, 0)
+        predicted = sum(row.get(category, 0) for row in matrix.values())
+        actual = sum(matrix[category].values())
+        precision = true_positive / predicted if predicted else 0.0
+        recall = true_positive / actual if actual else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        metrics[category] = {"precision": precision, "recall": recall, "f1": f1, "support": actual}
+    return metrics
+
+
+def _eval_totals(classifier) -> Dict[str, float]:
+    """Токены и время модели по всем ступеням классификатора"""
+    classifiers = [classifier]
+    if getattr(classifier, "cascade", None) is not None:
+        classifiers.append(classifier.cascade.classifier)
+    totals = {"prompt_tokens": 0, "generated_tokens": 0, "model_seconds": 0.0}
+    for item in classifiers:
+        stats = item.get_eval_stats()
+        totals["prompt_tokens"] += stats.get("prompt_eval_count", 0)
+        totals["generated_tokens"] += stats.get("eval_count", 0)
+        totals["model_seconds"] += (stats.get("prompt_eval_duration", 0) + stats.get("eval_duration", 0)) / 1e9
+    return totals
+
+
+def evaluate(classifier, dataset: List[Dict[str, Any]], batch_size: int = 8,
+             workers: int = 4, name: str = "") -> Dict[str, Any]:
+    """Классифицировать набор батчами в workers потоков и посчитать качество и стоимость"""
+    products = [{"name": item["name"], "description": item.get("description", "")} for item in dataset]
+    batches = [products[i:i + batch_size] for i in range(0, len(products), batch_size)]
+    before = _eval_totals(classifier)
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="evaluate") as executor:
+        results = [result for batch_results in executor.map(
+            lambda batch: classifier.classify_products_batch(batch, show_progress=False), batches
+        ) for result in batch_results]
+    elapsed_time = time.perf_counter() - start_time
+    after = _eval_totals(classifier)
+
+    labels = [item["label"] for item in dataset]
+    predictions = [result.get("predicted_category", "unknown") if "error" not in result else "unknown"
+                   for result in results]
+    categories = list(classifier.categories) + ["unknown"]
+    matrix = confusion_matrix(labels, predictions, categories)
+    correct = sum(1 for label, predicted in zip(labels, predictions) if label == predicted)
+    tokens = (after["prompt_tokens"] - before["prompt_tokens"]) + \
+        (after["generated_tokens"] - before["generated_tokens"])
+    by_source: Dict[str, Dict[str, Any]] = {}
+    for item, label, predicted in zip(dataset, labels, predictions):
+        source = by_source.setdefault(item.get("source", "unknown"), {"items": 0, "correct": 0})
+        source["items"] += 1
+        source["correct"] += label == predicted
+    for source in by_source.values():
+        source["accuracy"] = source["correct"] / source["items"]
+    held_out = [stats for name, stats in by_source.items() if name != TRAINING_SOURCE]
+    held_out_items = sum(stats["items"] for stats in held_out)
+    methods: Dict[str, int] = {}
+    for result in results:
+        method = result.get("method", "error") if "error" not in result else "error"
+        methods[method] = methods.get(method, 0) + 1
+
+    return {
+        "name": name,
+        "items": len(dataset),
+        "correct": correct,
+        "accuracy": correct / len(dataset) if dataset else 0.0,
+        "held_out_accuracy": sum(stats["correct"] for stats in held_out) / held_out_items
+        if held_out_items else None,
+        "by_source": by_source,
+        "errors": sum(1 for result in results if "error" in result),
+        "seconds": elapsed_time,
+        "seconds_per_item": elapsed_time / len(dataset) if dataset else 0.0,
+        "model_seconds": after["model_seconds"] - before["model_seconds"],
+        "tokens": tokens,
+        "tokens_per_correct": tokens / correct if correct else None,
+        "seconds_per_correct": elapsed_time / correct if correct else None,
+        "methods": methods,
+        "confusion_matrix": matrix,
+        "per_category": per_category(matrix),
+        "mistakes": [
+            {"name": item["name"], "label": label, "predicted": predicted}
+            for item, label, predicted in zip(dataset, labels, predictions) if label != predicted
+        ],
+    }
+
+
+def comparable_accuracy(report: Dict[str, Any]) -> float:
+    """Точность для сравнения: без примеров для дообучения, если в наборе есть другие товары"""
+    held_out = report.get("held_out_accuracy")
+    return report["accuracy"] if held_out is None else held_out
+
+
+def pareto_front(reports: List[Dict[str, Any]], cost: str = "seconds_per_item") -> List[str]:
+    """Конфигурации, которые нельзя улучшить по точности, не проиграв в стоимости"""
+    front = []
+    for report in reports:
+        accuracy = comparable_accuracy(report)
+        dominated = any(
+            other is not report
+            and comparable_accuracy(other) >= accuracy and other[cost] <= report[cost]
+            and (comparable_accuracy(other) > accuracy or other[cost] < report[cost])
+            for other in reports
+        )
+        if not dominated:
+            front.append(report["name"])
+    return front
+
+
+def format_confusion(matrix: Dict[str, Dict[str, int]]) -> str:
+    """Матрица ошибок текстом: строки - истинные категории, столбцы - предсказанные"""
+    categories = list(matrix)
+    short = [category[:6] for category in categories]
+    width = max(len(category) for category in categories)
+    lines = [" " * width + " " + " ".join(f"{name:>6}" for name in short)]
+    for category in categories:
+        lines.append(f"{category:>{width}} " + " ".join(f"{matrix[category].get(predicted, 0):>6}"
+                                                       for predicted in categories))
+    return "\n".join(lines)
+
+
+def format_report(report: Dict[str, Any], details: bool = True) -> str:
+    """Отчет одной конфигурации"""
+    lines = [
+        f"📊 {report['name']}: точность {report['accuracy']:.1%} ({report['correct']}/{report['items']}), "
+        f"ошибок {report['errors']}, {report['seconds']:.2f} сек, токенов {report['tokens']}"
+    ]
+    if len(report.get("by_source", {})) > 1:
+        lines[0] += ", по источникам: " + ", ".join(
+            f"{name}{' (обучение)' if name == TRAINING_SOURCE else ''} {stats['accuracy']:.1%}"
+            for name, stats in report["by_source"].items()
+        )
+    if not details:
+        return lines[0]
+    lines.append(format_confusion(report["confusion_matrix"]))
+    lines.append(f"{'категория':>16} {'точность':>9} {'полнота':>8} {'F1':>6} {'товаров':>8}")
+    for category, metrics in report["per_category"].items():
+        if metrics["support"] or metrics["precision"]:
+            lines.append(f"{category:>16} {metrics['precision']:>9.2f} {metrics['recall']:>8.2f} "
+                         f"{metrics['f1']:>6.2f} {metrics['support']:>8}")
+    return "\n".join(lines)
+
+
+def format_pareto(reports: List[Dict[str, Any]], cost: str = "seconds_per_item") -> str:
+    """
+    Сводная таблица конфигураций; ★ - на границе Парето (точность против стоимости).
+    Точность - на товарах не из примеров для дообучения, если такие есть
+    """
+    front = set(pareto_front(reports, cost))
+    lines = [f"  {'конфигурация':<16} {'точность':>9} {'мс/товар':>9} {'токенов/верный':>15} {'сек/верный':>11}"]
+    for report in sorted(reports, key=lambda report: (-comparable_accuracy(report), report[cost])):
+        mark = "★" if report["name"] in front else " "
+        tokens = report["tokens_per_correct"]
+        seconds = report["seconds_per_correct"]
+        lines.append(
+            f"{mark} {report['name']:<16} {comparable_accuracy(report):>9.1%} {report['seconds_per_item'] * 1000:>9.1f} "
+            f"{tokens if tokens is None else round(tokens, 1)!s:>15} "
+            f"{seconds if seconds is None else round(seconds, 3)!s:>11}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Metrics - Счетчики и гистограммы в формате Prometheus
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import logging
+import math
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин для времени, сек: от кэша и правил до батча на модели
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500, 1000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _CounterValue:
+    """Значение счетчика для одного набора меток"""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeValue(_CounterValue):
+    """Значение показателя, который может и уменьшаться"""
+
+    __slots__ = ()
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+
+class _HistogramValue:
+    """Корзины гистограммы для одного набора меток"""
+
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # Последняя корзина - +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class _Metric:
+    """Метрика с метками: значения создаются при первом обращении к набору меток"""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        # Метрика без меток - одно значение, без поиска по словарю
+        self._default = None if self.label_names else self.labels()
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values: Any):
+        """Значение для набора меток (в порядке label_names)"""
+        child = self._values.get(values)
+        if child is None:
+            key = tuple(str(value) for value in values)
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name}: ожидались метки {self.label_names}")
+            with self._lock:
+                child = self._values.setdefault(key, self._new_value())
+                # Значения меток почти всегда строки - тогда следующий поиск без преобразования
+                self._values.setdefault(values, child)
+        return child
+
+    def _items(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        with self._lock:
+            items = {key: child for key, child in self._values.items()
+                     if all(isinstance(value, str) for value in key)}
+        return sorted(items.items())
+
+    def render(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонный счетчик"""
+
+    kind = "counter"
+
+    def _new_value(self) -> _CounterValue:
+        return _CounterValue()
+
+    def inc(self, amount: float = 1):
+        """Увеличить счетчик без меток"""
+        self._default.inc(amount)
+
+    def render(self) -> Iterable[str]:
+        for key, child in self._items():
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(child.value)}"
+
+
+class Gauge(Counter):
+    """Текущее значение (размер очереди, число соединений)"""
+
+    kind = "gauge"
+
+    def _new_value(self) -> _GaugeValue:
+        return _GaugeValue()
+
+    def set(self, value: float):
+        """Установить значение без меток"""
+        self._default.set(value)
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными корзинами"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _new_value(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        """Добавить наблюдение без меток"""
+        self._default.observe(value)
+
+    def render(self) -> Iterable[str]:
+        for key, child in self._items():
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """Набор метрик процесса; повторная регистрация возвращает ту же метрику"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+        if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована с другим типом или метками")
+        return existing
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        """Счетчик (создается при первом обращении)"""
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        """Показатель (создается при первом обращении)"""
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        """Гистограмма (создается при первом обращении)"""
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class ClassifierMetrics:
+    """Метрики ProductClassifier: задержки по этапам, токены, исходы по категориям"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry if registry is not None else MetricsRegistry()
+        r = self.registry
+        self.request_seconds = r.histogram(
+            "classifier_request_seconds", "Время вызова классификации от начала до результата", ("path",))
+        self.queue_wait_seconds = r.histogram(
+            "classifier_queue_wait_seconds", "Ожидание товара в очереди микробатчинга")
+        self.prompt_eval_seconds = r.histogram(
+            "classifier_prompt_eval_seconds", "Вычисление промпта моделью (prompt_eval_duration)")
+        self.eval_seconds = r.histogram(
+            "classifier_eval_seconds", "Генерация ответа моделью (eval_duration)")
+        self.load_seconds = r.histogram(
+            "classifier_model_load_seconds", "Загрузка модели в запросе (load_duration)")
+        self.parse_seconds = r.histogram(
+            "classifier_parse_seconds", "Разбор ответа модели")
+        self.tokens_per_second = r.histogram(
+            "classifier_tokens_per_second", "Скорость генерации по вызовам", buckets=TOKENS_PER_SECOND_BUCKETS)
+        self.prompt_tokens = r.counter(
+            "classifier_prompt_tokens_total", "Вычисленные токены промпта")
+        self.generated_tokens = r.counter(
+            "classifier_generated_tokens_total", "Сгенерированные токены")
+        self.results = r.counter(
+            "classifier_results_total", "Результаты по категориям и способу получения", ("category", "method"))
+        self.cache_hits = r.counter(
+            "classifier_cache_hits_total", "Результаты из кэша по категориям", ("category",))
+        self.fallbacks = r.counter(
+            "classifier_parse_fallbacks_total", "Ответы, разобранные запасным путем", ("kind",))
+        self.errors = r.counter(
+            "classifier_errors_total", "Товары с ошибкой классификации", ("path",))
+
+    def observe_reply(self, reply: Dict[str, Any]):
+        """Тайминги и токены одного ответа Ollama (длительности - в наносекундах)"""
+        prompt_eval, eval_duration = reply.get("prompt_eval_duration", 0), reply.get("eval_duration", 0)
+        eval_count = reply.get("eval_count", 0)
+        self.prompt_eval_seconds.observe(prompt_eval / 1e9)
+        self.eval_seconds.observe(eval_duration / 1e9)
+        if reply.get("load_duration"):
+            self.load_seconds.observe(reply["load_duration"] / 1e9)
+        self.prompt_tokens.inc(reply.get("prompt_eval_count", 0))
+        self.generated_tokens.inc(eval_count)
+        if eval_count and eval_duration:
+            self.tokens_per_second.observe(eval_count / (eval_duration / 1e9))
+
+    def observe_results(self, path: str, results: Iterable[Dict[str, Any]], elapsed_time: float):
+        """Вызов целиком: время и исход каждого товара"""
+        self.request_seconds.labels(path).observe(elapsed_time)
+        for result in results:
+            if "error" in result:
+                self.errors.labels(path).inc()
+                continue
+            category = result.get("predicted_category", "unknown")
+            self.results.labels(category, result.get("method", "")).inc()
+            if result.get("cached"):
+                self.cache_hits.labels(category).inc()
+
+
+class MetricsServer:
+    """HTTP-сервер с эндпоинтом /metrics для Prometheus"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464):
+        self.registry = registry
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Адрес сервера"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def _make_handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self) -> "MetricsServer":
+        """Запустить сервер в фоновом потоке"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="metrics")
+        self._thread.start()
+        logger.info(f"📈 Метрики: {self.url}")
+        return self
+
+    def stop(self):
+        """Остановить сервер"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
@@ -4,110 +4,263 @@ ML Model - Классификатор продуктов с использова
 by Morzh - Проект создан для развития валидатора товаров электроники
 """
 
+import asyncio
 import json
 import logging
+import os
+import re
 import time
-import subprocess
 import sys
-import psutil
 import threading
-from typing import Dict, Any
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, AsyncIterator, Callable, Iterable, Iterator, List, Optional, Tuple, Union
 
 # Настройка кодировки для Windows
 if sys.platform == "win32":
     import os
     os.environ['PYTHONIOENCODING'] = 'utf-8'
 
+# Соседние модули доступны и при импорте как src.ml_model
+sys.path.insert(0, str(Path(__file__).parent))
+
+from backends import (
+    BackendError, BackendTimeout, HTTPBackend, InferenceBackend,
+    SubprocessBackend, create_backend
+)
+from async_backend import AsyncHTTPBackend
+from router import RouterBackend
+from cascade import DEFAULT_FAST_MODEL, ModelCascade, load_thresholds
+from cache import ClassificationCache, make_fingerprint
+from batch_packer import BatchPacker
+from resilience import BatchRecovery
+from dedup import DEFAULT_THRESHOLD as DEDUP_THRESHOLD, Deduplicator
+from rules import RuleEngine
+from batcher import MicroBatcher
+from metrics import ClassifierMetrics, MetricsRegistry
+from model_manager import ModelManager
+from resource_monitor import ResourceMonitor
+from stream_parser import CompactLineParser, JsonArrayStreamParser
+from response_mapping import ResponseMapping
+from schema import batch_schema, classification_schema, compile_validator
+from scoring import MAX_TOP_LOGPROBS, code_logprobs, code_probabilities, label_mass, score_codes
+
 logger = logging.getLogger(__name__)
 
-class ResourceMonitor:
-    """Мониторинг ресурсов системы"""
-    
-    def __init__(self):
-        self.monitoring = False
-        self.stats = {}
-    
-    def start_monitoring(self):
-        """Начать мониторинг ресурсов"""
-        self.monitoring = True
-        self.monitor_thread = threading.Thread(target=self._monitor_loop)
-        self.monitor_thread.daemon = True
-        self.monitor_thread.start()
-    
-    def stop_monitoring(self):
-        """Остановить мониторинг"""
-        self.monitoring = False
-    
-    def _monitor_loop(self):
-        """Цикл мониторинга"""
-        while self.monitoring:
-            try:
-                cpu_percent = psutil.cpu_percent(interval=1)
-                memory = psutil.virtual_memory()
-                gpu_info = self._get_gpu_info()
-                
-                self.stats = {
-                    'cpu_percent': cpu_percent,
-                    'ram_percent': memory.percent,
-                    'ram_used_gb': memory.used / (1024**3),
-                    'ram_total_gb': memory.total / (1024**3),
-                    'gpu_info': gpu_info,
-                    'timestamp': time.time()
-                }
-                
-                time.sleep(1)
-            except Exception as e:
-                logger.warning(f"Ошибка мониторинга: {e}")
-                time.sleep(2)
-    
-    def _get_gpu_info(self) -> Dict[str, Any]:
-        """Получить информацию о GPU"""
-        try:
-            result = subprocess.run(
-                ['nvidia-smi', '--query-gpu=name,memory.used,memory.total,utilization.gpu', 
-                 '--format=csv,noheader,nounits'],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')
-                gpu_info = []
-                
-                for line in lines:
-                    if line.strip():
-                        parts = line.split(', ')
-                        if len(parts) >= 4:
-                            gpu_info.append({
-                                'name': parts[0],
-                                'memory_used_mb': int(parts[1]),
-                                'memory_total_mb': int(parts[2]),
-                                'utilization_percent': int(parts[3])
-                            })
-                
-                return gpu_info
-            else:
-                return []
-                
-        except (subprocess.TimeoutExpired, FileNotFoundError, Exception):
-            return []
+# Версия промптов и разбора ответа - увеличивать при изменении семантики,
+# чтобы сбросить кэш результатов
+PROMPT_VERSION = 2
+
+# Компактный ответ на один товар: номер_категории:уверенность
+_COMPACT_SINGLE_RE = re.compile(r"(\d+)\s*:\s*([0-9]*\.?[0-9]+)")
+
+
+@contextmanager
+def loading_animation(message: str, enabled: bool = True):
+    """ASCII-арт анимация на время запроса к модели"""
+    if not enabled:
+        yield
+        return
     
-    def get_current_stats(self) -> Dict[str, Any]:
-        """Получить текущую статистику"""
-        return self.stats.copy()
+    loading_frames = ["8uu==3", "8==uu3"]
+    running = True
+
+    def animate():
+        current_frame = 0
+        while running:
+            frame = loading_frames[current_frame % len(loading_frames)]
+            sys.stdout.write(f"\r⏳ {frame} {message}")
+            sys.stdout.flush()
+            current_frame += 1
+            time.sleep(0.3)
+
+    animation_thread = threading.Thread(target=animate, daemon=True)
+    animation_thread.start()
+    try:
+        yield
+    finally:
+        running = False
+        sys.stdout.write("\r" + " " * 80 + "\r")
+        sys.stdout.flush()
 
 class ProductClassifier:
     """Классификатор продуктов с использованием модели T-pro-it-2.0"""
     
-    def __init__(self):
-        self.model_name = "t-pro-it-2.0-optimized"
+    def __init__(self, backend: Union[str, InferenceBackend, None] = None,
+                 host: Union[str, List[str], None] = None, keep_alive: Any = "30m",
+                 api: str = "generate", max_concurrency: Optional[int] = None,
+                 cache: Union[ClassificationCache, str, bool, None] = None,
+                 rules: Union[RuleEngine, str, bool, None] = None,
+                 rule_threshold: float = 0.9,
+                 micro_batch: Union[MicroBatcher, bool, None] = None,
+                 structured_output: bool = True,
+                 output_mode: str = "verbose",
+                 score_temperature: float = 1.0,
+                 knn: Any = None,
+                 keep_warm: Union[float, bool] = True,
+                 metrics: Optional[MetricsRegistry] = None,
+                 model: str = "t-pro-it-2.0-optimized",
+                 cascade: Union["ProductClassifier", str, bool, None] = None,
+                 cascade_thresholds: Union[float, Dict[str, float], str, None] = None,
+                 dedup: Union[Deduplicator, float, bool, None] = None,
+                 packer: Union[BatchPacker, int, bool, None] = True,
+                 resilience: Union[BatchRecovery, bool, None] = True):
+        """
+        backend: 'http' (Ollama API с пулом соединений), 'subprocess' (`ollama run`)
+                 или готовый экземпляр InferenceBackend. По умолчанию берется
+                 из ML_CLASSIFIER_BACKEND, иначе 'http'.
+        host: адрес Ollama (по умолчанию OLLAMA_HOST или 127.0.0.1:11434); несколько
+              адресов (список или через запятую) - запросы распределяет RouterBackend
+        keep_alive: сколько модель остается в памяти после запроса
+        api: 'generate' или 'chat'
+        max_concurrency: число одновременных запросов в async API, по умолчанию
+                         OLLAMA_NUM_PARALLEL (число параллельных слотов сервера) или 4
+        cache: кэш результатов - True (файл по умолчанию), путь к SQLite
+               или готовый ClassificationCache
+        rules: правила быстрой классификации - True (data/rules.json), путь
+               к файлу правил или готовый RuleEngine
+        rule_threshold: минимальная уверенность правил, ниже - запрос к модели
+        micro_batch: собирать одиночные classify_product в батчи - True
+                     (настройки по умолчанию) или готовый MicroBatcher
+        structured_output: передавать JSON-схему ответа в поле format, чтобы
+                           модель не отвечала прозой (Ollama 0.5+)
+        output_mode: 'verbose' - JSON с обоснованием, 'compact' - только номер
+                     категории и уверенность строкой, с ограничением num_predict,
+                     'logprob' - один токен с кодом категории, уверенность -
+                     вероятность кода по logprobs модели
+        score_temperature: температура для вероятностей режима 'logprob'
+                           (подбирается scoring.fit_temperature)
+        knn: классификация ближайшими соседями по эмбеддингам до модели -
+             True (индекс .cache/vector_index или примеры для дообучения),
+             путь к каталогу индекса или готовый EmbeddingKNN (нужен numpy)
+        keep_warm: прогреть модель в load_model и держать в памяти - True
+                   (проверка раз в 60 сек), период проверки в секундах или False
+        metrics: реестр метрик Prometheus (по умолчанию - собственный,
+                 self.metrics.registry); общий реестр - для нескольких классификаторов
+        model: модель Ollama (точная модель каскада)
+        cascade: сначала спрашивать быструю модель - True (t-pro-it-2.0-fast), имя
+                 модели или готовый ProductClassifier; точной модели передаются
+                 только товары с уверенностью ниже порога
+        cascade_thresholds: порог уверенности каскада - число, {категория: порог}
+                            (ключ "default" - для остальных) или путь к JSON
+        dedup: объединять в батче почти одинаковые названия и спрашивать модель
+               об одном товаре группы - True, порог сходства (доля общих слов)
+               или готовый Deduplicator
+        packer: обрезать длинные описания и делить батч так, чтобы промпт с ответом
+                помещался в контекст модели - True (num_ctx 4096), размер контекста
+                в токенах, готовый BatchPacker или False (без ограничений)
+        resilience: повторы батча при сбоях сервера, таймаут по числу товаров и
+                    повтор по частям товаров, которых нет в ответе - True
+                    (настройки по умолчанию), готовый BatchRecovery или False
+        """
+        if output_mode not in ("verbose", "compact", "logprob"):
+            raise ValueError(f"Неизвестный режим ответа: {output_mode}")
+        
+        self.model_name = model
         self.is_loaded = False
         self.categories = [
             "iphone", "processors", "videocards", "motherboards", 
             "playstation", "nintendo-switch", "steam-deck"
         ]
+        self.api = api
+        if isinstance(backend, InferenceBackend):
+            self.backend = backend
+        elif backend in (None, "http") and (isinstance(host, (list, tuple)) or "," in (host or "")):
+            self.backend = RouterBackend(host, keep_alive=keep_alive)
+        else:
+            self.backend = create_backend(backend, host=host, keep_alive=keep_alive)
+        self.max_concurrency = max_concurrency or int(os.environ.get("OLLAMA_NUM_PARALLEL", 4))
+        self._async_backend: Optional[AsyncHTTPBackend] = None
+        # Пул для асинхронных вызовов бэкендов без асинхронного клиента (роутер, subprocess)
+        self._async_executor: Optional[ThreadPoolExecutor] = None
+        if cache is True:
+            self.cache = ClassificationCache()
+        elif isinstance(cache, str):
+            self.cache = ClassificationCache(cache)
+        else:
+            self.cache = cache or None
+        if rules is True:
+            self.rules = RuleEngine.load()
+        elif isinstance(rules, str):
+            self.rules = RuleEngine.load(rules)
+        else:
+            self.rules = rules or None
+        self.rule_threshold = rule_threshold
+        if knn is True or isinstance(knn, str):
+            # numpy нужен только для этого режима
+            from vector_index import EmbeddingKNN
+            self.knn = EmbeddingKNN.open(self.backend, knn if isinstance(knn, str) else None)
+        else:
+            self.knn = knn or None
+        self.metrics = ClassifierMetrics(metrics)
+        if micro_batch is True:
+            self.batcher = MicroBatcher(
+                lambda products: self._classify_batch_uncached(products, show_progress=False),
+                max_in_flight=self.max_concurrency,
+                on_queue_wait=self.metrics.queue_wait_seconds.observe
+            )
+        else:
+            self.batcher = micro_batch or None
+        self.output_mode = output_mode
+        if packer is True:
+            packer = BatchPacker()
+        elif packer and isinstance(packer, int):
+            packer = BatchPacker(packer)
+        self.packer: Optional[BatchPacker] = packer or None
+        if resilience is True:
+            resilience = BatchRecovery(registry=self.metrics.registry)
+        self.resilience: Optional[BatchRecovery] = resilience or None
+        self.score_temperature = score_temperature
+        self.structured_output = structured_output
+        self._schemas: Dict[tuple, Dict[str, Any]] = {}
+        self._parse_lock = threading.Lock()
+        self.parse_stats = {
+            "items": 0,
+            "valid": 0,
+            "schema_errors": 0,
+            "text_fallback": 0,
+            "missing": 0,
+        }
+        # Тайминги Ollama: вычисление промпта отдельно от генерации,
+        # по ним видно, переиспользуется ли кэш префикса
+        self._eval_lock = threading.Lock()
+        self.eval_stats = {
+            "calls": 0,
+            "prompt_eval_count": 0,
+            "prompt_eval_duration": 0,
+            "eval_count": 0,
+            "eval_duration": 0,
+            "load_duration": 0,
+        }
+        self.eval_log: deque = deque(maxlen=1000)
+        self.keep_warm = 60.0 if keep_warm is True else keep_warm
+        self.model_manager: Optional[ModelManager] = None
         self.resource_monitor = ResourceMonitor()
+        if cascade is True or isinstance(cascade, str):
+            # Быстрая ступень: тот же бэкенд, режим ответа и реестр метрик, без кэша и правил
+            cascade = ProductClassifier(
+                backend=self.backend, model=cascade if isinstance(cascade, str) else DEFAULT_FAST_MODEL,
+                api=api, max_concurrency=self.max_concurrency, structured_output=structured_output,
+                output_mode=output_mode, score_temperature=score_temperature, keep_warm=keep_warm,
+                packer=self.packer or False, resilience=self.resilience or False,
+                metrics=self.metrics.registry
+            )
+            cascade.resource_monitor = self.resource_monitor
+        if isinstance(cascade_thresholds, str):
+            cascade_thresholds = load_thresholds(cascade_thresholds)
+        self.cascade: Optional[ModelCascade] = ModelCascade(
+            cascade, cascade_thresholds, self.metrics.registry
+        ) if cascade else None
+        if dedup is True or isinstance(dedup, float):
+            dedup = Deduplicator(
+                DEDUP_THRESHOLD if dedup is True else dedup, registry=self.metrics.registry
+            )
+        self.dedup: Optional[Deduplicator] = dedup or None
+        self._fingerprint: Optional[Tuple[tuple, str]] = None
+        self._cache_fingerprint()
     
     def get_model_info(self) -> Dict[str, Any]:
         """Получить информацию о модели"""
@@ -115,6 +268,19 @@ class ProductClassifier:
             "model_name": self.model_name,
             "is_loaded": self.is_loaded,
             "method": "t_pro_it_2_0",
+            "output_mode": self.output_mode,
+            "backend": self.backend.name,
+            "cache": self.cache.get_stats() if self.cache is not None else None,
+            "batcher": self.batcher.get_stats() if self.batcher is not None else None,
+            "knn_examples": len(self.knn.index) if self.knn is not None else None,
+            "parsing": self.get_parse_stats(),
+            "eval": self.get_eval_stats(),
+            "model_manager": self.model_manager.get_stats() if self.model_manager is not None else None,
+            "router": self.backend.get_stats() if isinstance(self.backend, RouterBackend) else None,
+            "cascade": self.cascade.get_stats() if self.cascade is not None else None,
+            "dedup": self.dedup.get_stats() if self.dedup is not None else None,
+            "packer": self.packer.get_stats() if self.packer is not None else None,
+            "resilience": self.resilience.get_stats() if self.resilience is not None else None,
             "categories": self.categories,
             "platform": sys.platform,
             "model_size_gb": 12.3
@@ -127,21 +293,38 @@ class ProductClassifier:
             
             self.resource_monitor.start_monitoring()
             
-            result = subprocess.run(
-                ["ollama", "list"], 
-                capture_output=True, 
-                text=True, 
-                encoding='utf-8'
-            )
-            
-            if result.returncode != 0:
-                logger.error("Модель не найдена")
-                return False
+            try:
+                found = self.backend.has_model(self.model_name)
+            except BackendError as e:
+                if not isinstance(self.backend, HTTPBackend):
+                    logger.error(f"Модель не найдена: {e}")
+                    return False
+                logger.warning(f"⚠️ Ollama API недоступен ({e}), используем ollama run")
+                self.backend = SubprocessBackend()
+                try:
+                    found = self.backend.has_model(self.model_name)
+                except BackendError as e:
+                    logger.error(f"Модель не найдена: {e}")
+                    return False
             
-            if self.model_name not in result.stdout:
+            if not found:
                 logger.error(f"Модель {self.model_name} (T-pro-it-2.0) не найдена")
                 return False
             
+            if self.keep_warm and self.model_manager is None:
+                # Веса загружаются сейчас, а не в первом запросе классификации
+                self.model_manager = ModelManager(
+                    self.backend, self.model_name, interval=self.keep_warm,
+                    options={"num_ctx": self.packer.context_window} if self.packer is not None else None
+                )
+                if self.model_manager.start() is None:
+                    self.model_manager.stop()
+                    self.model_manager = None
+            
+            if self.cascade is not None and not self.cascade.classifier.load_model():
+                logger.warning(f"⚠️ Быстрая модель {self.cascade.fast_model} недоступна, каскад отключен")
+                self.cascade = None
+            
             self.is_loaded = True
             logger.info("✅ Модель загружена успешно")
             
@@ -154,159 +337,957 @@ class ProductClassifier:
             logger.error(f"Ошибка загрузки модели: {str(e)}")
             return False
     
-    def classify_products_batch(self, products: list) -> list:
+    def _schema_set(self) -> Dict[str, Any]:
+        """Схемы и валидаторы ответа для текущего списка категорий"""
+        key = tuple(self.categories)
+        schemas = self._schemas.get(key)
+        if schemas is None:
+            single = classification_schema(self.categories)
+            batch = batch_schema(self.categories)
+            schemas = {
+                "single": single,
+                "batch": batch,
+                "validate_single": compile_validator(single),
+                "validate_item": compile_validator(batch["items"]),
+            }
+            self._schemas = {key: schemas}
+        return schemas
+
+    def _output_format(self, batch: bool = False) -> Optional[Dict[str, Any]]:
+        """Значение поля format для запроса (None - без ограничений)"""
+        if not self.structured_output or self.output_mode != "verbose":
+            return None
+        return self._schema_set()["batch" if batch else "single"]
+
+    def _generation_options(self, count: int = 0) -> Optional[Dict[str, Any]]:
+        """Параметры генерации: в компактных режимах - лимит токенов ответа, с упаковщиком - num_ctx"""
+        options: Dict[str, Any] = {}
+        if self.packer is not None:
+            # Батчи собраны под этот контекст - модель должна получить его же, а не свой по умолчанию
+            options["num_ctx"] = self.packer.context_window
+        if self.output_mode == "logprob":
+            # Нужен только первый токен - код категории
+            options["num_predict"] = 1
+        elif self.output_mode == "compact":
+            # "3:0.95" - около 5 токенов, строка батча "12:3:0.95" - около 8
+            options["num_predict"] = 8 * count + 8 if count else 8
+        return options or None
+
+    def _compact_labels(self) -> List[str]:
+        """Категории по номерам компактного ответа: 0 - unknown"""
+        return ["unknown"] + self.categories
+
+    def _count_parse(self, **counts: int):
+        """Обновить счетчики разбора ответов"""
+        with self._parse_lock:
+            for key, value in counts.items():
+                self.parse_stats[key] += value
+        for kind in ("schema_errors", "text_fallback", "missing"):
+            if counts.get(kind):
+                self.metrics.fallbacks.labels(kind).inc(counts[kind])
+
+    def get_parse_stats(self) -> Dict[str, Any]:
+        """Как часто ответ модели не прошел схему и понадобился запасной разбор"""
+        with self._parse_lock:
+            stats = dict(self.parse_stats)
+        # Все, что не прошло схему с первого раза, - запасной путь
+        stats["fallback_rate"] = 1 - stats["valid"] / stats["items"] if stats["items"] else 0.0
+        return stats
+
+    def record_eval(self, kind: str, reply: Dict[str, Any]):
+        """Учесть тайминги ответа Ollama (prompt_eval_* и eval_*, в наносекундах)"""
+        if "prompt_eval_duration" not in reply and "eval_duration" not in reply:
+            # Бэкенд без таймингов (subprocess)
+            return
+        call = {
+            "kind": kind,
+            "prompt_eval_count": reply.get("prompt_eval_count", 0),
+            "prompt_eval_ms": reply.get("prompt_eval_duration", 0) / 1e6,
+            "eval_count": reply.get("eval_count", 0),
+            "eval_ms": reply.get("eval_duration", 0) / 1e6,
+            "load_ms": reply.get("load_duration", 0) / 1e6,
+        }
+        with self._eval_lock:
+            self.eval_log.append(call)
+            self.eval_stats["calls"] += 1
+            for key in ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration", "load_duration"):
+                self.eval_stats[key] += reply.get(key, 0)
+        self.metrics.observe_reply(reply)
+        if self.model_manager is not None:
+            self.model_manager.observe(reply)
+        logger.debug(f"⏱️ {kind}: промпт {call['prompt_eval_count']} ток. за {call['prompt_eval_ms']:.1f} мс, "
+                     f"ответ {call['eval_count']} ток. за {call['eval_ms']:.1f} мс")
+
+    def get_eval_stats(self) -> Dict[str, Any]:
+        """Суммарные тайминги: время на промпт, на генерацию и на загрузку модели"""
+        with self._eval_lock:
+            stats = dict(self.eval_stats)
+        calls = stats["calls"] or 1
+        stats["avg_prompt_eval_count"] = stats["prompt_eval_count"] / calls
+        stats["avg_prompt_eval_ms"] = stats["prompt_eval_duration"] / 1e6 / calls
+        stats["avg_eval_ms"] = stats["eval_duration"] / 1e6 / calls
+        return stats
+
+    def _generate(self, prompt: str, timeout: float, format: Optional[Any] = None,
+                  options: Optional[Dict[str, Any]] = None, kind: str = "single") -> str:
+        """Отправить промпт модели через выбранный бэкенд"""
+        if self.api == "chat":
+            reply = self.backend.chat(
+                self.model_name, [{"role": "user", "content": prompt}], timeout=timeout,
+                options=options, format=format
+            )
+        else:
+            reply = self.backend.generate(
+                self.model_name, prompt, timeout=timeout, options=options, format=format
+            )
+        self.record_eval(kind, reply)
+        self._observe_prompt(kind, prompt, reply)
+        return reply.get("response", "").strip()
+
+    def _observe_prompt(self, kind: str, prompt: str, reply: Dict[str, Any]):
+        """Уточнить оценку токенов упаковщика по prompt_eval_count ответа на батч"""
+        if kind == "batch" and self.packer is not None:
+            self.packer.observe(prompt, reply.get("prompt_eval_count", 0), self._create_batch_prompt([]))
+
+    def _get_async_backend(self) -> AsyncHTTPBackend:
+        """Асинхронный клиент с адресом и keep_alive основного бэкенда"""
+        if self._async_backend is None:
+            self._async_backend = AsyncHTTPBackend(
+                host=self.backend.host,
+                keep_alive=self.backend.keep_alive,
+                pool_size=self.max_concurrency
+            )
+        return self._async_backend
+
+    async def _run_blocking(self, func: Callable, *args: Any) -> Any:
+        """Синхронный вызов из асинхронного кода в пуле на max_concurrency потоков"""
+        if self._async_executor is None:
+            if not isinstance(self.backend, HTTPBackend):
+                logger.info(f"ℹ️ У бэкенда {self.backend.name} нет асинхронного клиента - "
+                            f"запросы идут в пуле из {self.max_concurrency} потоков")
+            self._async_executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                      thread_name_prefix="classify-async")
+        return await asyncio.get_running_loop().run_in_executor(self._async_executor, func, *args)
+
+    def _rule_result(self, product: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Классифицировать правилами, если они достаточно уверены"""
+        if self.rules is None:
+            return None
+        
+        start_time = time.time()
+        match = self.rules.match(product)
+        if match["category"] not in self.categories or match["confidence"] < self.rule_threshold:
+            return None
+        
+        return {
+            "product_name": product.get("name", ""),
+            "predicted_category": match["category"],
+            "confidence": match["confidence"],
+            "full_response": "",
+            "method": "rules",
+            "processing_time": time.time() - start_time,
+            "resources": self.resource_monitor.get_current_stats()
+        }
+
+    def _fast_path(self, product: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Результат без обращения к модели: правила, затем кэш"""
+        return self._rule_result(product) or self._cache_get(product)
+
+    def _knn_results(self, products: list) -> List[Optional[Dict[str, Any]]]:
+        """Результаты ближайших соседей для уверенных товаров, None - нужна модель"""
+        if self.knn is None or not products:
+            return [None] * len(products)
+        
+        start_time = time.time()
+        try:
+            matches = self.knn.classify(products)
+        except BackendError as e:
+            logger.warning(f"⚠️ Поиск ближайших соседей недоступен: {e}")
+            return [None] * len(products)
+        elapsed_time = (time.time() - start_time) / len(products)
+        
+        stats = self.resource_monitor.get_current_stats()
+        results = []
+        for product, match in zip(products, matches):
+            if match is None or match["category"] not in self.categories:
+                results.append(None)
+                continue
+            results.append({
+                "product_name": product.get("name", ""),
+                "predicted_category": match["category"],
+                "confidence": match["confidence"],
+                "knn_margin": match["margin"],
+                "full_response": "",
+                "method": "knn",
+                "processing_time": elapsed_time,
+                "resources": stats
+            })
+        return results
+
+    def _resolve_without_model(self, products: list) -> List[Optional[Dict[str, Any]]]:
+        """Правила и кэш по каждому товару, затем ближайшие соседи по остатку батчем"""
+        results = [self._fast_path(product) for product in products]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending and self.knn is not None:
+            # Ответы соседей не кэшируются: они зависят от индекса, k и порогов, а не от модели
+            for i, result in zip(pending, self._knn_results([products[i] for i in pending])):
+                if result is not None:
+                    results[i] = result
+        return results
+
+    def add_correction(self, product: Dict[str, str], category: str):
+        """Запомнить правильную категорию товара: в индекс соседей и в кэш"""
+        if category not in self.categories:
+            raise ValueError(f"Неизвестная категория: {category}")
+        if self.knn is not None:
+            self.knn.add([product], [category])
+        self._cache_put(product, {"predicted_category": category, "confidence": 1.0, "method": "correction"})
+
+    def _cache_fingerprint(self) -> str:
+        """Отпечаток модели, категорий и шаблонов промптов; пересчитывается при смене настроек"""
+        config = (
+            self.model_name,
+            tuple(self.categories),
+            self.output_mode,
+            self.cascade.fast_model if self.cascade is not None else None,
+            tuple(sorted(self.cascade.thresholds.items())) if self.cascade is not None else None,
+            self.cascade.default_threshold if self.cascade is not None else None,
+            self.packer.max_description_tokens if self.packer is not None else None,
+        )
+        cached = self._fingerprint
+        if cached is not None and cached[0] == config:
+            return cached[1]
+        sample = {"name": "{name}", "description": "{description}"}
+        parts = [
+            self.model_name,
+            self.categories,
+            PROMPT_VERSION,
+            self._create_classification_prompt(sample),
+            self._create_batch_prompt([sample])
+        ]
+        if self.cascade is not None:
+            # Результаты каскада зависят от быстрой модели и порогов
+            parts.append(self.cascade.get_stats()["thresholds"])
+            parts.append(self.cascade.fast_model)
+        if self.packer is not None:
+            # Длинные описания обрезаются - ответ зависит от бюджета
+            parts.append(self.packer.max_description_tokens)
+        fingerprint = make_fingerprint(*parts)
+        self._fingerprint = (config, fingerprint)
+        return fingerprint
+
+    def _cache_get(self, product: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Найти результат товара в кэше"""
+        if self.cache is None:
+            return None
+        
+        start_time = time.time()
+        value = self.cache.get(product, self._cache_fingerprint())
+        if value is None:
+            return None
+        
+        value.update({
+            "product_name": product.get("name", ""),
+            "full_response": "",
+            "cached": True,
+            "processing_time": time.time() - start_time,
+            "resources": self.resource_monitor.get_current_stats()
+        })
+        return value
+
+    def _cache_put(self, product: Dict[str, str], result: Dict[str, Any]):
+        """Сохранить результат в кэш (ошибки и unknown не кэшируются)"""
+        if self.cache is None or "error" in result:
+            return
+        if result.get("predicted_category", "unknown") == "unknown":
+            return
+        
+        self.cache.put(product, self._cache_fingerprint(), {
+            "predicted_category": result["predicted_category"],
+            "confidence": result.get("confidence", 0.0),
+            "method": result.get("method", "")
+        })
+
+    def _timed_parse(self, parse, *args):
+        """Разобрать ответ модели, записав время разбора в метрики"""
+        start_time = time.perf_counter()
+        try:
+            return parse(*args)
+        finally:
+            self.metrics.parse_seconds.observe(time.perf_counter() - start_time)
+
+    def classify_products_batch(self, products: list, show_progress: bool = True) -> list:
         """Классифицировать несколько продуктов одним запросом"""
+        start_time = time.perf_counter()
+        results = self._classify_products_batch(products, show_progress)
+        self.metrics.observe_results("batch", results, time.perf_counter() - start_time)
+        return results
+
+    def _classify_products_batch(self, products: list, show_progress: bool = True) -> list:
+        """Классификация без записи метрик вызова"""
         if not self.is_loaded:
             return [{"error": "Модель не загружена"}] * len(products)
         
+        results = self._resolve_without_model(products)
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            if len(pending) < len(products):
+                logger.info(f"💾 Без модели (правила/кэш/соседи): {len(products) - len(pending)} товаров")
+            fresh = self._classify_batch_uncached([products[i] for i in pending], show_progress)
+            for i, result in zip(pending, fresh):
+                self._cache_put(products[i], result)
+                results[i] = result
+        
+        return results
+
+    def _classify_batch_uncached(self, products: list, show_progress: bool = True) -> list:
+        """Классифицировать батч моделью (каскадом, если он включен), без кэша"""
+        if self.dedup is not None:
+            return self.dedup.run(products, lambda batch: self._classify_batch_cascade(batch, show_progress))
+        return self._classify_batch_cascade(products, show_progress)
+
+    def _classify_batch_cascade(self, products: list, show_progress: bool = True) -> list:
+        """Классифицировать батч каскадом или одной моделью"""
+        if self.cascade is None:
+            return self._classify_batch_model(products, show_progress)
+        fast = self.cascade.classifier
+        return self.cascade.run(
+            products,
+            lambda batch: fast._classify_batch_model(batch, show_progress),
+            lambda batch: self._classify_batch_model(batch, show_progress)
+        )
+
+    def _classify_batch_model(self, products: list, show_progress: bool = True) -> list:
+        """Классифицировать батч одной моделью"""
+        if self.output_mode == "logprob":
+            # Один токен на товар - батч-промпт не нужен, товары идут параллельно
+            logger.info(f"🔍 Оценка по logprobs: {len(products)} товаров")
+            results: List[Optional[Dict[str, Any]]] = [None] * len(products)
+            with loading_animation(f"Оценка {len(products)} товаров...", show_progress):
+                for position, result in self._score_many(products, timeout=120):
+                    results[position] = result
+            return results
+        
+        chunks = self._pack(products)
+        if len(chunks) == 1:
+            return self._classify_batch_call(products, show_progress)
+        
+        # Промпт всего батча не помещается в контекст - части идут параллельно
+        logger.info(f"📦 Батч из {len(products)} товаров разбит на {len(chunks)} по размеру контекста")
+        results = [None] * len(products)
+        with loading_animation(f"Батч классификация {len(products)} товаров...", show_progress):
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(chunks)),
+                                    thread_name_prefix="batch-chunk") as executor:
+                fresh = executor.map(
+                    lambda chunk: self._classify_batch_call([products[i] for i in chunk], False), chunks
+                )
+                for chunk, chunk_results in zip(chunks, fresh):
+                    for i, result in zip(chunk, chunk_results):
+                        results[i] = result
+        return results
+
+    def _pack(self, products: list) -> List[List[int]]:
+        """Индексы товаров по батчам, помещающимся в контекст модели"""
+        if self.packer is None or not products:
+            return [list(range(len(products)))]
+        return self.packer.pack(
+            products, self.packer.count(self._create_batch_prompt([])), self._output_tokens_per_item()
+        )
+
+    def _output_tokens_per_item(self) -> int:
+        """Токенов ответа на товар в батче"""
+        if self.output_mode == "compact":
+            return 8
+        # {"index": 1, "category": "...", "confidence": 0.95, "reasoning": "..."}
+        return 64
+
+    def _description(self, product: Dict[str, str]) -> str:
+        """Описание товара для промпта, в пределах бюджета токенов"""
+        if self.packer is None:
+            return product.get('description', '')
+        return self.packer.description(product)
+
+    def _classify_batch_call(self, products: list, show_progress: bool = True) -> list:
+        """Классифицировать батч запросом к модели (с повторами и восстановлением по частям)"""
+        if self.resilience is not None:
+            with loading_animation(f"Батч классификация {len(products)} товаров...", show_progress):
+                return self.resilience.run(
+                    products, lambda batch, timeout: self._request_batch(batch, timeout), self._batch_error
+                )
         try:
-            prompt = self._create_batch_prompt(products)
-            
-            logger.info(f"🔍 Батч классификация: {len(products)} товаров")
-            
-            # ASCII-арт анимация для батча
-            loading_frames = ["8uu==3", "8==uu3"]
-            current_frame = 0
-            animation_running = True
+            with loading_animation(f"Батч классификация {len(products)} товаров...", show_progress):
+                return self._request_batch(products, timeout=300)  # Больше времени для батча
+        except Exception as e:
+            return [self._batch_error(e)] * len(products)
+
+    def _batch_error(self, error: Exception) -> Dict[str, Any]:
+        """Результат товара, для которого батч не удалось получить"""
+        if isinstance(error, BackendTimeout):
+            return {"error": "Таймаут при батч классификации"}
+        if isinstance(error, BackendError):
+            return {"error": f"Ошибка модели: {error}"}
+        return {"error": f"Ошибка батч классификации: {str(error)}"}
+
+    def _request_batch(self, products: list, timeout: float) -> list:
+        """Один запрос батча к модели и разбор ответа; ошибки бэкенда - исключением"""
+        prompt = self._create_batch_prompt(products)
+        
+        logger.info(f"🔍 Батч классификация: {len(products)} товаров")
+        
+        start_time = time.time()
+        response = self._generate(
+            prompt, timeout=timeout, format=self._output_format(batch=True),
+            options=self._generation_options(len(products)), kind="batch"
+        )
+        
+        elapsed_time = time.time() - start_time
+        # Для батча - еще и перцентили загрузки за время его обработки
+        stats = self.resource_monitor.get_current_stats(window=elapsed_time)
+        
+        logger.info(f"✅ Батч готов! Время: {elapsed_time:.2f} сек ({elapsed_time/len(products):.2f} сек/товар)")
+        logger.debug(f"Ответ модели: {response[:500]}...")
+        
+        return self._timed_parse(self._parse_batch_response, response, products, elapsed_time, stats)
+
+    def _generate_stream(self, prompt: str, timeout: float, format: Optional[Any] = None,
+                         options: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Отдавать текст ответа модели по мере генерации"""
+        stream = self.backend.generate_stream(
+            self.model_name, prompt, timeout=timeout, options=options, format=format
+        )
+        for chunk in stream:
+            if chunk.get("done"):
+                self.record_eval("stream", chunk)
+                self._observe_prompt("batch", prompt, chunk)
+            text = chunk.get("response", "")
+            if text:
+                yield text
+
+    def classify_products_stream(self, products: list, timeout: float = 300) -> Iterator[Dict[str, Any]]:
+        """
+        Батч классификация с потоковым разбором ответа.
+        Результаты отдаются по мере генерации, в каждом есть "index" - позиция
+        товара во входном списке. Испорченные элементы ответа восстанавливаются
+        по одному, товары без ответа отдаются в конце как unknown.
+        """
+        start_time = time.perf_counter()
+        results = []
+        try:
+            for result in self._classify_products_stream(products, timeout):
+                results.append(result)
+                yield result
+        finally:
+            self.metrics.observe_results("stream", results, time.perf_counter() - start_time)
+
+    def _classify_products_stream(self, products: list, timeout: float) -> Iterator[Dict[str, Any]]:
+        """Классификация без записи метрик вызова"""
+        if not self.is_loaded:
+            for i in range(len(products)):
+                yield {"index": i, "error": "Модель не загружена"}
+            return
+        
+        pending = []
+        for i, result in enumerate(self._resolve_without_model(products)):
+            if result is None:
+                pending.append(i)
+            else:
+                result["index"] = i
+                yield result
+        if not pending:
+            return
+        
+        batch = [products[i] for i in pending]
+        if self.cascade is not None:
+            yield from self._cascade_stream(batch, pending, timeout)
+            return
+        if self.output_mode == "logprob":
+            for position, result in self._score_many(batch, timeout=timeout):
+                result["index"] = pending[position]
+                self._cache_put(batch[position], result)
+                yield result
+            return
+        
+        for chunk in self._pack(batch):
+            yield from self._stream_batch([batch[i] for i in chunk], [pending[i] for i in chunk], timeout)
+
+    def _stream_batch(self, batch: list, pending: List[int], timeout: float) -> Iterator[Dict[str, Any]]:
+        """Потоковая классификация батча, помещающегося в контекст"""
+        prompt = self._create_batch_prompt(batch)
+        if self.output_mode == "compact":
+            parser = CompactLineParser(self._compact_labels())
+        else:
+            parser = JsonArrayStreamParser()
+        done = set()
+        order = 0
+        start_time = time.time()
+        logger.info(f"🔍 Потоковая батч классификация: {len(batch)} товаров")
+        
+        validate_item = self._schema_set()["validate_item"]
+        
+        def emit(element: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            nonlocal order
+            element = self._checked_element(element, validate_item)
+            position = element.get("index")
+            order += 1
+            if not isinstance(position, int) or not 1 <= position <= len(batch) or position - 1 in done:
+                # Нет корректного индекса - считаем по порядку следования
+                position = order
+            if not 1 <= position <= len(batch) or position - 1 in done:
+                return None
+            done.add(position - 1)
+            product = batch[position - 1]
+            result = {
+                "index": pending[position - 1],
+                "product_name": product.get("name", ""),
+                "predicted_category": element.get("category", "unknown"),
+                "confidence": element.get("confidence", 0.0),
+                "full_response": json.dumps(element, ensure_ascii=False),
+                "method": "ollama_stream",
+                "processing_time": time.time() - start_time,
+                "resources": self.resource_monitor.get_current_stats()
+            }
+            self._cache_put(product, result)
+            return result
+        
+        error = None
+        try:
+            for text in self._generate_stream(prompt, timeout=timeout, format=self._output_format(batch=True),
+                                              options=self._generation_options(len(batch))):
+                for element in parser.feed(text):
+                    result = emit(element)
+                    if result is not None:
+                        yield result
+            for element in parser.close():
+                result = emit(element)
+                if result is not None:
+                    yield result
+        except BackendTimeout:
+            error = "Таймаут при батч классификации"
+        except BackendError as e:
+            error = f"Ошибка модели: {e}"
+        
+        if parser.repaired or parser.failed:
+            logger.warning(f"⚠️ Исправлено элементов: {parser.repaired}, не разобрано: {len(parser.failed)}")
+        logger.info(f"✅ Поток готов! Время: {time.time() - start_time:.2f} сек")
+        
+        self._count_parse(items=len(batch), missing=len(batch) - len(done))
+        for position, product in enumerate(batch):
+            if position in done:
+                continue
+            if error:
+                yield {"index": pending[position], "error": error}
+            else:
+                yield {
+                    "index": pending[position],
+                    "product_name": product.get("name", ""),
+                    "predicted_category": "unknown",
+                    "confidence": 0.0,
+                    "full_response": "",
+                    "method": "ollama_stream",
+                    "processing_time": time.time() - start_time,
+                    "resources": self.resource_monitor.get_current_stats()
+                }
+
+    def _cascade_stream(self, batch: list, pending: List[int], timeout: float) -> Iterator[Dict[str, Any]]:
+        """Поток быстрой модели; неуверенные ответы - в конце, одним батчем точной модели"""
+        held = []
+        fast_results = []
+        start_time = time.perf_counter()
+        for result in self.cascade.classifier._classify_products_stream(batch, timeout):
+            position = result["index"]
+            result["index"] = pending[position]
+            fast_results.append(result)
+            if self.cascade.should_escalate(result):
+                held.append((position, result))
+                continue
+            self._cache_put(batch[position], result)
+            yield result
+        fast_time = time.perf_counter() - start_time
+        if not held:
+            self.cascade.record(fast_results, [], fast_time)
+            return
+        
+        start_time = time.perf_counter()
+        second = self._classify_batch_model([batch[position] for position, _ in held], show_progress=False)
+        accurate_time = time.perf_counter() - start_time
+        escalated = []
+        for (position, fast), result in zip(held, second):
+            result = self.cascade.merge(fast, result)
+            result["index"] = pending[position]
+            self._cache_put(batch[position], result)
+            escalated.append(result)
+            yield result
+        self.cascade.record(fast_results, escalated, fast_time, accurate_time)
+
+    def classify_product(self, product: Dict[str, str]) -> Dict[str, Any]:
+        """Классифицировать продукт"""
+        start_time = time.perf_counter()
+        result = self._classify_product(product)
+        self.metrics.observe_results("single", [result], time.perf_counter() - start_time)
+        return result
+
+    def submit_products(self, products: list) -> List[Future]:
+        """
+        Неблокирующая классификация: Future с результатом на каждый товар.
+        Правила, кэш и соседи отвечают сразу (готовый Future), остальные товары
+        уходят в очередь микробатчинга. Без micro_batch товары классифицируются
+        одним батчем до возврата.
+        """
+        start_time = time.perf_counter()
+        futures: List[Future] = []
+        if not self.is_loaded:
+            resolved = [{"error": "Модель не загружена"}] * len(products)
+        elif self.batcher is None:
+            resolved = self._classify_products_batch(products, show_progress=False)
+        else:
+            resolved = self._resolve_without_model(products)
+        
+        def done(product: Dict[str, str], future: Future):
+            result = future.result()
+            self._cache_put(product, result)
+            self.metrics.observe_results("submit", [result], time.perf_counter() - start_time)
+        
+        for product, result in zip(products, resolved):
+            if result is None:
+                future = self.batcher.submit(product)
+                future.add_done_callback(lambda future, product=product: done(product, future))
+            else:
+                future = Future()
+                future.set_result(result)
+                self.metrics.observe_results("submit", [result], time.perf_counter() - start_time)
+            futures.append(future)
+        return futures
+
+    def _classify_product(self, product: Dict[str, str]) -> Dict[str, Any]:
+        """Классификация без записи метрик вызова"""
+        if not self.is_loaded:
+            return {"error": "Модель не загружена"}
+        
+        cached = self._resolve_without_model([product])[0]
+        if cached is not None:
+            return cached
+        
+        if self.batcher is not None:
+            try:
+                result = self.batcher.submit(product).result(timeout=300)
+            except FutureTimeoutError:
+                return {"error": "Таймаут при классификации"}
+            self._cache_put(product, result)
+            return result
+        
+        if self.cascade is None:
+            result = self._classify_product_model(product)
+        else:
+            fast = self.cascade.classifier
+            result = self.cascade.run(
+                [product],
+                lambda batch: [fast._classify_product_model(batch[0])],
+                lambda batch: [self._classify_product_model(batch[0])]
+            )[0]
+        self._cache_put(product, result)
+        return result
+
+    def _classify_product_model(self, product: Dict[str, str]) -> Dict[str, Any]:
+        """Классифицировать товар одной моделью"""
+        try:
+            if self.output_mode == "logprob":
+                with loading_animation(f"{product.get('name', '')[:30]}..."):
+                    return self._score_product(product, timeout=120)
             
-            def animate():
-                nonlocal current_frame
-                while animation_running:
-                    frame = loading_frames[current_frame % len(loading_frames)]
-                    sys.stdout.write(f"\r⏳ {frame} Батч классификация {len(products)} товаров...")
-                    sys.stdout.flush()
-                    current_frame += 1
-                    time.sleep(0.3)
+            prompt = self._create_classification_prompt(product)
             
-            animation_thread = threading.Thread(target=animate, daemon=True)
-            animation_thread.start()
+            logger.info(f"🔍 Классификация: {product.get('name', '')[:30]}...")
             
             start_time = time.time()
-            result = subprocess.run(
-                ["ollama", "run", self.model_name, prompt],
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                timeout=300  # Больше времени для батча
-            )
-            
-            animation_running = False
-            sys.stdout.write("\r" + " " * 80 + "\r")
-            sys.stdout.flush()
+            with loading_animation(f"{product.get('name', '')[:30]}..."):
+                response = self._generate(
+                    prompt, timeout=120, format=self._output_format(),
+                    options=self._generation_options()
+                )
             
             elapsed_time = time.time() - start_time
             
-            if result.returncode != 0:
-                return [{"error": f"Ошибка модели: {result.stderr}"}] * len(products)
-            
-            response = result.stdout.strip()
             stats = self.resource_monitor.get_current_stats()
+            logger.info(f"✅ Готово! Время: {elapsed_time:.2f} сек")
             
-            logger.info(f"✅ Батч готов! Время: {elapsed_time:.2f} сек ({elapsed_time/len(products):.2f} сек/товар)")
-            logger.debug(f"Ответ модели: {response[:500]}...")
-            
-            return self._parse_batch_response(response, products, elapsed_time, stats)
+            return self._timed_parse(self._build_result, product, response, elapsed_time, stats)
             
-        except subprocess.TimeoutExpired:
-            animation_running = False
-            sys.stdout.write("\r" + " " * 80 + "\r")
-            sys.stdout.flush()
-            return [{"error": "Таймаут при батч классификации"}] * len(products)
+        except BackendTimeout:
+            return {"error": "Таймаут при классификации"}
+        except BackendError as e:
+            return {"error": f"Ошибка Ollama: {e}"}
         except Exception as e:
-            animation_running = False
-            sys.stdout.write("\r" + " " * 80 + "\r")
-            sys.stdout.flush()
-            return [{"error": f"Ошибка батч классификации: {str(e)}"}] * len(products)
+            return {"error": f"Ошибка классификации: {str(e)}"}
+    
+    def _build_result(self, product: Dict[str, str], response: str,
+                      elapsed_time: float, stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Собрать результат классификации одного товара"""
+        parsed_response = self._parse_classification_response(response)
+        
+        return {
+            "product_name": product.get("name", ""),
+            "predicted_category": parsed_response.get("category", "unknown"),
+            "confidence": parsed_response.get("confidence", 0.0),
+            "full_response": response,
+            "method": "ollama",
+            "processing_time": elapsed_time,
+            "resources": stats
+        }
 
-    def classify_product(self, product: Dict[str, str]) -> Dict[str, Any]:
-        """Классифицировать продукт"""
+    def _top_logprobs(self) -> int:
+        """Сколько альтернатив первого токена запрашивать"""
+        return min(len(self._compact_labels()), MAX_TOP_LOGPROBS)
+
+    def _score_product(self, product: Dict[str, str], timeout: float) -> Dict[str, Any]:
+        """Классифицировать товар одним токеном и вероятностями кодов"""
+        prompt = self._create_classification_prompt(product)
+        start_time = time.time()
+        reply = self.backend.generate(
+            self.model_name, prompt, timeout=timeout,
+            options=self._generation_options(), top_logprobs=self._top_logprobs()
+        )
+        self.record_eval("score", reply)
+        elapsed_time = time.time() - start_time
+        return self._timed_parse(self._build_scored_result, product, reply, elapsed_time,
+                                 self.resource_monitor.get_current_stats())
+
+    async def _ascore_product(self, product: Dict[str, str], timeout: float) -> Dict[str, Any]:
+        """Асинхронная версия _score_product"""
+        if not isinstance(self.backend, HTTPBackend):
+            return await self._run_blocking(self._score_product, product, timeout)
+        
+        prompt = self._create_classification_prompt(product)
+        start_time = time.time()
+        reply = await self._get_async_backend().generate(
+            self.model_name, prompt, timeout=timeout,
+            options=self._generation_options(), top_logprobs=self._top_logprobs()
+        )
+        self.record_eval("score", reply)
+        elapsed_time = time.time() - start_time
+        return self._timed_parse(self._build_scored_result, product, reply, elapsed_time,
+                                 self.resource_monitor.get_current_stats())
+
+    def _score_many(self, products: list, timeout: float) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Оценить товары параллельно, отдавая (позиция, результат) по готовности"""
+        def score(product: Dict[str, str]) -> Dict[str, Any]:
+            try:
+                return self._score_product(product, timeout)
+            except BackendTimeout:
+                return {"error": "Таймаут при классификации"}
+            except BackendError as e:
+                return {"error": f"Ошибка Ollama: {e}"}
+            except Exception as e:
+                return {"error": f"Ошибка классификации: {str(e)}"}
+        
+        workers = max(1, min(self.max_concurrency, len(products)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="score") as executor:
+            futures = {executor.submit(score, product): position for position, product in enumerate(products)}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def _build_scored_result(self, product: Dict[str, str], reply: Dict[str, Any],
+                             elapsed_time: float, stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Результат режима 'logprob': категория и вероятности по первому токену"""
+        labels = self._compact_labels()
+        codes = score_codes(len(labels))
+        response = reply.get("response", "").strip()
+        scores = code_logprobs(reply.get("logprobs"), codes)
+        self._count_parse(items=1)
+        
+        if scores:
+            probabilities = code_probabilities(scores, self.score_temperature)
+            best = max(probabilities, key=probabilities.get)
+            category, confidence = labels[codes.index(best)], probabilities[best]
+            distribution = {
+                labels[codes.index(code)]: round(probability, 4)
+                for code, probability in sorted(probabilities.items(), key=lambda item: -item[1])
+            }
+            mass = label_mass(scores)
+            self._count_parse(valid=1)
+        else:
+            # Бэкенд не вернул logprobs - берем код из текста без вероятности
+            distribution, mass = {}, None
+            code = response[:1].upper()
+            if code and code in codes:
+                category, confidence = labels[codes.index(code)], 0.6
+                self._count_parse(text_fallback=1)
+            else:
+                parsed = self._text_fallback(response, 0.6)
+                category, confidence = parsed["category"], parsed["confidence"]
+        
+        return {
+            "product_name": product.get("name", ""),
+            "predicted_category": category,
+            "confidence": confidence,
+            "scores": distribution,
+            "label_mass": mass,
+            "full_response": response,
+            "method": "ollama_logprob",
+            "processing_time": elapsed_time,
+            "resources": stats
+        }
+
+    async def _agenerate(self, prompt: str, timeout: float, format: Optional[Any] = None,
+                         options: Optional[Dict[str, Any]] = None, kind: str = "single") -> str:
+        """Асинхронно отправить промпт модели"""
+        if not isinstance(self.backend, HTTPBackend):
+            # Для остальных бэкендов - синхронный вызов в пуле потоков
+            return await self._run_blocking(self._generate, prompt, timeout, format, options, kind)
+        
+        if self.api == "chat":
+            reply = await self._get_async_backend().chat(
+                self.model_name, [{"role": "user", "content": prompt}], timeout=timeout,
+                options=options, format=format
+            )
+        else:
+            reply = await self._get_async_backend().generate(
+                self.model_name, prompt, timeout=timeout, options=options, format=format
+            )
+        self.record_eval(kind, reply)
+        self._observe_prompt(kind, prompt, reply)
+        return reply.get("response", "").strip()
+
+    async def aclassify_product(self, product: Dict[str, str], timeout: float = 120) -> Dict[str, Any]:
+        """Асинхронно классифицировать продукт"""
+        start_time = time.perf_counter()
+        result = await self._aclassify_product(product, timeout)
+        self.metrics.observe_results("async", [result], time.perf_counter() - start_time)
+        return result
+
+    async def _aclassify_product(self, product: Dict[str, str], timeout: float) -> Dict[str, Any]:
+        """Классификация без записи метрик вызова"""
         if not self.is_loaded:
             return {"error": "Модель не загружена"}
         
+        if self.knn is None:
+            cached = self._fast_path(product)
+        else:
+            # Эмбеддинг - сетевой вызов, не блокируем цикл событий
+            cached = (await self._run_blocking(self._resolve_without_model, [product]))[0]
+        if cached is not None:
+            return cached
+        
+        if self.batcher is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.wrap_future(self.batcher.submit(product)), timeout)
+            except asyncio.TimeoutError:
+                return {"error": "Таймаут при классификации"}
+            self._cache_put(product, result)
+            return result
+        
+        if self.cascade is None:
+            result = await self._aclassify_product_model(product, timeout)
+        else:
+            start_time = time.perf_counter()
+            result = await self.cascade.classifier._aclassify_product_model(product, timeout)
+            fast_time = time.perf_counter() - start_time
+            if self.cascade.should_escalate(result):
+                start_time = time.perf_counter()
+                accurate = await self._aclassify_product_model(product, timeout)
+                result = self.cascade.merge(result, accurate)
+                self.cascade.record([result], [result], fast_time, time.perf_counter() - start_time)
+            else:
+                self.cascade.record([result], [], fast_time)
+        self._cache_put(product, result)
+        return result
+
+    async def _aclassify_product_model(self, product: Dict[str, str], timeout: float) -> Dict[str, Any]:
+        """Асинхронно классифицировать товар одной моделью"""
         try:
-            prompt = self._create_classification_prompt(product)
-            
-            stats = self.resource_monitor.get_current_stats()
-            logger.info(f"🔍 Классификация: {product.get('name', '')[:30]}...")
+            if self.output_mode == "logprob":
+                return await self._ascore_product(product, timeout=timeout)
             
-            # ASCII-арт анимация
-            loading_frames = ["8uu==3", "8==uu3"]
-            current_frame = 0
-            animation_running = True
-            
-            def animate():
-                nonlocal current_frame
-                while animation_running:
-                    frame = loading_frames[current_frame % len(loading_frames)]
-                    sys.stdout.write(f"\r⏳ {frame} {product.get('name', '')[:30]}...")
-                    sys.stdout.flush()
-                    current_frame += 1
-                    time.sleep(0.3)
-            
-            animation_thread = threading.Thread(target=animate, daemon=True)
-            animation_thread.start()
+            prompt = self._create_classification_prompt(product)
             
             start_time = time.time()
-            result = subprocess.run(
-                ["ollama", "run", self.model_name, prompt],
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                timeout=120
+            response = await self._agenerate(
+                prompt, timeout=timeout, format=self._output_format(),
+                options=self._generation_options()
             )
-            
-            animation_running = False
-            sys.stdout.write("\r" + " " * 80 + "\r")
-            sys.stdout.flush()
-            
             elapsed_time = time.time() - start_time
             
-            if result.returncode != 0:
-                return {"error": f"Ошибка Ollama: {result.stderr}"}
-            
-            response = result.stdout.strip()
+            logger.debug(f"✅ {product.get('name', '')[:30]}: {elapsed_time:.2f} сек")
             
             stats = self.resource_monitor.get_current_stats()
-            logger.info(f"✅ Готово! Время: {elapsed_time:.2f} сек")
+            return self._timed_parse(self._build_result, product, response, elapsed_time, stats)
             
-            parsed_response = self._parse_classification_response(response)
-            
-            return {
-                "product_name": product.get("name", ""),
-                "predicted_category": parsed_response.get("category", "unknown"),
-                "confidence": parsed_response.get("confidence", 0.0),
-                "full_response": response,
-                "method": "ollama",
-                "processing_time": elapsed_time,
-                "resources": stats
-            }
-            
-        except subprocess.TimeoutExpired:
-            animation_running = False
-            sys.stdout.write("\r" + " " * 80 + "\r")
-            sys.stdout.flush()
+        except BackendTimeout:
             return {"error": "Таймаут при классификации"}
+        except BackendError as e:
+            return {"error": f"Ошибка Ollama: {e}"}
         except Exception as e:
-            animation_running = False
-            sys.stdout.write("\r" + " " * 80 + "\r")
-            sys.stdout.flush()
             return {"error": f"Ошибка классификации: {str(e)}"}
-    
-    def _create_batch_prompt(self, products: list) -> str:
-        """Создать промпт для батч классификации"""
-        categories_str = ", ".join(self.categories)
+
+    async def aclassify_many(self, products: Iterable[Dict[str, str]],
+                             concurrency: Optional[int] = None,
+                             timeout: float = 120) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Классифицировать поток товаров с ограничением одновременных запросов.
+        Отдает пары (индекс товара, результат) по мере готовности.
+        """
+        limit = concurrency or self.max_concurrency
+        products_iter = iter(enumerate(products))
+        done_queue: asyncio.Queue = asyncio.Queue(maxsize=limit)
         
-        products_text = ""
-        for i, product in enumerate(products, 1):
-            products_text += f"""
-{i}. Товар: {product.get('name', '')}
-   Описание: {product.get('description', '')}
-"""
+        async def worker():
+            for index, product in products_iter:
+                result = await self.aclassify_product(product, timeout=timeout)
+                await done_queue.put((index, result))
+            await done_queue.put(None)
         
-        prompt = f"""
-Классифицируй все товары по одной из категорий: {categories_str}
+        workers = [asyncio.create_task(worker()) for _ in range(limit)]
+        finished = 0
+        try:
+            while finished < limit:
+                item = await done_queue.get()
+                if item is None:
+                    finished += 1
+                    continue
+                yield item
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
 
-{products_text}
+    def _prompt_prefix(self, batch: bool = False) -> str:
+        """
+        Неизменная часть промпта: задача, категории и формат ответа.
+        Идет первой и совпадает байт в байт у всех запросов режима, поэтому
+        Ollama переиспользует KV-кэш префикса и вычисляет только товары.
+        """
+        if self.output_mode == "logprob":
+            labels = self._compact_labels()
+            categories = "\n".join(f"{code} {label}" for code, label in zip(score_codes(len(labels)), labels))
+            return f"""
+Классифицируй товар. Категории:
+{categories}
+
+Ответ - один символ, код категории.
+""".strip()
+
+        if self.output_mode == "compact":
+            if batch:
+                return f"""
+Классифицируй все товары. Категории:
+{self._compact_categories()}
+
+Ответ - по строке на товар, без пояснений: индекс:номер_категории:уверенность
+Пример:
+1:3:0.95
+2:0:0.0
+""".strip()
+            return f"""
+Классифицируй товар. Категории:
+{self._compact_categories()}
+
+Ответ одной строкой без пояснений: номер_категории:уверенность
+Пример: 3:0.95
+""".strip()
+
+        categories_str = ", ".join(self.categories)
+        if batch:
+            return f"""
+Классифицируй все товары по одной из категорий: {categories_str}
 
 Ответ в формате JSON массив:
 [
@@ -325,19 +1306,10 @@ class ProductClassifier:
 ]
 
 Если не можешь определить категорию, используй "unknown" с confidence 0.0.
-"""
-        return prompt.strip()
-
-    def _create_classification_prompt(self, product: Dict[str, str]) -> str:
-        """Создать промпт для классификации"""
-        categories_str = ", ".join(self.categories)
-        
-        prompt = f"""
+""".strip()
+        return f"""
 Классифицируй товар по одной из категорий: {categories_str}
 
-Товар: {product.get('name', '')}
-Описание: {product.get('description', '')}
-
 Ответ в формате JSON:
 {{
   "category": "название_категории",
@@ -346,104 +1318,173 @@ class ProductClassifier:
 }}
 
 Если не можешь определить категорию, используй "unknown" с confidence 0.0.
+""".strip()
+
+    def _create_batch_prompt(self, products: list) -> str:
+        """Создать промпт для батч классификации"""
+        if self.output_mode == "compact":
+            return self._create_compact_batch_prompt(products)
+        
+        products_text = ""
+        for i, product in enumerate(products, 1):
+            products_text += f"""
+{i}. Товар: {product.get('name', '')}
+   Описание: {self._description(product)}
+"""
+        
+        prompt = f"""
+{self._prompt_prefix(batch=True)}
+
+Товары:
+{products_text}
+"""
+        return prompt.strip()
+
+    def _create_classification_prompt(self, product: Dict[str, str]) -> str:
+        """Создать промпт для классификации"""
+        if self.output_mode == "compact":
+            return self._create_compact_prompt(product)
+        if self.output_mode == "logprob":
+            return self._create_scoring_prompt(product)
+        
+        prompt = f"""
+{self._prompt_prefix()}
+
+Товар: {product.get('name', '')}
+Описание: {self._description(product)}
 """
         return prompt.strip()
     
+    def _compact_categories(self) -> str:
+        """Нумерованный список категорий для компактного промпта"""
+        return "\n".join(f"{number} {label}" for number, label in enumerate(self._compact_labels()))
+
+    def _create_compact_prompt(self, product: Dict[str, str]) -> str:
+        """Промпт компактного режима: в ответе только номер категории и уверенность"""
+        prompt = f"""
+{self._prompt_prefix()}
+
+Товар: {product.get('name', '')}
+Описание: {self._description(product)}
+"""
+        return prompt.strip()
+
+    def _create_scoring_prompt(self, product: Dict[str, str]) -> str:
+        """Промпт режима 'logprob': ответ - один символ, код категории"""
+        prompt = f"""
+{self._prompt_prefix()}
+
+Товар: {product.get('name', '')}
+Описание: {self._description(product)}
+
+Код:
+"""
+        return prompt.strip()
+
+    def _create_compact_batch_prompt(self, products: list) -> str:
+        """Батч-промпт компактного режима: по строке на товар"""
+        products_text = "\n".join(
+            f"{i}. Товар: {product.get('name', '')} | {self._description(product)}"
+            for i, product in enumerate(products, 1)
+        )
+        prompt = f"""
+{self._prompt_prefix(batch=True)}
+
+{products_text}
+"""
+        return prompt.strip()
+
+    def _compact_mapping(self, response: str, count: int) -> ResponseMapping:
+        """Разобрать компактный ответ батча в ResponseMapping"""
+        parser = CompactLineParser(self._compact_labels())
+        elements = parser.feed(response) + parser.close()
+        return ResponseMapping(elements, count, spans=parser.spans, raw=response)
+
     def _parse_batch_response(self, response: str, products: list, elapsed_time: float, stats: dict) -> list:
         """Парсить батч ответ от модели"""
-        try:
-            start = response.find('[')
-            end = response.rfind(']') + 1
-            
-            if start != -1 and end != 0:
-                json_str = response[start:end]
-                parsed_results = json.loads(json_str)
-                
-                results = []
-                for i, product in enumerate(products):
-                    # Ищем результат по индексу
-                    product_result = None
-                    for result in parsed_results:
-                        if result.get('index') == i + 1:
-                            product_result = result
-                            break
-                    
-                    if product_result:
-                        results.append({
-                            "product_name": product.get("name", ""),
-                            "predicted_category": product_result.get("category", "unknown"),
-                            "confidence": product_result.get("confidence", 0.0),
-                            "full_response": response,
-                            "method": "ollama_batch",
-                            "processing_time": elapsed_time / len(products),
-                            "resources": stats
-                        })
-                    else:
-                        results.append({
-                            "product_name": product.get("name", ""),
-                            "predicted_category": "unknown",
-                            "confidence": 0.0,
-                            "full_response": response,
-                            "method": "ollama_batch",
-                            "processing_time": elapsed_time / len(products),
-                            "resources": stats
-                        })
-                
-                return results
-            else:
-                # Fallback - создаем базовые результаты
-                results = []
-                for product in products:
-                    # Пытаемся найти категорию в тексте
-                    category = "unknown"
-                    confidence = 0.0
-                    
-                    for cat in self.categories:
-                        if cat.lower() in response.lower():
-                            category = cat
-                            confidence = 0.6
-                            break
-                    
-                    results.append({
-                        "product_name": product.get("name", ""),
-                        "predicted_category": category,
-                        "confidence": confidence,
-                        "full_response": response,
-                        "method": "ollama_batch_fallback",
-                        "processing_time": elapsed_time / len(products),
-                        "resources": stats
-                    })
-                
-                return results
-                
-        except json.JSONDecodeError:
-            # Fallback - создаем базовые результаты
+        # Один проход: объекты разбираются по одному, индекс -> элемент в словаре
+        if self.output_mode == "compact":
+            mapping = self._compact_mapping(response, len(products))
+        else:
+            mapping = ResponseMapping.from_text(
+                response, len(products), names=[product.get("name", "") for product in products]
+            )
+        if mapping.repaired or mapping.conflicts:
+            logger.debug(f"Ответ батча: исправлено {mapping.repaired}, конфликтов индексов {mapping.conflicts}")
+        
+        if mapping.elements:
+            validate_item = self._schema_set()["validate_item"]
+            missing = 0
             results = []
-            for product in products:
-                # Пытаемся найти категорию в тексте
-                category = "unknown"
-                confidence = 0.0
-                
-                for cat in self.categories:
-                    if cat.lower() in response.lower():
-                        category = cat
-                        confidence = 0.6
-                        break
-                
-                results.append({
+            for i, product in enumerate(products):
+                product_result = mapping.get(i)
+                if product_result is None:
+                    missing += 1
+                else:
+                    product_result = self._checked_element(product_result, validate_item)
+                # Вместо копии всего ответа - фрагмент товара и его смещения
+                result = {
                     "product_name": product.get("name", ""),
-                    "predicted_category": category,
-                    "confidence": confidence,
-                    "full_response": response,
-                    "method": "ollama_batch_fallback",
+                    "predicted_category": (product_result or {}).get("category", "unknown"),
+                    "confidence": (product_result or {}).get("confidence", 0.0),
+                    "full_response": mapping.raw_slice(i),
+                    "response_offsets": mapping.span(i),
+                    "method": "ollama_batch",
                     "processing_time": elapsed_time / len(products),
                     "resources": stats
-                })
+                }
+                if product_result is None:
+                    # Товара нет в ответе - BatchRecovery переспросит его отдельно
+                    result["missing"] = True
+                results.append(result)
             
+            self._count_parse(items=len(products), missing=missing)
             return results
+        
+        # Fallback - создаем базовые результаты
+        self._count_parse(items=len(products), text_fallback=len(products))
+        results = []
+        for product in products:
+            # Пытаемся найти категорию в тексте
+            category = "unknown"
+            confidence = 0.0
+            
+            for cat in self.categories:
+                if cat.lower() in response.lower():
+                    category = cat
+                    confidence = 0.6
+                    break
+            
+            results.append({
+                "product_name": product.get("name", ""),
+                "predicted_category": category,
+                "confidence": confidence,
+                "full_response": response,
+                "method": "ollama_batch_fallback",
+                "processing_time": elapsed_time / len(products),
+                "resources": stats
+            })
+        
+        return results
+
+    def _checked_element(self, element: Dict[str, Any], validate) -> Dict[str, Any]:
+        """Проверить элемент ответа по схеме; неверный заменить на unknown"""
+        if isinstance(element.get("category"), str):
+            element["category"] = element["category"].strip().lower()
+        errors = validate(element)
+        if not errors:
+            self._count_parse(valid=1)
+            return element
+        
+        self._count_parse(schema_errors=1)
+        logger.debug(f"Ответ не прошел схему: {errors}")
+        return {"index": element.get("index"), "category": "unknown", "confidence": 0.0}
 
     def _parse_classification_response(self, response: str) -> Dict[str, Any]:
         """Парсить ответ от модели"""
+        self._count_parse(items=1)
+        if self.output_mode == "compact":
+            return self._parse_compact_response(response)
         try:
             start = response.find('{')
             end = response.rfind('}') + 1
@@ -451,29 +1492,79 @@ class ProductClassifier:
             if start != -1 and end != 0:
                 json_str = response[start:end]
                 parsed = json.loads(json_str)
-                return parsed
+                if isinstance(parsed, dict):
+                    if isinstance(parsed.get("category"), str):
+                        parsed["category"] = parsed["category"].strip().lower()
+                    errors = self._schema_set()["validate_single"](parsed)
+                    if not errors:
+                        self._count_parse(valid=1)
+                        return parsed
+                    logger.debug(f"Ответ не прошел схему: {errors}")
+                self._count_parse(schema_errors=1)
+                return self._text_fallback(response, 0.6)
             else:
-                for category in self.categories:
-                    if category.lower() in response.lower():
-                        return {
-                            "category": category,
-                            "confidence": 0.7,
-                            "reasoning": "Извлечено из текста"
-                        }
-                
-                return {"category": "unknown", "confidence": 0.0}
+                return self._text_fallback(response, 0.7)
                 
         except json.JSONDecodeError:
-            for category in self.categories:
-                if category.lower() in response.lower():
-                    return {
-                        "category": category,
-                        "confidence": 0.6,
-                        "reasoning": "Извлечено из текста"
-                    }
-            
+            return self._text_fallback(response, 0.6)
+    
+    def _parse_compact_response(self, response: str) -> Dict[str, Any]:
+        """Разобрать компактный ответ `номер_категории:уверенность`"""
+        match = _COMPACT_SINGLE_RE.search(response)
+        if match is None:
+            return self._text_fallback(response, 0.6)
+        
+        labels = self._compact_labels()
+        number = int(match.group(1))
+        parsed = {
+            "category": labels[number] if number < len(labels) else str(number),
+            "confidence": float(match.group(2))
+        }
+        errors = self._schema_set()["validate_single"](parsed)
+        if errors:
+            logger.debug(f"Ответ не прошел схему: {errors}")
+            self._count_parse(schema_errors=1)
             return {"category": "unknown", "confidence": 0.0}
+        self._count_parse(valid=1)
+        return parsed
+    
+    def _text_fallback(self, response: str, confidence: float) -> Dict[str, Any]:
+        """Запасной разбор: ищем название категории в тексте ответа"""
+        self._count_parse(text_fallback=1)
+        for category in self.categories:
+            if category.lower() in response.lower():
+                return {
+                    "category": category,
+                    "confidence": confidence,
+                    "reasoning": "Извлечено из текста"
+                }
+        
+        return {"category": "unknown", "confidence": 0.0}
+    
+    def close(self):
+        """Остановить фоновые потоки и освободить ресурсы"""
+        self.resource_monitor.stop_monitoring()
+        if self.model_manager is not None:
+            self.model_manager.stop()
+        if self.batcher is not None:
+            self.batcher.close()
+        if self.cascade is not None:
+            self.cascade.classifier.close()
+        if self.knn is not None and self.knn.dirty:
+            try:
+                self.knn.save()
+            except OSError as e:
+                logger.warning(f"⚠️ Не удалось сохранить индекс соседей: {e}")
+        if self._async_backend is not None:
+            self._async_backend.close()
+        if self._async_executor is not None:
+            self._async_executor.shutdown(wait=False, cancel_futures=True)
+        self.backend.close()
+        if self.cache is not None:
+            self.cache.close()
     
     def __del__(self):
         """Очистка при удалении объекта"""
-        self.resource_monitor.stop_monitoring() 
\ No newline at end of file
+        if hasattr(self, "resource_monitor"):
+            # Конструктор мог не дойти до конца
+            self.close() 
\ No newline at end of file
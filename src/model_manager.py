@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Model Manager - Прогрев модели и удержание ее в памяти Ollama
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from backends import BackendError, InferenceBackend
+
+logger = logging.getLogger(__name__)
+
+
+class ModelManager:
+    """
+    Жизненный цикл модели на сервере Ollama.
+
+    При старте модель загружается пустым запросом, без генерации. Затем фоновый
+    поток раз в interval секунд проверяет через /api/ps, что модель еще в памяти:
+    если сервер ее выгрузил - загружает снова, иначе тем же пустым запросом
+    продлевает keep_alive. interval должен быть меньше keep_alive бэкенда.
+    Время холодных загрузок считается отдельно от времени инференса.
+    """
+
+    def __init__(self, backend: InferenceBackend, model: str, interval: float = 60.0,
+                 load_timeout: float = 600.0, cold_threshold: float = 1.0,
+                 options: Optional[Dict[str, Any]] = None):
+        """
+        interval: период проверки и продления keep_alive, сек (0 - без фонового потока)
+        cold_threshold: загрузка дольше стольких секунд считается холодным стартом
+        options: параметры загрузки (num_ctx), те же, что у запросов классификации
+        """
+        self.backend = backend
+        self.model = model
+        self.interval = interval
+        self.load_timeout = load_timeout
+        self.cold_threshold = cold_threshold
+        self.options = options
+        # None - неизвестно (бэкенд не сообщает о загруженных моделях)
+        self.resident: Optional[bool] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {
+            "loads": 0,
+            "cold_starts": 0,
+            "cold_start_time": 0.0,
+            "last_cold_start_time": 0.0,
+            "evictions": 0,
+            "errors": 0,
+        }
+
+    def _matches(self, name: str) -> bool:
+        return name == self.model or name.split(":")[0] == self.model
+
+    def _count(self, **counts: Any):
+        """Обновить счетчики"""
+        with self._lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+
+    def _record_load(self, load_time: float):
+        """Учесть загрузку модели: холодный старт, если она была долгой"""
+        if load_time < self.cold_threshold:
+            return
+        with self._lock:
+            self.stats["cold_starts"] += 1
+            self.stats["cold_start_time"] += load_time
+            self.stats["last_cold_start_time"] = load_time
+
+    def is_resident(self) -> Optional[bool]:
+        """Загружена ли модель в память сервера (None - бэкенд не сообщает)"""
+        try:
+            running = self.backend.list_running()
+        except BackendError as e:
+            logger.debug(f"Список загруженных моделей недоступен: {e}")
+            return None
+        return any(self._matches(model.get("name") or model.get("model", "")) for model in running)
+
+    def warm_up(self) -> Optional[float]:
+        """Загрузить модель или продлить ее keep_alive; время загрузки в секундах, None - ошибка"""
+        start_time = time.time()
+        try:
+            reply = self.backend.load(self.model, timeout=self.load_timeout, options=self.options)
+        except BackendError as e:
+            self._count(errors=1)
+            logger.warning(f"⚠️ Не удалось прогреть модель {self.model}: {e}")
+            return None
+
+        elapsed_time = time.time() - start_time
+        load_time = reply["load_duration"] / 1e9 if "load_duration" in reply else elapsed_time
+        self.resident = True
+        self._count(loads=1)
+        self._record_load(load_time)
+        if load_time >= self.cold_threshold:
+            logger.info(f"🔥 Модель {self.model} загружена в память за {load_time:.2f} сек")
+        return load_time
+
+    def observe(self, reply: Dict[str, Any]):
+        """Учесть ответ на обычный запрос: долгий load_duration - модель грузилась во время запроса"""
+        load_time = reply.get("load_duration", 0) / 1e9
+        if load_time >= self.cold_threshold:
+            logger.warning(f"⚠️ Модель {self.model} загружалась во время запроса: {load_time:.2f} сек")
+            self._record_load(load_time)
+        self.resident = True
+
+    def check(self):
+        """Проверить, что модель в памяти, и продлить keep_alive (выгруженную - загрузить)"""
+        resident = self.is_resident()
+        if resident is False:
+            self._count(evictions=1)
+            logger.warning(f"⚠️ Сервер выгрузил модель {self.model}, прогреваем заново")
+        self.resident = resident
+        self.warm_up()
+
+    def _loop(self):
+        """Фоновые проверки раз в interval"""
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self) -> Optional[float]:
+        """Прогреть модель и запустить фоновые проверки; время загрузки или None"""
+        load_time = self.warm_up()
+        if self.interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="model-keepalive")
+            self._thread.start()
+        return load_time
+
+    def stop(self):
+        """Остановить фоновые проверки"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика загрузок модели"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["model"] = self.model
+        stats["resident"] = self.resident
+        return stats
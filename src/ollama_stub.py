@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Ollama Stub - Локальный HTTP-сервер, имитирующий Ollama API
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+Используется для проверки HTTP-бэкенда без реальной модели:
+
+    python src/ollama_stub.py --port 11435
+    OLLAMA_HOST=127.0.0.1:11435 python run.py
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+from typing import Dict, Any, Callable, List, Optional
+
+# Ключевые слова для детерминированного "ответа модели"
+STUB_KEYWORDS = [
+    ("iphone", ["iphone"]),
+    ("processors", ["ryzen", "core i", "процессор", "xeon", "threadripper"]),
+    ("videocards", ["rtx", "gtx", "radeon", "rx ", "видеокарт", "geforce"]),
+    ("motherboards", ["z790", "b650", "x670", "b550", "b660", "материнск"]),
+    ("playstation", ["playstation", "ps5", "ps4"]),
+    ("nintendo-switch", ["nintendo", "switch"]),
+    ("steam-deck", ["steam deck"]),
+]
+
+_ITEM_RE = re.compile(r"^\s*(\d+)\.\s*Товар:\s*(.*)$", re.MULTILINE)
+_SINGLE_RE = re.compile(r"^Товар:\s*(.*)$", re.MULTILINE)
+_QUERY_RE = re.compile(r'^Запрос пользователя: "(.*)"$', re.MULTILINE)
+_LISTED_RE = re.compile(r"^\s*(\d+)\.\s*(.*)$", re.MULTILINE)
+_ACCESSORY_WORDS = ["dualsense", "controller", "геймпад", "чехол", "vr", "кабель"]
+_NUMBERED_CATEGORY_RE = re.compile(r"^(\w+) ([\w-]+)$", re.MULTILINE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов: около 4 символов на токен"""
+    return (len(text) + 3) // 4
+
+
+def parse_keep_alive(value: Any) -> float:
+    """keep_alive Ollama в секундах: число, строка вида '30m'/'10s'/'1h', отрицательное - бессрочно"""
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        text = str(value).strip()
+        units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        unit = next((unit for unit in ("ms", "s", "m", "h") if text.endswith(unit)), "")
+        seconds = float(text[:len(text) - len(unit)]) * units.get(unit, 1)
+    return math.inf if seconds < 0 else seconds
+
+
+def guess_category(text: str) -> str:
+    """Угадать категорию по ключевым словам"""
+    text = text.lower()
+    for category, keywords in STUB_KEYWORDS:
+        if any(keyword in text for keyword in keywords):
+            return category
+    return "unknown"
+
+
+def default_responder(prompt: str, payload: Dict[str, Any]) -> str:
+    """Ответ по умолчанию: JSON в формате промптов классификатора"""
+    query = _QUERY_RE.search(prompt)
+    if query:
+        # Проверка товаров по запросу: та же категория и не аксессуар
+        target = guess_category(query.group(1))
+        results = []
+        for index, name in _LISTED_RE.findall(prompt):
+            accessory = any(word in name.lower() for word in _ACCESSORY_WORDS)
+            results.append({
+                "index": int(index),
+                "product_name": name,
+                "is_valid": target != "unknown" and guess_category(name) == target and not accessory,
+                "reason": "stub"
+            })
+        return json.dumps({"query": query.group(1), "results": results}, ensure_ascii=False)
+
+    items = _ITEM_RE.findall(prompt)
+    if "код категории" in prompt:
+        # Режим logprob: один символ - код категории
+        codes = {label: code for code, label in _NUMBERED_CATEGORY_RE.findall(prompt)}
+        match = _SINGLE_RE.search(prompt)
+        return codes.get(guess_category(match.group(1) if match else prompt), "0")
+
+    if "номер_категории" in prompt:
+        # Компактный режим: номера категорий вместо JSON
+        numbers = {label: number for number, label in _NUMBERED_CATEGORY_RE.findall(prompt)}
+        if items:
+            return "\n".join(
+                f"{index}:{numbers.get(guess_category(name), '0')}:"
+                f"{0.9 if guess_category(name) != 'unknown' else 0.0}"
+                for index, name in items
+            )
+        match = _SINGLE_RE.search(prompt)
+        category = guess_category(match.group(1) if match else prompt)
+        return f"{numbers.get(category, '0')}:{0.9 if category != 'unknown' else 0.0}"
+
+    if items:
+        results = []
+        for index, name in items:
+            category = guess_category(name)
+            results.append({
+                "index": int(index),
+                "category": category,
+                "confidence": 0.9 if category != "unknown" else 0.0,
+                "reasoning": "stub"
+            })
+        return json.dumps(results, ensure_ascii=False)
+
+    match = _SINGLE_RE.search(prompt)
+    category = guess_category(match.group(1) if match else prompt)
+    return json.dumps({
+        "category": category,
+        "confidence": 0.9 if category != "unknown" else 0.0,
+        "reasoning": "stub"
+    }, ensure_ascii=False)
+
+
+def _unit_hash(text: str, salt: str) -> float:
+    """Детерминированное число из [0, 1) по тексту"""
+    digest = hashlib.sha256(f"{salt}\x1f{text}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64
+
+
+def noisy_responder(error_rate: float = 0.2, models: Optional[List[str]] = None,
+                    responder: Callable[[str, Dict[str, Any]], str] = default_responder
+                    ) -> Callable[[str, Dict[str, Any]], str]:
+    """
+    Ответы "маленькой модели" в JSON-режиме: доля error_rate товаров получает
+    чужую категорию с уверенностью 0.4-0.75, остальные - верную с 0.7-0.99.
+    models - к каким моделям применять (по умолчанию ко всем).
+    """
+    categories = [category for category, _ in STUB_KEYWORDS]
+
+    def distort(name: str, element: Dict[str, Any]):
+        category = element.get("category", "unknown")
+        noise = _unit_hash(name, "confidence")
+        if category != "unknown" and _unit_hash(name, "error") < error_rate:
+            element["category"] = categories[(categories.index(category) + 1) % len(categories)]
+            element["confidence"] = round(0.4 + 0.35 * noise, 2)
+        elif category != "unknown":
+            element["confidence"] = round(0.7 + 0.29 * noise, 2)
+
+    def respond(prompt: str, payload: Dict[str, Any]) -> str:
+        text = responder(prompt, payload)
+        model = payload.get("model", "")
+        if models is not None and not any(model == name or model.split(":")[0] == name for name in models):
+            return text
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return text
+        if isinstance(data, list):
+            names = dict((int(index), name) for index, name in _ITEM_RE.findall(prompt))
+            for element in data:
+                distort(names.get(element.get("index"), ""), element)
+        elif isinstance(data, dict) and "category" in data:
+            match = _SINGLE_RE.search(prompt)
+            distort(match.group(1) if match else prompt, data)
+        return json.dumps(data, ensure_ascii=False)
+
+    return respond
+
+
+def stub_embedding(text: str, dim: int = 128) -> List[float]:
+    """Детерминированный вектор текста: хэши символьных триграмм, норма 1"""
+    vector = [0.0] * dim
+    text = f"  {text.lower()} "
+    for i in range(len(text) - 2):
+        digest = hashlib.md5(text[i:i + 3].encode('utf-8')).digest()
+        vector[digest[0] % dim] += 1.0 if digest[1] & 1 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def stub_logprobs(prompt: str, token: str, top: int) -> List[Dict[str, Any]]:
+    """
+    Logprobs первого токена: 0.9 у ответа (0.6 у кода 0), остаток поровну
+    между остальными кодами категорий из промпта
+    """
+    chosen = 0.6 if token == "0" else 0.9
+    codes = [code for code, _ in _NUMBERED_CATEGORY_RE.findall(prompt) if code != token]
+    others = [(code, (1 - chosen) * 0.8 / len(codes)) for code in codes] if codes else []
+    alternatives = [(token, chosen)] + others
+    return [{
+        "token": token,
+        "logprob": math.log(chosen),
+        "top_logprobs": [
+            {"token": code, "logprob": math.log(probability)}
+            for code, probability in alternatives[:max(top, 1)]
+        ],
+    }]
+
+
+class OllamaStubServer:
+    """Потоковый HTTP-сервер с эндпоинтами /api/generate, /api/chat, /api/embed, /api/tags"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 models: Optional[List[str]] = None,
+                 responder: Callable[[str, Dict[str, Any]], str] = default_responder,
+                 latency: float = 0.0, stream_chunk: int = 8,
+                 prompt_token_latency: float = 0.0, cache_slots: int = 4,
+                 load_latency: float = 0.0, parallel: int = 0, token_latency: float = 0.0):
+        """
+        responder: текст ответа модели по промпту и запросу; исключение - ответ 500
+        latency: задержка каждого ответа, сек
+        token_latency: время генерации одного токена ответа, сек
+        parallel: одновременно вычисляемых запросов, остальные ждут - как
+                  OLLAMA_NUM_PARALLEL (0 - без ограничения)
+        load_latency: время загрузки модели, если ее нет в памяти (по keep_alive), сек
+        prompt_token_latency: время вычисления одного токена промпта, сек;
+                              общий префикс с одним из cache_slots последних
+                              промптов считается закэшированным, как KV-кэш Ollama
+        """
+        self.models = models or ["t-pro-it-2.0-optimized:latest"]
+        self.responder = responder
+        self.latency = latency
+        self.prompt_token_latency = prompt_token_latency
+        self.token_latency = token_latency
+        self.load_latency = load_latency
+        self._parallel = threading.BoundedSemaphore(parallel) if parallel > 0 else None
+        # Модели в памяти: имя -> момент выгрузки (time.monotonic)
+        self.loaded: Dict[str, float] = {}
+        self._slots: deque = deque(maxlen=cache_slots)
+        self.stream_chunk = stream_chunk
+        self.requests: List[Dict[str, Any]] = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    def _load_model(self, model: str, keep_alive: Any) -> int:
+        """Загрузить модель, если ее нет в памяти; load_duration в наносекундах"""
+        start = time.perf_counter_ns()
+        with self._lock:
+            resident = self.loaded.get(model, 0) > time.monotonic()
+        if not resident and self.load_latency:
+            time.sleep(self.load_latency)
+        with self._lock:
+            self.loaded[model] = time.monotonic() + parse_keep_alive(keep_alive)
+        return time.perf_counter_ns() - start
+
+    def evict(self, model: Optional[str] = None):
+        """Выгрузить модель (все модели) из памяти, как при нехватке VRAM"""
+        with self._lock:
+            if model is None:
+                self.loaded.clear()
+            else:
+                self.loaded.pop(model, None)
+
+    def _evaluate_prompt(self, prompt: str) -> int:
+        """Число токенов промпта, которые нужно вычислить с учетом кэша префикса"""
+        with self._lock:
+            best, cached = None, 0
+            for slot in self._slots:
+                common = len(os.path.commonprefix([prompt, slot]))
+                if common > cached:
+                    best, cached = slot, common
+            if best is not None:
+                # Запрос занимает слот с самым длинным общим префиксом
+                self._slots.remove(best)
+            self._slots.append(prompt)
+        return estimate_tokens(prompt[cached:])
+
+    @property
+    def url(self) -> str:
+        """Адрес сервера"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Заголовки и тело уходят отдельными write - без этого Nagle
+            # и отложенный ACK добавляют ~40 мс к каждому ответу
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, data: Dict[str, Any]):
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Клиент не дождался ответа (таймаут)
+                    self.close_connection = True
+
+            def _send_stream(self, chunks: List[Dict[str, Any]]):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for chunk in chunks:
+                        line = json.dumps(chunk, ensure_ascii=False).encode('utf-8') + b"\n"
+                        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            def _read_json(self) -> Dict[str, Any]:
+                length = int(self.headers.get("Content-Length", 0))
+                raw = self.rfile.read(length) if length else b"{}"
+                return json.loads(raw or b"{}")
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json(200, {"models": [{"name": name} for name in stub.models]})
+                elif self.path == "/api/ps":
+                    now = time.monotonic()
+                    with stub._lock:
+                        running = [name for name, expires in stub.loaded.items() if expires > now]
+                    self._send_json(200, {"models": [{"name": name, "model": name} for name in running]})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                try:
+                    payload = self._read_json()
+                except ValueError:
+                    self._send_json(400, {"error": "invalid json"})
+                    return
+
+                with stub._lock:
+                    stub.requests.append({"path": self.path, "payload": payload})
+
+                if self.path == "/api/embed":
+                    inputs = payload.get("input", [])
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    self._send_json(200, {
+                        "model": payload.get("model", ""),
+                        "embeddings": [stub_embedding(text) for text in inputs],
+                        "prompt_eval_count": sum(estimate_tokens(text) for text in inputs),
+                    })
+                    return
+
+                if self.path == "/api/generate":
+                    prompt = payload.get("prompt", "")
+                elif self.path == "/api/chat":
+                    prompt = "\n\n".join(m.get("content", "") for m in payload.get("messages", []))
+                else:
+                    self._send_json(404, {"error": "not found"})
+                    return
+
+                model = payload.get("model", "")
+                if not any(model == name or name.split(":")[0] == model for name in stub.models):
+                    self._send_json(404, {"error": f"model '{model}' not found"})
+                    return
+
+                load_duration = stub._load_model(model, payload.get("keep_alive", "5m"))
+                if self.path == "/api/generate" and not prompt:
+                    # Пустой промпт - только загрузка модели
+                    self._send_json(200, {"model": model, "response": "", "done": True,
+                                          "done_reason": "load", "load_duration": load_duration})
+                    return
+
+                if stub._parallel is not None:
+                    stub._parallel.acquire()
+                try:
+                    start = time.perf_counter_ns()
+                    prompt_eval_count = stub._evaluate_prompt(prompt)
+                    if stub.prompt_token_latency:
+                        time.sleep(prompt_eval_count * stub.prompt_token_latency)
+                    prompt_eval_duration = time.perf_counter_ns() - start
+                    if stub.latency:
+                        time.sleep(stub.latency)
+                    try:
+                        text = stub.responder(prompt, payload)
+                    except Exception as e:
+                        # Сбой модели - как у Ollama, 500 с полем error
+                        self._send_json(500, {"error": str(e)})
+                        return
+                    num_predict = (payload.get("options") or {}).get("num_predict")
+                    if num_predict and num_predict > 0:
+                        # Лимит токенов ответа, как у модели
+                        text = text[:num_predict * 4]
+                    if stub.token_latency:
+                        time.sleep(estimate_tokens(text) * stub.token_latency)
+                finally:
+                    if stub._parallel is not None:
+                        stub._parallel.release()
+                elapsed = time.perf_counter_ns() - start
+
+                data = {
+                    "model": model,
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "done": True,
+                    "done_reason": "stop",
+                    "total_duration": elapsed + load_duration,
+                    "load_duration": load_duration,
+                    "prompt_eval_count": prompt_eval_count,
+                    "prompt_eval_duration": prompt_eval_duration,
+                    "eval_count": estimate_tokens(text),
+                    "eval_duration": elapsed - prompt_eval_duration,
+                }
+                if payload.get("logprobs") and text:
+                    data["logprobs"] = stub_logprobs(prompt, text[:1], payload.get("top_logprobs", 0))
+                key = "message" if self.path == "/api/chat" else "response"
+                if payload.get("stream", True):
+                    # Поток кусками по несколько символов, как токены модели
+                    pieces = [text[i:i + stub.stream_chunk] for i in range(0, len(text), stub.stream_chunk)]
+                    chunks = [
+                        {"model": model, "done": False,
+                         key: {"role": "assistant", "content": piece} if key == "message" else piece}
+                        for piece in pieces
+                    ]
+                    data[key] = {"role": "assistant", "content": ""} if key == "message" else ""
+                    self._send_stream(chunks + [data])
+                    return
+
+                data[key] = {"role": "assistant", "content": text} if key == "message" else text
+                self._send_json(200, data)
+
+        return Handler
+
+    def start(self) -> "OllamaStubServer":
+        """Запустить сервер в фоновом потоке"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановить сервер"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Заглушка Ollama API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа, сек")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0,
+                        help="Время вычисления токена промпта вне кэша префикса, сек")
+    parser.add_argument("--load-latency", type=float, default=0.0, help="Время загрузки модели, сек")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Время генерации токена ответа, сек")
+    parser.add_argument("--parallel", type=int, default=0, help="Одновременно вычисляемых запросов (0 - без ограничения)")
+    args = parser.parse_args()
+
+    server = OllamaStubServer(args.host, args.port, latency=args.latency,
+                              prompt_token_latency=args.prompt_token_latency,
+                              load_latency=args.load_latency, parallel=args.parallel,
+                              token_latency=args.token_latency)
+    print(f"🧪 Заглушка Ollama слушает {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
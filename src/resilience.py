@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Resilience - Повторы с экспоненциальной задержкой и восстановление батча по частям
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Callable, List, Optional
+
+from backends import BackendError, BackendTimeout
+from metrics import MetricsRegistry
+from router import is_node_failure
+
+logger = logging.getLogger(__name__)
+
+
+def is_incomplete(result: Dict[str, Any]) -> bool:
+    """Товара нет в ответе батча или ответ не разобран - стоит переспросить меньшим батчем"""
+    return bool(result.get("missing")) or result.get("method") == "ollama_batch_fallback"
+
+
+class BatchRecovery:
+    """
+    Запрос батча с таймаутом по числу товаров и повторами при сбоях сервера.
+    Батч, не уложившийся в таймаут или с неразобранным ответом, делится пополам;
+    товары, пропавшие из ответа, переспрашиваются меньшими батчами - вплоть до
+    одного товара. Если сервер недоступен и после повторов или запрос упал
+    не по вине бэкенда (ошибка в коде), батч сразу получает ошибку. Повторы
+    и время одного батча ограничены.
+    """
+
+    def __init__(self, retries: int = 2, backoff: float = 0.5, max_backoff: float = 8.0,
+                 base_timeout: float = 60.0, item_timeout: float = 15.0, max_timeout: float = 300.0,
+                 retry_budget: int = 4, deadline: float = 600.0,
+                 registry: Optional[MetricsRegistry] = None):
+        """
+        retries: повторов одного запроса при таймауте, обрыве или 5xx
+        backoff: первая пауза перед повтором, дальше - вдвое больше (не больше max_backoff)
+        base_timeout, item_timeout: таймаут батча = base_timeout + item_timeout * товаров,
+                                    не больше max_timeout
+        retry_budget: повторов на весь батч вместе с его частями
+        deadline: общий срок батча в секундах, после него оставшиеся товары - с ошибкой
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.base_timeout = base_timeout
+        self.item_timeout = item_timeout
+        self.max_timeout = max_timeout
+        self.retry_budget = retry_budget
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "retries": 0,
+            "splits": 0,
+            "requeued": 0,
+            "recovered": 0,
+            "failed": 0,
+            "deadline_exceeded": 0,
+        }
+        self._retries = self._splits = self._recovered = None
+        if registry is not None:
+            self._retries = registry.counter(
+                "classifier_batch_retries_total", "Повторы запроса батча по причине", ("reason",))
+            self._splits = registry.counter(
+                "classifier_batch_splits_total", "Батчи, переспрошенные по частям, по причине", ("reason",))
+            self._recovered = registry.counter(
+                "classifier_recovered_items_total", "Товары, получившие ответ после повтора меньшим батчем")
+
+    def timeout(self, count: int) -> float:
+        """Таймаут запроса батча из count товаров"""
+        return min(self.max_timeout, self.base_timeout + self.item_timeout * count)
+
+    def delay(self, attempt: int) -> float:
+        """Пауза перед повтором номер attempt (с нуля), со случайным разбросом"""
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.8, 1.2)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def call(self, products: list, request: Callable[[list, float], list],
+             deadline_at: Optional[float] = None, budget: Optional[List[int]] = None) -> list:
+        """
+        Запрос батча с повторами; таймаут батча больше одного товара не повторяется - его делят.
+        deadline_at: срок по time.monotonic(), budget: [оставшиеся повторы] на весь батч
+        """
+        attempt = 0
+        while True:
+            timeout = self.timeout(len(products))
+            if deadline_at is not None:
+                timeout = min(timeout, deadline_at - time.monotonic())
+                if timeout <= 0:
+                    raise BackendTimeout("Истек общий срок батча")
+            try:
+                return request(products, timeout)
+            except BackendTimeout:
+                if len(products) > 1 or not self._take_retry(attempt, budget):
+                    raise
+                reason = "timeout"
+            except BackendError as e:
+                if not is_node_failure(e) or not self._take_retry(attempt, budget):
+                    raise
+                reason = "error"
+            delay = self.delay(attempt)
+            attempt += 1
+            if deadline_at is not None:
+                delay = min(delay, max(deadline_at - time.monotonic(), 0.0))
+            logger.warning(f"🔁 Повтор батча из {len(products)} товаров через {delay:.1f} сек ({reason})")
+            self._count("retries")
+            if self._retries is not None:
+                self._retries.labels(reason).inc()
+            time.sleep(delay)
+
+    def _take_retry(self, attempt: int, budget: Optional[List[int]]) -> bool:
+        """Можно ли повторить запрос: есть повторы у запроса и у всего батча"""
+        if attempt >= self.retries:
+            return False
+        if budget is not None:
+            if budget[0] <= 0:
+                return False
+            budget[0] -= 1
+        return True
+
+    def _split(self, group: List[int], size: int, reason: str) -> List[List[int]]:
+        """Разбить товары группы на части по size"""
+        self._count("splits")
+        self._count("requeued", len(group))
+        if self._splits is not None:
+            self._splits.labels(reason).inc()
+        return [group[i:i + size] for i in range(0, len(group), size)]
+
+    def run(self, products: list, request: Callable[[list, float], list],
+            error_result: Callable[[Exception], Dict[str, Any]]) -> list:
+        """
+        Классифицировать батч, переспрашивая по частям то, что не получилось.
+        request(батч, таймаут) -> результаты или исключение BackendError;
+        error_result(исключение) -> результат товара, который не удалось получить
+        """
+        self._count("calls")
+        results: List[Optional[Dict[str, Any]]] = [None] * len(products)
+        queue = deque([list(range(len(products)))])
+        requeued = set()
+        deadline_at = time.monotonic() + self.deadline
+        budget = [self.retry_budget]
+        while queue:
+            group = queue.popleft()
+            try:
+                fresh = self.call([products[i] for i in group], request, deadline_at, budget)
+            except Exception as e:
+                expired = time.monotonic() >= deadline_at
+                # Делить есть смысл, только если виноват размер батча - таймаут;
+                # неразобранный ответ приходит результатами и переспрашивается ниже
+                if len(group) > 1 and isinstance(e, BackendTimeout) and not expired:
+                    logger.warning(f"✂️ Батч из {len(group)} товаров не получен ({e}) - делим пополам")
+                    middle = (len(group) + 1) // 2
+                    queue.extend(self._split(group, middle, "failed"))
+                    requeued.update(group)
+                    continue
+                if not isinstance(e, BackendError):
+                    # Ошибка в коде повторится на любой части батча
+                    logger.error(f"❌ Батч из {len(group)} товаров упал не из-за модели: {e!r}")
+                if expired or not isinstance(e, BackendError) or (
+                        is_node_failure(e) and not isinstance(e, BackendTimeout)):
+                    # Сервер недоступен, ошибка в коде или срок вышел - остальные части тоже не ждем
+                    if expired:
+                        self._count("deadline_exceeded")
+                        logger.warning(f"⏱️ Истек срок батча ({self.deadline:g} сек)")
+                    while queue:
+                        group = group + queue.popleft()
+                self._count("failed", len(group))
+                error = error_result(e)
+                for i in group:
+                    results[i] = dict(error)
+                continue
+
+            missing = []
+            for i, result in zip(group, fresh):
+                if len(group) > 1 and is_incomplete(result):
+                    missing.append(i)
+                    continue
+                results[i] = result
+                if i in requeued and "error" not in result and not is_incomplete(result):
+                    self._count("recovered")
+                    if self._recovered is not None:
+                        self._recovered.inc()
+            if missing:
+                logger.info(f"🧩 Нет в ответе {len(missing)} из {len(group)} товаров - переспрашиваем")
+                size = max(1, min(len(missing), len(group) // 2))
+                queue.extend(self._split(missing, size, "missing"))
+                requeued.update(missing)
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Повторы, разбиения и восстановленные товары"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["retries_per_call"] = stats["retries"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Resource Monitor - Фоновый замер CPU, RAM и GPU в кольцевом буфере
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import logging
+import math
+import threading
+import time
+from array import array
+from typing import Dict, Any, List, Optional, Sequence
+
+import psutil
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+logger = logging.getLogger(__name__)
+
+# Колонки одного замера в буфере
+FIELDS = ("timestamp", "cpu_percent", "ram_percent", "ram_used_gb", "gpu_utilization_percent", "gpu_memory_used_mb")
+_WIDTH = len(FIELDS)
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Перцентиль с линейной интерполяцией (values отсортированы)"""
+    if not values:
+        return math.nan
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class ResourceMonitor:
+    """
+    Мониторинг ресурсов системы.
+
+    Фоновый поток раз в interval секунд пишет замер в кольцевой буфер
+    array('d') на capacity замеров - без словаря на каждый замер. CPU
+    считается psutil без блокировки (загрузка с прошлого замера), GPU -
+    через NVML (пакет nvidia-ml-py); без NVML или видеокарты поля GPU - NaN.
+    """
+
+    def __init__(self, interval: float = 1.0, capacity: int = 600, gpu: bool = True):
+        self.interval = interval
+        self.capacity = capacity
+        self.monitoring = False
+        self._samples = array('d', bytes(8 * _WIDTH * capacity))
+        self._count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._use_gpu = gpu
+        self._gpu_handles: List[Any] = []
+        self._gpu_info: List[Dict[str, Any]] = []
+        self.ram_total_gb = psutil.virtual_memory().total / (1024**3)
+
+    def _init_gpu(self):
+        """Подключиться к NVML; при ошибке мониторинг работает без GPU"""
+        if not self._use_gpu or pynvml is None:
+            return
+        try:
+            pynvml.nvmlInit()
+            self._gpu_handles = [pynvml.nvmlDeviceGetHandleByIndex(i)
+                                 for i in range(pynvml.nvmlDeviceGetCount())]
+        except pynvml.NVMLError as e:
+            logger.info(f"GPU недоступен через NVML: {e}")
+            self._gpu_handles = []
+
+    def _shutdown_gpu(self):
+        if self._gpu_handles:
+            try:
+                pynvml.nvmlShutdown()
+            except pynvml.NVMLError:
+                pass
+            self._gpu_handles = []
+
+    def _read_gpu(self) -> List[Dict[str, Any]]:
+        """Загрузка и память каждой видеокарты"""
+        gpus = []
+        for handle in self._gpu_handles:
+            try:
+                name = pynvml.nvmlDeviceGetName(handle)
+                memory = pynvml.nvmlDeviceGetMemoryInfo(handle)
+                utilization = pynvml.nvmlDeviceGetUtilizationRates(handle)
+            except pynvml.NVMLError:
+                continue
+            gpus.append({
+                'name': name.decode() if isinstance(name, bytes) else name,
+                'memory_used_mb': memory.used // (1024**2),
+                'memory_total_mb': memory.total // (1024**2),
+                'utilization_percent': utilization.gpu
+            })
+        return gpus
+
+    def sample(self):
+        """Снять один замер и записать его в буфер"""
+        memory = psutil.virtual_memory()
+        gpus = self._read_gpu()
+        if gpus:
+            gpu_utilization = sum(gpu['utilization_percent'] for gpu in gpus) / len(gpus)
+            gpu_memory = float(sum(gpu['memory_used_mb'] for gpu in gpus))
+        else:
+            gpu_utilization = gpu_memory = math.nan
+
+        row = (time.time(), psutil.cpu_percent(interval=None), memory.percent,
+               memory.used / (1024**3), gpu_utilization, gpu_memory)
+        with self._lock:
+            offset = (self._count % self.capacity) * _WIDTH
+            self._samples[offset:offset + _WIDTH] = array('d', row)
+            self._count += 1
+            self._gpu_info = gpus
+
+    def start_monitoring(self):
+        """Начать мониторинг ресурсов"""
+        if self._thread is not None:
+            return
+        self._init_gpu()
+        # Первый вызов без interval только запоминает точку отсчета
+        psutil.cpu_percent(interval=None)
+        # Первый замер сразу - RAM и GPU видны до первого интервала
+        self.sample()
+        self._stop.clear()
+        self.monitoring = True
+        self._thread = threading.Thread(target=self._monitor_loop, daemon=True, name="resource-monitor")
+        self._thread.start()
+
+    def stop_monitoring(self):
+        """Остановить мониторинг и дождаться потока"""
+        self.monitoring = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._shutdown_gpu()
+
+    def _monitor_loop(self):
+        """Цикл мониторинга"""
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"Ошибка мониторинга: {e}")
+
+    def _rows(self, since: float = 0.0) -> List[Sequence[float]]:
+        """Замеры не старше since (по timestamp), от старых к новым"""
+        with self._lock:
+            count = min(self._count, self.capacity)
+            start = self._count - count
+            rows = []
+            for i in range(start, self._count):
+                offset = (i % self.capacity) * _WIDTH
+                if self._samples[offset] >= since:
+                    rows.append(self._samples[offset:offset + _WIDTH])
+        return rows
+
+    def get_percentiles(self, window: float = 60.0,
+                        quantiles: Sequence[float] = (50, 95)) -> Dict[str, Any]:
+        """Перцентили каждой метрики за последние window секунд"""
+        # Окно не короче одного интервала - иначе в короткий батч не попадет ни одного замера
+        rows = self._rows(time.time() - max(window, self.interval))
+        result: Dict[str, Any] = {"samples": len(rows)}
+        for column, field in enumerate(FIELDS[1:], 1):
+            values = sorted(row[column] for row in rows if not math.isnan(row[column]))
+            if values:
+                result[field] = {f"p{q:g}": round(percentile(values, q), 2) for q in quantiles}
+        return result
+
+    def get_current_stats(self, window: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Последний замер. window - добавить перцентили за столько секунд
+        (например, за время обработки батча).
+        """
+        with self._lock:
+            if self._count == 0:
+                return {}
+            offset = ((self._count - 1) % self.capacity) * _WIDTH
+            row = self._samples[offset:offset + _WIDTH]
+            gpu_info = self._gpu_info
+
+        stats = {
+            'cpu_percent': row[1],
+            'ram_percent': row[2],
+            'ram_used_gb': row[3],
+            'ram_total_gb': self.ram_total_gb,
+            'gpu_info': gpu_info,
+            'timestamp': row[0]
+        }
+        if window:
+            stats['window'] = self.get_percentiles(window)
+        return stats
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Response Mapping - Сопоставление элементов батч-ответа модели с товарами
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+from stream_parser import parse_elements
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def normalize_name(name: Any) -> str:
+    """Нормализовать название товара для сравнения"""
+    return _NON_WORD_RE.sub(" ", str(name or "").lower()).strip()
+
+
+def _as_index(value: Any) -> Optional[int]:
+    """Индекс элемента из ответа модели (число или строка с числом)"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    return None
+
+
+def _nested_items(element: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Список элементов внутри объекта-обертки, если это обертка"""
+    if "index" in element:
+        return None
+    for value in element.values():
+        if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+            return value
+    return None
+
+
+class ResponseMapping:
+    """
+    Индекс "позиция товара -> элемент ответа", построенный за один проход.
+
+    Основной ключ - поле index (с единицы). Элементы без корректного индекса
+    сопоставляются по названию товара: сначала точное совпадение после
+    нормализации, затем наибольшее пересечение слов. Повторы одного индекса
+    схлопываются, при расхождении остается элемент с большей уверенностью.
+    Сырой ответ хранится один раз, для товаров доступны срезы по смещениям.
+    """
+
+    def __init__(self, elements: List[Dict[str, Any]], count: int,
+                 names: Optional[List[str]] = None,
+                 spans: Optional[List[Optional[Tuple[int, int]]]] = None,
+                 raw: str = "", min_similarity: float = 0.5):
+        self.elements = elements
+        self.count = count
+        self.raw = raw
+        self._spans = spans or []
+        self._positions: Dict[int, int] = {}
+        self.duplicates = 0
+        self.conflicts = 0
+        self.unmatched = 0
+        self.repaired = 0
+
+        leftovers = []
+        for number, element in enumerate(elements):
+            index = _as_index(element.get("index"))
+            if index is not None and 1 <= index <= count:
+                self._assign(index - 1, number)
+            else:
+                leftovers.append(number)
+
+        if leftovers and names:
+            self._match_by_name(leftovers, names, min_similarity)
+        else:
+            self.unmatched += len(leftovers)
+
+    @classmethod
+    def from_text(cls, raw: str, count: int, names: Optional[List[str]] = None) -> "ResponseMapping":
+        """Разобрать сырой ответ модели и построить индекс"""
+        parsed, parsed_spans, repaired = parse_elements(raw)
+        elements, spans = [], []
+        for element, span in zip(parsed, parsed_spans):
+            nested = _nested_items(element)
+            if nested is None:
+                elements.append(element)
+                spans.append(span)
+            else:
+                # Обертка вида {"results": [...]} - берем вложенные элементы
+                elements.extend(nested)
+                spans.extend([None] * len(nested))
+        mapping = cls(elements, count, names=names, spans=spans, raw=raw)
+        mapping.repaired = repaired
+        return mapping
+
+    def _assign(self, position: int, number: int):
+        """Закрепить элемент за позицией с дедупликацией"""
+        current = self._positions.get(position)
+        if current is None:
+            self._positions[position] = number
+            return
+
+        old, new = self.elements[current], self.elements[number]
+        if old.get("category") == new.get("category"):
+            self.duplicates += 1
+            return
+        self.conflicts += 1
+        if (new.get("confidence") or 0) > (old.get("confidence") or 0):
+            self._positions[position] = number
+
+    def _match_by_name(self, leftovers: List[int], names: List[str], min_similarity: float):
+        """Сопоставить элементы без индекса по названию товара"""
+        exact: Dict[str, int] = {}
+        for position, name in enumerate(names):
+            exact.setdefault(normalize_name(name), position)
+
+        fuzzy = []
+        for number in leftovers:
+            element = self.elements[number]
+            name = normalize_name(element.get("product_name") or element.get("name"))
+            position = exact.get(name) if name else None
+            if position is not None and position not in self._positions:
+                self._positions[position] = number
+            elif name:
+                fuzzy.append((number, set(name.split())))
+            else:
+                self.unmatched += 1
+
+        if not fuzzy:
+            return
+
+        # Нечеткое сравнение только для остатка и только со свободными позициями
+        free = [(position, set(normalize_name(names[position]).split()))
+                for position in range(len(names)) if position not in self._positions]
+        for number, tokens in fuzzy:
+            best, best_score = None, min_similarity
+            for position, candidate in free:
+                if position in self._positions or not candidate:
+                    continue
+                score = len(tokens & candidate) / len(tokens | candidate)
+                if score >= best_score:
+                    best, best_score = position, score
+            if best is None:
+                self.unmatched += 1
+            else:
+                self._positions[best] = number
+
+    def get(self, position: int) -> Optional[Dict[str, Any]]:
+        """Элемент ответа для товара (позиция с нуля)"""
+        number = self._positions.get(position)
+        return None if number is None else self.elements[number]
+
+    def span(self, position: int) -> Optional[Tuple[int, int]]:
+        """Смещения элемента товара в сыром ответе"""
+        number = self._positions.get(position)
+        if number is None or number >= len(self._spans):
+            return None
+        return self._spans[number]
+
+    def raw_slice(self, position: int) -> str:
+        """Фрагмент сырого ответа, относящийся к товару"""
+        span = self.span(position)
+        return self.raw[span[0]:span[1]] if span else ""
+
+    def __len__(self) -> int:
+        return len(self._positions)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Router - Распределение запросов между несколькими серверами Ollama
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, Any, Callable, Iterator, List, Optional, Sequence, Union
+
+from backends import BackendError, BackendHTTPError, HTTPBackend, InferenceBackend
+
+logger = logging.getLogger(__name__)
+
+
+def parse_hosts(hosts: Union[str, Sequence[str]]) -> List[str]:
+    """Адреса серверов из списка или строки через запятую"""
+    if isinstance(hosts, str):
+        hosts = hosts.split(",")
+    return [host.strip() for host in hosts if host.strip()]
+
+
+def is_node_failure(error: BackendError) -> bool:
+    """Ошибка узла (таймаут, обрыв, 5xx), а не запроса - такой запрос можно повторить на другом узле"""
+    return not isinstance(error, BackendHTTPError) or error.status >= 500
+
+
+class _Node:
+    """Сервер Ollama и его состояние в роутере"""
+
+    __slots__ = ("backend", "outstanding", "latency", "failures", "ejected_until", "requests", "errors")
+
+    def __init__(self, backend: InferenceBackend):
+        self.backend = backend
+        self.outstanding = 0
+        # Сглаженное время ответа, сек (0 - замеров еще не было)
+        self.latency = 0.0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def host(self) -> str:
+        return getattr(self.backend, "host", self.backend.name)
+
+
+class RouterBackend(InferenceBackend):
+    """
+    Бэкенд поверх нескольких серверов Ollama.
+
+    Запрос уходит на узел с наименьшим (запросов в работе + 1) x сглаженное
+    время ответа. Таймаут, обрыв соединения или ответ 5xx - повтор на другом
+    узле (до retries раз); после max_failures ошибок подряд узел исключается
+    на eject_time секунд. Фоновая проверка /api/tags раз в health_interval
+    секунд исключает недоступные узлы и возвращает восстановившиеся.
+    """
+
+    name = "router"
+
+    def __init__(self, hosts: Union[str, Sequence[Union[str, InferenceBackend]]],
+                 keep_alive: Any = "30m", pool_size: int = 4, retries: int = 1,
+                 max_failures: int = 3, eject_time: float = 30.0,
+                 health_interval: float = 5.0, smoothing: float = 0.2):
+        """
+        hosts: адреса через запятую, список адресов или готовых бэкендов
+        health_interval: период проверки узлов, сек (0 - без фонового потока)
+        smoothing: вес нового замера в сглаженном времени ответа
+        """
+        if isinstance(hosts, str):
+            hosts = parse_hosts(hosts)
+        backends = [host if isinstance(host, InferenceBackend)
+                    else HTTPBackend(host, keep_alive=keep_alive, pool_size=pool_size)
+                    for host in hosts]
+        if not backends:
+            raise ValueError("Роутеру нужен хотя бы один сервер")
+        self.nodes = [_Node(backend) for backend in backends]
+        self.keep_alive = keep_alive
+        self.retries = retries
+        self.max_failures = max_failures
+        self.eject_time = eject_time
+        self.health_interval = health_interval
+        self.smoothing = smoothing
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if health_interval > 0:
+            self._thread = threading.Thread(target=self._health_loop, daemon=True, name="router-health")
+            self._thread.start()
+
+    @property
+    def host(self) -> str:
+        """Адреса узлов через запятую"""
+        return ",".join(node.host for node in self.nodes)
+
+    def _available(self, now: float) -> List[_Node]:
+        """Неисключенные узлы; если исключены все - узел, который вернется раньше других"""
+        nodes = [node for node in self.nodes if node.ejected_until <= now]
+        return nodes or [min(self.nodes, key=lambda node: node.ejected_until)]
+
+    def _acquire(self, exclude: List[_Node]) -> Optional[_Node]:
+        """Выбрать узел для запроса и учесть его в работе"""
+        with self._lock:
+            candidates = [node for node in self._available(time.monotonic()) if node not in exclude]
+            if not candidates:
+                return None
+            # Без замеров все узлы равны - сдвиг по кругу, чтобы первые запросы не шли на один узел
+            shift = next(self._order) % len(candidates)
+            candidates = candidates[shift:] + candidates[:shift]
+            node = min(candidates, key=lambda node: (node.outstanding + 1) * (node.latency or 1e-3))
+            node.outstanding += 1
+            node.requests += 1
+        return node
+
+    def _release(self, node: _Node, elapsed_time: Optional[float], error: Optional[BackendError] = None):
+        """Учесть завершение запроса: время ответа или ошибку узла"""
+        with self._lock:
+            node.outstanding -= 1
+            if elapsed_time is not None:
+                node.latency = elapsed_time if not node.latency else \
+                    node.latency + self.smoothing * (elapsed_time - node.latency)
+            if error is None:
+                node.failures = 0
+                return
+            node.errors += 1
+            self._mark_failed(node, error)
+
+    def _mark_failed(self, node: _Node, error: Exception):
+        """Ошибка узла; после max_failures подряд - исключить (вызывается под _lock)"""
+        node.failures += 1
+        if node.failures >= self.max_failures and node.ejected_until <= time.monotonic():
+            node.ejected_until = time.monotonic() + self.eject_time
+            logger.warning(f"⚠️ Узел {node.host} исключен на {self.eject_time:.0f} сек: {error}")
+
+    def _call(self, method: Callable[[InferenceBackend], Any]) -> Any:
+        """Выполнить запрос на лучшем узле, при ошибке узла - повторить на другом"""
+        tried: List[_Node] = []
+        error: Optional[BackendError] = None
+        for _ in range(self.retries + 1):
+            node = self._acquire(tried)
+            if node is None:
+                break
+            tried.append(node)
+            start_time = time.perf_counter()
+            try:
+                result = method(node.backend)
+            except BackendError as e:
+                if not is_node_failure(e):
+                    self._release(node, time.perf_counter() - start_time)
+                    raise
+                self._release(node, None, e)
+                error = e
+                logger.info(f"Узел {node.host} не ответил ({e}), пробуем другой")
+                continue
+            self._release(node, time.perf_counter() - start_time)
+            return result
+        raise error or BackendError("Нет доступных узлов")
+
+    def generate(self, model: str, prompt: str, timeout: float = 120,
+                 options: Optional[Dict[str, Any]] = None,
+                 system: Optional[str] = None,
+                 format: Optional[Any] = None,
+                 top_logprobs: int = 0) -> Dict[str, Any]:
+        """Генерация на выбранном узле"""
+        return self._call(lambda backend: backend.generate(
+            model, prompt, timeout=timeout, options=options, system=system,
+            format=format, top_logprobs=top_logprobs
+        ))
+
+    def chat(self, model: str, messages: List[Dict[str, str]], timeout: float = 120,
+             options: Optional[Dict[str, Any]] = None,
+             format: Optional[Any] = None) -> Dict[str, Any]:
+        """Чат-запрос на выбранном узле"""
+        return self._call(lambda backend: backend.chat(
+            model, messages, timeout=timeout, options=options, format=format
+        ))
+
+    def embed(self, model: str, inputs: List[str], timeout: float = 120) -> List[List[float]]:
+        """Эмбеддинги на выбранном узле"""
+        return self._call(lambda backend: backend.embed(model, inputs, timeout=timeout))
+
+    def generate_stream(self, model: str, prompt: str, timeout: float = 120,
+                        options: Optional[Dict[str, Any]] = None,
+                        system: Optional[str] = None,
+                        format: Optional[Any] = None) -> Iterator[Dict[str, Any]]:
+        """Потоковая генерация; на другой узел повторяется, только пока не получено ни одного куска"""
+        tried: List[_Node] = []
+        for attempt in range(self.retries + 1):
+            node = self._acquire(tried)
+            if node is None:
+                raise BackendError("Нет доступных узлов")
+            tried.append(node)
+            start_time = time.perf_counter()
+            started = False
+            try:
+                for chunk in node.backend.generate_stream(model, prompt, timeout=timeout, options=options,
+                                                          system=system, format=format):
+                    started = True
+                    yield chunk
+            except BackendError as e:
+                if not is_node_failure(e):
+                    self._release(node, time.perf_counter() - start_time)
+                    raise
+                self._release(node, None, e)
+                if started or attempt == self.retries:
+                    raise
+                logger.info(f"Узел {node.host} не ответил ({e}), пробуем другой")
+                continue
+            except BaseException:
+                # Потребитель прервал поток (GeneratorExit) - узел исправен
+                self._release(node, None)
+                raise
+            self._release(node, time.perf_counter() - start_time)
+            return
+
+    def _each_node(self, method: Callable[[InferenceBackend], Any]) -> List[Any]:
+        """Выполнить запрос на всех доступных узлах; результаты ответивших"""
+        with self._lock:
+            nodes = self._available(time.monotonic())
+        results, error = [], None
+        for node in nodes:
+            try:
+                results.append(method(node.backend))
+            except BackendError as e:
+                error = e
+                logger.warning(f"⚠️ Узел {node.host}: {e}")
+        if not results:
+            raise error or BackendError("Нет доступных узлов")
+        return results
+
+    def list_models(self) -> List[str]:
+        """Модели, которые есть на всех ответивших узлах"""
+        models = [set(names) for names in self._each_node(lambda backend: backend.list_models())]
+        return sorted(set.intersection(*models))
+
+    def load(self, model: str, timeout: float = 600,
+             options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Загрузить модель на всех узлах; ответ с самой долгой загрузкой"""
+        replies = self._each_node(lambda backend: backend.load(model, timeout=timeout, options=options))
+        return max(replies, key=lambda reply: reply.get("load_duration", 0))
+
+    def list_running(self) -> List[Dict[str, Any]]:
+        """Модели, загруженные в память на всех ответивших узлах"""
+        running = self._each_node(lambda backend: backend.list_running())
+        names = [{model.get("name") or model.get("model", "") for model in models} for models in running]
+        common = set.intersection(*names)
+        return [model for model in running[0] if (model.get("name") or model.get("model", "")) in common]
+
+    def check_health(self):
+        """Проверить все узлы: недоступные исключить, восстановившиеся вернуть"""
+        for node in self.nodes:
+            try:
+                node.backend.list_models()
+            except BackendError as e:
+                with self._lock:
+                    self._mark_failed(node, e)
+                continue
+            with self._lock:
+                if node.ejected_until > time.monotonic():
+                    logger.info(f"✅ Узел {node.host} снова доступен")
+                node.failures = 0
+                node.ejected_until = 0.0
+
+    def _health_loop(self):
+        """Фоновые проверки раз в health_interval"""
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Состояние узлов"""
+        now = time.monotonic()
+        with self._lock:
+            return {"nodes": [{
+                "host": node.host,
+                "available": node.ejected_until <= now,
+                "outstanding": node.outstanding,
+                "latency_ms": round(node.latency * 1000, 2),
+                "requests": node.requests,
+                "errors": node.errors,
+            } for node in self.nodes]}
+
+    def close(self):
+        """Остановить проверки и закрыть соединения узлов"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for node in self.nodes:
+            node.backend.close()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Rules - Быстрая классификация очевидных товаров без обращения к модели
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = Path(__file__).parent.parent / "data" / "rules.json"
+
+
+class RuleEngine:
+    """
+    Набор правил, скомпилированный в одно регулярное выражение.
+
+    Все правила категорий объединены в альтернативу с именованными группами,
+    поэтому текст товара просматривается за один проход. Общий для правил
+    префикс \\b вынесен за альтернативу: позиции внутри слов отсекаются сразу,
+    без перебора всех ветвей. Совпадения в названии важнее описания: описание
+    учитывается, только если в названии ничего нет. Правило с полем exclude
+    не срабатывает, если в том же тексте есть исключение (чипсет X570 - не
+    плата, если рядом "смартфон" или "ноутбук").
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]], penalties: Optional[List[Dict[str, Any]]] = None,
+                 description_weight: float = 0.8, conflict_penalty: float = 0.5):
+        self.rules = rules
+        self.description_weight = description_weight
+        self.conflict_penalty = conflict_penalty
+        self._categories = [rule["category"] for rule in rules]
+        self._weights = [float(rule["weight"]) for rule in rules]
+        self._excludes = {
+            i: re.compile(rule["exclude"], re.IGNORECASE) for i, rule in enumerate(rules) if "exclude" in rule
+        }
+
+        self._pattern = self._compile([rule["pattern"] for rule in rules], "r")
+
+        penalties = penalties or []
+        self._penalty_pattern = self._compile([p["pattern"] for p in penalties], "p") if penalties else None
+        self._penalty_factors = [float(p["factor"]) for p in penalties]
+
+    @staticmethod
+    def _compile(patterns: List[str], prefix: str) -> "re.Pattern":
+        """Объединить шаблоны в одно выражение с группами prefix0, prefix1, ..."""
+        boundary = "\\b"
+        common = all(pattern.startswith(boundary) for pattern in patterns)
+        if common:
+            patterns = [pattern[len(boundary):] for pattern in patterns]
+        alternatives = "|".join(f"(?P<{prefix}{i}>{pattern})" for i, pattern in enumerate(patterns))
+        if common:
+            alternatives = f"(?=\\w)\\b(?:{alternatives})"
+        return re.compile(alternatives, re.IGNORECASE)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "RuleEngine":
+        """Загрузить правила из JSON-файла"""
+        path = Path(path or DEFAULT_RULES_PATH)
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        engine = cls(
+            data["rules"],
+            penalties=data.get("penalties", []),
+            description_weight=data.get("description_weight", 0.8),
+            conflict_penalty=data.get("conflict_penalty", 0.5)
+        )
+        logger.info(f"📏 Загружено {len(engine.rules)} правил из {path.name}")
+        return engine
+
+    def _score(self, text: str) -> Dict[str, float]:
+        """Максимальный вес совпавших правил по категориям"""
+        scores: Dict[str, float] = {}
+        for match in self._pattern.finditer(text):
+            index = int(match.lastgroup[1:])
+            if index in self._excludes and self._excludes[index].search(text):
+                continue
+            category = self._categories[index]
+            weight = self._weights[index]
+            if weight > scores.get(category, 0.0):
+                scores[category] = weight
+        return scores
+
+    def match(self, product: Dict[str, str]) -> Dict[str, Any]:
+        """Определить категорию товара. Возвращает category и confidence"""
+        name = product.get("name", "") or ""
+        description = product.get("description", "") or ""
+
+        scores = self._score(name)
+        weight = 1.0
+        if not scores and description:
+            scores = self._score(description)
+            weight = self.description_weight
+
+        if not scores:
+            return {"category": "unknown", "confidence": 0.0}
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        category, confidence = ranked[0]
+        if len(ranked) > 1:
+            # Несколько категорий - уверенность падает пропорционально конкуренту
+            confidence -= self.conflict_penalty * ranked[1][1]
+        confidence *= weight
+
+        if self._penalty_pattern is not None:
+            matched = {m.lastgroup for m in self._penalty_pattern.finditer(f"{name} {description}")}
+            for group in matched:
+                confidence *= self._penalty_factors[int(group[1:])]
+
+        return {"category": category, "confidence": round(max(confidence, 0.0), 4)}
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Schema - JSON-схемы ответа модели и быстрая проверка по ним
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+from typing import Dict, Any, Callable, List
+
+Validator = Callable[[Any, str], List[str]]
+
+
+def classification_schema(categories: List[str]) -> Dict[str, Any]:
+    """Схема ответа на один товар (поле format в Ollama API)"""
+    return {
+        "type": "object",
+        "properties": {
+            "category": {"type": "string", "enum": list(categories) + ["unknown"]},
+            "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+            "reasoning": {"type": "string"},
+        },
+        "required": ["category", "confidence"],
+    }
+
+
+def batch_schema(categories: List[str]) -> Dict[str, Any]:
+    """Схема ответа на батч: массив объектов с индексом товара"""
+    item = classification_schema(categories)
+    item["properties"] = {"index": {"type": "integer", "minimum": 1}, **item["properties"]}
+    item["required"] = ["index"] + item["required"]
+    return {"type": "array", "items": item}
+
+
+def validation_schema() -> Dict[str, Any]:
+    """Схема ответа на проверку товаров по запросу пользователя"""
+    return {
+        "type": "object",
+        "properties": {
+            "query": {"type": "string"},
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "index": {"type": "integer", "minimum": 1},
+                        "product_name": {"type": "string"},
+                        "is_valid": {"type": "boolean"},
+                        "reason": {"type": "string"},
+                    },
+                    "required": ["index", "is_valid"],
+                },
+            },
+        },
+        "required": ["results"],
+    }
+
+
+_TYPES = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+}
+
+
+def compile_validator(schema: Dict[str, Any]) -> Validator:
+    """
+    Скомпилировать схему в функцию проверки.
+
+    Поддерживается подмножество JSON Schema, которое используют схемы выше:
+    type, enum, minimum/maximum, properties/required, items. Схема разбирается
+    один раз, проверка - вызовы готовых замыканий без интерпретации словаря.
+    """
+    checks: List[Validator] = []
+
+    if "type" in schema:
+        type_name = schema["type"]
+        type_check = _TYPES[type_name]
+
+        def check_type(value, path):
+            return [] if type_check(value) else [f"{path}: ожидался {type_name}"]
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = frozenset(schema["enum"])
+
+        def check_enum(value, path):
+            try:
+                return [] if value in allowed else [f"{path}: {value!r} не из списка"]
+            except TypeError:
+                return [f"{path}: {value!r} не из списка"]
+        checks.append(check_enum)
+
+    if "minimum" in schema or "maximum" in schema:
+        low = schema.get("minimum", float("-inf"))
+        high = schema.get("maximum", float("inf"))
+
+        def check_range(value, path):
+            if _TYPES["number"](value) and not low <= value <= high:
+                return [f"{path}: {value} вне [{low}, {high}]"]
+            return []
+        checks.append(check_range)
+
+    if "properties" in schema or "required" in schema:
+        properties = {key: compile_validator(sub) for key, sub in schema.get("properties", {}).items()}
+        required = tuple(schema.get("required", ()))
+
+        def check_object(value, path):
+            if not isinstance(value, dict):
+                return []
+            errors = [f"{path}.{key}: отсутствует" for key in required if key not in value]
+            for key, validator in properties.items():
+                if key in value:
+                    errors.extend(validator(value[key], f"{path}.{key}"))
+            return errors
+        checks.append(check_object)
+
+    if "items" in schema:
+        item_validator = compile_validator(schema["items"])
+
+        def check_items(value, path):
+            if not isinstance(value, list):
+                return []
+            errors = []
+            for i, item in enumerate(value):
+                errors.extend(item_validator(item, f"{path}[{i}]"))
+            return errors
+        checks.append(check_items)
+
+    def validate(value: Any, path: str = "$") -> List[str]:
+        errors: List[str] = []
+        for check in checks:
+            errors.extend(check(value, path))
+            if errors:
+                # Дальше проверять бессмысленно - тип или значение уже не те
+                break
+        return errors
+
+    return validate
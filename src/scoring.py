@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Scoring - Вероятности категорий по logprobs первого токена ответа
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import math
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# Односимвольные коды категорий - каждый код один токен
+SCORE_CODES = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# Ollama отдает не больше 20 альтернатив на токен
+MAX_TOP_LOGPROBS = 20
+
+
+def score_codes(count: int) -> List[str]:
+    """Коды для count меток"""
+    if count > len(SCORE_CODES):
+        raise ValueError(f"Слишком много категорий для однотокенных кодов: {count}")
+    return list(SCORE_CODES[:count])
+
+
+def _logsumexp(a: float, b: float) -> float:
+    high = max(a, b)
+    return high + math.log(math.exp(a - high) + math.exp(b - high))
+
+
+def code_logprobs(logprobs: Optional[List[Dict[str, Any]]], codes: List[str]) -> Dict[str, float]:
+    """
+    Logprob каждого кода среди альтернатив первого токена ответа.
+    Варианты одного кода (" 3", "3", "a" и "A") складываются.
+    """
+    if not logprobs:
+        return {}
+    first = logprobs[0]
+    candidates = first.get("top_logprobs") or [first]
+    lookup = {code.lower(): code for code in codes}
+
+    scores: Dict[str, float] = {}
+    for candidate in candidates:
+        code = lookup.get(str(candidate.get("token", "")).strip().lower())
+        logprob = candidate.get("logprob")
+        if code is None or not isinstance(logprob, (int, float)):
+            continue
+        scores[code] = logprob if code not in scores else _logsumexp(scores[code], logprob)
+    return scores
+
+
+def code_probabilities(scores: Dict[str, float], temperature: float = 1.0) -> Dict[str, float]:
+    """Вероятности кодов, нормированные внутри множества меток, с температурой"""
+    if not scores:
+        return {}
+    high = max(scores.values())
+    weights = {code: math.exp((logprob - high) / temperature) for code, logprob in scores.items()}
+    total = sum(weights.values())
+    return {code: weight / total for code, weight in weights.items()}
+
+
+def label_mass(scores: Dict[str, float]) -> float:
+    """Доля вероятности первого токена, пришедшаяся на коды меток"""
+    return min(1.0, sum(math.exp(logprob) for logprob in scores.values()))
+
+
+def fit_temperature(samples: Iterable[Tuple[Dict[str, float], str]],
+                    grid: Optional[List[float]] = None) -> float:
+    """
+    Подобрать температуру по размеченным примерам (logprobs кодов, верный код),
+    минимизируя логарифмическую ошибку. Результат - score_temperature классификатора.
+    """
+    samples = [(scores, code) for scores, code in samples if scores]
+    if not samples:
+        return 1.0
+    grid = grid or [round(0.25 * step, 2) for step in range(1, 21)]
+
+    best, best_loss = 1.0, float("inf")
+    for temperature in grid:
+        loss = 0.0
+        for scores, code in samples:
+            probability = code_probabilities(scores, temperature).get(code, 0.0)
+            loss -= math.log(max(probability, 1e-6))
+        if loss < best_loss:
+            best, best_loss = temperature, loss
+    return best
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Service - HTTP-сервис классификации с объединением одинаковых запросов
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+from cache import make_key
+from metrics import CONTENT_TYPE
+
+logger = logging.getLogger(__name__)
+
+# Поля результата, которые не отдаются клиентам
+_HIDDEN_FIELDS = ("resources",)
+
+
+class Overloaded(Exception):
+    """Очередь заполнена - клиенту стоит повторить позже"""
+
+
+class ClassificationService:
+    """
+    Общий классификатор для многих клиентов.
+
+    Одинаковые товары (по нормализованным названию и описанию), которые уже
+    ждут ответа модели, не ставятся в очередь повторно - все запросы получают
+    результат одного вызова. Число товаров в работе ограничено max_pending:
+    сверх него запрос отклоняется целиком (Overloaded, HTTP 429).
+    """
+
+    def __init__(self, classifier, max_pending: int = 256, timeout: float = 300):
+        """classifier: загруженный ProductClassifier, лучше с micro_batch"""
+        self.classifier = classifier
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        registry = classifier.metrics.registry
+        self._requests = registry.counter(
+            "service_requests_total", "Запросы к сервису по эндпоинтам и кодам ответа", ("endpoint", "status"))
+        self._coalesced = registry.counter(
+            "service_coalesced_total", "Товары, присоединенные к уже выполняемому запросу")
+        self._rejected = registry.counter(
+            "service_rejected_total", "Товары, отклоненные из-за переполнения очереди")
+        self._pending = registry.gauge(
+            "service_pending_items", "Уникальные товары в работе")
+
+    def submit(self, products: List[Dict[str, str]]) -> List[Future]:
+        """Future на каждый товар; Overloaded, если новые товары не помещаются в очередь"""
+        keys = [make_key(product, "") for product in products]
+        futures: List[Optional[Future]] = []
+        new: Dict[str, Future] = {}
+        coalesced = 0
+        with self._lock:
+            for key in keys:
+                future = self._in_flight.get(key) or new.get(key)
+                if future is not None:
+                    coalesced += 1
+                else:
+                    future = new[key] = Future()
+                futures.append(future)
+            if new and len(self._in_flight) + len(new) > self.max_pending:
+                self._rejected.inc(len(products))
+                raise Overloaded(f"В работе {len(self._in_flight)} товаров, лимит {self.max_pending}")
+            self._in_flight.update(new)
+            self._pending.set(len(self._in_flight))
+        if coalesced:
+            self._coalesced.inc(coalesced)
+        if not new:
+            return futures
+
+        # Одинаковые товары внутри запроса тоже уходят в модель один раз
+        leaders = list(new)
+        products_by_key = dict(zip(keys, products))
+        try:
+            inner = self.classifier.submit_products([products_by_key[key] for key in leaders])
+        except Exception as e:
+            logger.error(f"❌ Ошибка постановки товаров в очередь: {e}")
+            inner = [Future() for _ in leaders]
+            for future in inner:
+                future.set_result({"error": f"Ошибка классификации: {e}"})
+        for key, source in zip(leaders, inner):
+            source.add_done_callback(lambda source, key=key: self._finish(key, source))
+        return futures
+
+    def _finish(self, key: str, source: Future):
+        """Передать результат всем ожидающим и освободить место в очереди"""
+        with self._lock:
+            future = self._in_flight.pop(key)
+            self._pending.set(len(self._in_flight))
+        try:
+            future.set_result(source.result())
+        except Exception as e:
+            future.set_result({"error": f"Ошибка классификации: {e}"})
+
+    def classify(self, products: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """Результаты товаров в том же порядке (ждет не дольше timeout)"""
+        results = []
+        for future in self.submit(products):
+            try:
+                result = future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                result = {"error": "Таймаут при классификации"}
+            results.append({key: value for key, value in result.items() if key not in _HIDDEN_FIELDS})
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Состояние очереди"""
+        with self._lock:
+            pending = len(self._in_flight)
+        return {"pending": pending, "max_pending": self.max_pending}
+
+
+def _parse_product(item: Any) -> Dict[str, str]:
+    """Товар из JSON запроса: нужен хотя бы name"""
+    if not isinstance(item, dict) or not isinstance(item.get("name"), str):
+        raise ValueError("Товар - объект с полем name")
+    return {"name": item["name"], "description": str(item.get("description") or "")}
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer с очередью входящих соединений больше стандартных 5"""
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, request_queue_size: int):
+        # Читается в server_activate, поэтому задается до конструктора базового класса
+        self.request_queue_size = request_queue_size
+        super().__init__(address, handler)
+
+
+class ClassificationServer:
+    """
+    HTTP API поверх ClassificationService:
+
+        POST /classify        {"name": ..., "description": ...} -> результат
+        POST /classify/batch  {"products": [...]} -> {"results": [...]}
+        GET  /health, GET /metrics
+    """
+
+    def __init__(self, service: ClassificationService, host: str = "127.0.0.1", port: int = 8080,
+                 max_batch: int = 1000):
+        self.service = service
+        self.max_batch = max_batch
+        # Соединения сверх очереди сервер сбрасывает, не дойдя до 429 - очередь не меньше max_pending
+        self._server = _HTTPServer((host, port), self._make_handler(),
+                                   request_queue_size=max(128, service.max_pending))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Адрес сервера"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        server = self
+        service = self.service
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            def _send_json(self, endpoint: str, status: int, data: Any, headers: Optional[Dict[str, str]] = None):
+                service._requests.labels(endpoint, str(status)).inc()
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self._send(status, body, "application/json; charset=utf-8", headers)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    self._send_json("health", 200, {
+                        "status": "ok" if service.classifier.is_loaded else "loading",
+                        "model": service.classifier.model_name,
+                        **service.get_stats()
+                    })
+                elif self.path == "/metrics":
+                    self._send(200, service.classifier.metrics.registry.render().encode('utf-8'), CONTENT_TYPE)
+                else:
+                    self._send_json("unknown", 404, {"error": "not found"})
+
+            def do_POST(self):
+                if self.path not in ("/classify", "/classify/batch"):
+                    self._send_json("unknown", 404, {"error": "not found"})
+                    return
+                endpoint = self.path.strip("/").replace("/", "_")
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                    if self.path == "/classify":
+                        products = [_parse_product(payload)]
+                    else:
+                        items = payload.get("products") if isinstance(payload, dict) else None
+                        if not isinstance(items, list) or len(items) > server.max_batch:
+                            raise ValueError(f"Ожидался список products до {server.max_batch} товаров")
+                        products = [_parse_product(item) for item in items]
+                except ValueError as e:
+                    self._send_json(endpoint, 400, {"error": str(e)})
+                    return
+
+                try:
+                    results = service.classify(products)
+                except Overloaded as e:
+                    self._send_json(endpoint, 429, {"error": str(e)}, {"Retry-After": "1"})
+                    return
+
+                if self.path == "/classify":
+                    self._send_json(endpoint, 200, results[0])
+                else:
+                    self._send_json(endpoint, 200, {"results": results})
+
+        return Handler
+
+    def start(self) -> "ClassificationServer":
+        """Запустить сервер в фоновом потоке"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="service")
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Обслуживать запросы в текущем потоке"""
+        self._server.serve_forever()
+
+    def stop(self):
+        """Остановить сервер"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Stream Parser - Инкрементальный разбор JSON-массива из потока токенов модели
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import json
+import re
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+_SPECIAL_RE = re.compile(r'[{}"\\]')
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_INDEX_RE = re.compile(r'"?index"?\s*[:=]\s*(\d+)')
+_CATEGORY_RE = re.compile(r'"?category"?\s*[:=]\s*"([^"]*)"')
+_CONFIDENCE_RE = re.compile(r'"?confidence"?\s*[:=]\s*([0-9]*\.?[0-9]+)')
+
+
+def repair_element(raw: str) -> Optional[Dict[str, Any]]:
+    """Попробовать восстановить испорченный объект массива"""
+    # Частые ошибки модели: висячие запятые и одинарные кавычки
+    candidate = _TRAILING_COMMA_RE.sub(r"\1", raw)
+    try:
+        return json.loads(candidate)
+    except ValueError:
+        pass
+    try:
+        return json.loads(candidate.replace("'", '"'))
+    except ValueError:
+        pass
+
+    # Последний шанс - вытащить поля регулярными выражениями
+    category = _CATEGORY_RE.search(raw)
+    if category is None:
+        return None
+    element: Dict[str, Any] = {"category": category.group(1)}
+    index = _INDEX_RE.search(raw)
+    if index:
+        element["index"] = int(index.group(1))
+    confidence = _CONFIDENCE_RE.search(raw)
+    if confidence:
+        element["confidence"] = float(confidence.group(1))
+    return element
+
+
+class JsonArrayStreamParser:
+    """
+    Разбирает поток текста вида `[{...}, {...}]` по мере поступления.
+
+    Каждый объект верхнего уровня отдается сразу, как только закрывается его
+    фигурная скобка. Испорченный объект восстанавливается по отдельности
+    (repair_element) и не мешает разбору остальных. Текст вокруг массива
+    (рассуждения модели, markdown-ограждения) пропускается.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._offset = 0
+        self._start = 0
+        self.elements = 0
+        self.repaired = 0
+        self.failed: List[str] = []
+        # (начало, конец) каждого разобранного объекта в общем тексте
+        self.spans: List[Tuple[int, int]] = []
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Добавить кусок текста, вернуть завершенные объекты"""
+        completed = []
+        length = len(text)
+        pos = 0
+        segment = 0
+        if self._escape:
+            # Экранированный символ пришел первым в новом куске
+            self._escape = False
+            pos = 1
+
+        while pos < length:
+            if self._depth == 0:
+                pos = text.find("{", pos)
+                if pos == -1:
+                    break
+                self._depth = 1
+                self._buffer = []
+                self._start = self._offset + pos
+                segment = pos
+                pos += 1
+                continue
+
+            # Перескакиваем сразу к следующему значимому символу
+            match = _SPECIAL_RE.search(text, pos)
+            if match is None:
+                pos = length
+                break
+            char = match.group()
+            pos = match.end()
+
+            if self._in_string:
+                if char == '"':
+                    self._in_string = False
+                elif char == "\\":
+                    if pos < length:
+                        pos += 1
+                    else:
+                        self._escape = True
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._buffer.append(text[segment:pos])
+                    element = self._finish("".join(self._buffer))
+                    if element is not None:
+                        self.spans.append((self._start, self._offset + pos))
+                        completed.append(element)
+                    self._buffer = []
+
+        if self._depth > 0:
+            self._buffer.append(text[segment:])
+        self._offset += length
+        return completed
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Завершить поток: попытаться разобрать незакрытый хвост"""
+        if self._depth == 0:
+            return []
+        # Ответ оборвался (лимит токенов) - дописываем закрывающие символы
+        raw = "".join(self._buffer) + ('"' if self._in_string else "") + "}" * self._depth
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        element = self._finish(raw)
+        if element is None:
+            return []
+        self.spans.append((self._start, self._offset))
+        return [element]
+
+    def _finish(self, raw: str) -> Optional[Dict[str, Any]]:
+        """Разобрать один объект"""
+        try:
+            element = json.loads(raw)
+        except ValueError:
+            element = None
+        if element is None:
+            element = repair_element(raw)
+            if element is None:
+                self.failed.append(raw)
+                return None
+            self.repaired += 1
+        if not isinstance(element, dict):
+            self.failed.append(raw)
+            return None
+        self.elements += 1
+        return element
+
+
+_COMPACT_LINE_RE = re.compile(r"^\s*(\d+)\s*[:.)]\s*(\d+)\s*:\s*([0-9]*\.?[0-9]+)")
+
+
+class CompactLineParser:
+    """
+    Разбор компактного ответа батча: строка `индекс:номер_категории:уверенность`
+    на товар. Номер 0 - unknown, остальные - позиция в labels.
+    Интерфейс совпадает с JsonArrayStreamParser.
+    """
+
+    def __init__(self, labels: List[str]):
+        self.labels = labels
+        self._buffer = ""
+        self._offset = 0
+        self.elements = 0
+        self.repaired = 0
+        self.failed: List[str] = []
+        self.spans: List[Tuple[int, int]] = []
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Добавить кусок текста, вернуть разобранные полные строки"""
+        self._buffer += text
+        completed = []
+        while True:
+            newline = self._buffer.find("\n")
+            if newline == -1:
+                break
+            element = self._parse_line(self._buffer[:newline])
+            if element is not None:
+                completed.append(element)
+            self._offset += newline + 1
+            self._buffer = self._buffer[newline + 1:]
+        return completed
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Разобрать последнюю строку без перевода строки"""
+        line, self._buffer = self._buffer, ""
+        element = self._parse_line(line)
+        self._offset += len(line)
+        return [element] if element is not None else []
+
+    def _parse_line(self, line: str) -> Optional[Dict[str, Any]]:
+        if not line.strip():
+            return None
+        match = _COMPACT_LINE_RE.match(line)
+        if match is None:
+            self.failed.append(line)
+            return None
+        number = int(match.group(2))
+        category = self.labels[number] if number < len(self.labels) else str(number)
+        self.elements += 1
+        self.spans.append((self._offset, self._offset + len(line)))
+        return {
+            "index": int(match.group(1)),
+            "category": category,
+            "confidence": float(match.group(3)),
+        }
+
+
+_DECODER = json.JSONDecoder()
+
+
+def parse_elements(text: str) -> Tuple[List[Dict[str, Any]], List[Tuple[int, int]], int]:
+    """
+    Разобрать все объекты верхнего уровня в готовом тексте.
+    Возвращает объекты, их смещения и число исправленных объектов.
+
+    Корректные объекты читаются json.JSONDecoder.raw_decode (на C), начиная
+    с очередной '{'. На первом испорченном объекте остаток текста передается
+    посимвольному JsonArrayStreamParser с восстановлением.
+    """
+    elements: List[Dict[str, Any]] = []
+    spans: List[Tuple[int, int]] = []
+    pos = text.find("{")
+    while pos != -1:
+        try:
+            element, end = _DECODER.raw_decode(text, pos)
+        except ValueError:
+            break
+        if isinstance(element, dict):
+            elements.append(element)
+            spans.append((pos, end))
+        pos = text.find("{", end)
+    else:
+        return elements, spans, 0
+
+    parser = JsonArrayStreamParser()
+    rest = parser.feed(text[pos:]) + parser.close()
+    elements.extend(rest)
+    spans.extend((pos + start, pos + end) for start, end in parser.spans)
+    return elements, spans, parser.repaired
+
+
+def iter_array_elements(chunks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Отдавать объекты JSON-массива по мере поступления кусков текста"""
+    parser = JsonArrayStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Validator - Проверка товаров на соответствие поисковому запросу
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from backends import BackendError, BackendTimeout
+from response_mapping import ResponseMapping
+from rules import DEFAULT_RULES_PATH
+from schema import validation_schema
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BRANDS_PATH = Path(__file__).parent.parent / "data" / "brands.json"
+
+_NUMBER_RE = re.compile(r"\d+")
+_WORD_RE = re.compile(r"\w*[^\W\d_]\w*")
+
+REASON_ACCESSORY = "Аксессуар, а не сам товар"
+REASON_BRAND = "Другой бренд"
+REASON_MODEL = "Другая модель"
+
+# Неизменная часть промпта идет первой - Ollama переиспользует ее KV-кэш
+VALIDATION_INSTRUCTIONS = """
+Проверь каждый товар - подходит ли он под запрос пользователя?
+Валидными считаются только сами товары из запроса, аксессуары и другие модели - невалидны.
+
+Ответ в формате JSON:
+{
+  "query": "запрос пользователя",
+  "results": [
+    {
+      "index": 1,
+      "product_name": "название товара",
+      "is_valid": true/false,
+      "reason": "обоснование"
+    }
+  ]
+}
+""".strip()
+
+
+def _number_bits(text: str) -> int:
+    """Битовая маска чисел текста (номера моделей, объемы памяти)"""
+    bits = 0
+    for number in _NUMBER_RE.findall(text):
+        bits |= 1 << (zlib.crc32(number.lstrip("0").encode() or b"0") % 64)
+    return bits
+
+
+def _word_bits(text: str) -> int:
+    """Битовая маска слов с буквами (название товара из запроса: playstation, iphone)"""
+    bits = 0
+    for word in _WORD_RE.findall(text.lower()):
+        bits |= 1 << (zlib.crc32(word.encode()) % 64)
+    return bits
+
+
+def _is_valid(value: Any) -> bool:
+    """Вердикт модели: bool или строка 'true'/'да'"""
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "да", "yes", "1")
+    return bool(value)
+
+
+class QueryValidator:
+    """
+    Проверка пар (запрос, товар) с предварительным отсевом без модели.
+
+    Для каждого уникального запроса и товара один раз считаются признаки:
+    маска брендов, признак аксессуара и битовая маска чисел из названия.
+    Затем все пары проверяются разом операциями над массивами numpy: товар
+    отсеивается, если он аксессуар к неаксессуарному запросу и в его названии
+    нет ни одного слова запроса (комплект "PlayStation 5 + DualSense" решает
+    модель), если бренды
+    запроса и товара не пересекаются или в товаре нет числа из запроса
+    ("playstation 5" против "PlayStation VR2"). Маски слов и чисел - фильтры Блума,
+    поэтому отсев не ошибается в сторону "невалиден". Остальные пары
+    группируются по запросу и уходят модели батчами.
+    """
+
+    def __init__(self, classifier, batch_size: int = 20, prefilter: bool = True,
+                 brands_path: Optional[str] = None, rules_path: Optional[str] = None,
+                 timeout: float = 300):
+        """
+        classifier: ProductClassifier - его бэкенд, модель и число параллельных запросов
+        batch_size: товаров одного запроса в одном промпте
+        """
+        self.classifier = classifier
+        self.batch_size = batch_size
+        self.use_prefilter = prefilter
+        self.timeout = timeout
+
+        with open(brands_path or DEFAULT_BRANDS_PATH, 'r', encoding='utf-8') as f:
+            brands = json.load(f)["brands"]
+        self.brands = list(brands)
+        self._brand_re = re.compile("|".join(
+            f"(?P<b{i}>\\b(?:{'|'.join(patterns)})\\b)" for i, patterns in enumerate(brands.values())
+        ), re.IGNORECASE)
+
+        # Аксессуары - те же шаблоны, что снижают уверенность правил
+        with open(rules_path or DEFAULT_RULES_PATH, 'r', encoding='utf-8') as f:
+            penalties = json.load(f).get("penalties", [])
+        self._accessory_re = re.compile(
+            "|".join(f"(?:{penalty['pattern']})" for penalty in penalties) or "(?!)", re.IGNORECASE
+        )
+
+        self._lock = threading.Lock()
+        self.stats = {"pairs": 0, "prefiltered": 0, "model_pairs": 0, "model_requests": 0, "errors": 0}
+
+    def _brand_bits(self, text: str) -> int:
+        """Битовая маска брендов, упомянутых в тексте"""
+        bits = 0
+        for match in self._brand_re.finditer(text):
+            bits |= 1 << int(match.lastgroup[1:])
+        return bits
+
+    def _query_features(self, query: str) -> Tuple[int, bool, int, int]:
+        return self._brand_bits(query), bool(self._accessory_re.search(query)), _number_bits(query), \
+            _word_bits(query)
+
+    def _product_features(self, product: Dict[str, str]) -> Tuple[int, bool, int, int]:
+        name = product.get("name", "")
+        text = f"{name} {product.get('description', '')}"
+        # Бренд - по названию, описание только если в названии бренда нет
+        brands = self._brand_bits(name) or self._brand_bits(text)
+        return brands, bool(self._accessory_re.search(name)), _number_bits(text), _word_bits(name)
+
+    def prefilter(self, pairs: List[Tuple[str, Dict[str, str]]]) -> List[Optional[str]]:
+        """Причина отказа для явно неподходящих пар, None - решать модели"""
+        if not pairs:
+            return []
+
+        query_rows: Dict[str, int] = {}
+        product_rows: Dict[Tuple[str, str], int] = {}
+        query_features, product_features = [], []
+        query_index = np.empty(len(pairs), dtype=np.int64)
+        product_index = np.empty(len(pairs), dtype=np.int64)
+        for i, (query, product) in enumerate(pairs):
+            row = query_rows.get(query)
+            if row is None:
+                row = query_rows[query] = len(query_features)
+                query_features.append(self._query_features(query))
+            query_index[i] = row
+
+            key = (product.get("name", ""), product.get("description", ""))
+            row = product_rows.get(key)
+            if row is None:
+                row = product_rows[key] = len(product_features)
+                product_features.append(self._product_features(product))
+            product_index[i] = row
+
+        dtypes = (np.uint64, bool, np.uint64, np.uint64)
+        q_brand, q_accessory, q_numbers, q_words = (np.array(column, dtype=dtype)[query_index] for column, dtype
+                                                    in zip(zip(*query_features), dtypes))
+        p_brand, p_accessory, p_numbers, p_words = (np.array(column, dtype=dtype)[product_index] for column, dtype
+                                                    in zip(zip(*product_features), dtypes))
+
+        # Аксессуар с товаром из запроса в названии может быть комплектом - его решает модель
+        accessory = p_accessory & ~q_accessory & ((q_words & p_words) == 0)
+        brand = (q_brand != 0) & (p_brand != 0) & ((q_brand & p_brand) == 0)
+        model = (q_numbers & ~p_numbers) != 0
+
+        reasons = np.select([accessory, brand, model], [1, 2, 3], default=0)
+        labels = (None, REASON_ACCESSORY, REASON_BRAND, REASON_MODEL)
+        return [labels[reason] for reason in reasons.tolist()]
+
+    def validate(self, pairs: Iterable[Tuple[str, Dict[str, str]]]) -> List[Dict[str, Any]]:
+        """Вердикты для пар (запрос, товар) в том же порядке"""
+        pairs = list(pairs)
+        start_time = time.time()
+        reasons = self.prefilter(pairs) if self.use_prefilter else [None] * len(pairs)
+        prefilter_time = (time.time() - start_time) / len(pairs) if pairs else 0.0
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(pairs)
+        groups: Dict[str, List[int]] = {}
+        for i, ((query, product), reason) in enumerate(zip(pairs, reasons)):
+            if reason is None:
+                groups.setdefault(query, []).append(i)
+                continue
+            results[i] = {
+                "query": query,
+                "product_name": product.get("name", ""),
+                "is_valid": False,
+                "reason": reason,
+                "method": "prefilter",
+                "processing_time": prefilter_time
+            }
+
+        batches = [
+            (query, positions[start:start + self.batch_size])
+            for query, positions in groups.items()
+            for start in range(0, len(positions), self.batch_size)
+        ]
+        prefiltered = len(pairs) - sum(len(positions) for positions in groups.values())
+        logger.info(f"🔍 Валидация: {len(pairs)} пар, отсеяно без модели {prefiltered}, "
+                    f"запросов к модели {len(batches)}")
+
+        def run(batch):
+            query, positions = batch
+            return positions, self._validate_batch(query, [pairs[i][1] for i in positions])
+
+        workers = max(1, min(self.classifier.max_concurrency, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="validate") as executor:
+            for positions, verdicts in executor.map(run, batches):
+                for i, verdict in zip(positions, verdicts):
+                    results[i] = verdict
+
+        self._count(pairs=len(pairs), prefiltered=prefiltered,
+                    model_pairs=len(pairs) - prefiltered, model_requests=len(batches))
+        return results
+
+    def validate_query(self, query: str, products: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """Проверить список товаров по одному запросу"""
+        return self.validate([(query, product) for product in products])
+
+    def _validate_batch(self, query: str, products: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """Проверить товары одного запроса одним промптом"""
+        prompt = self._create_prompt(query, products)
+        format = validation_schema() if self.classifier.structured_output else None
+        start_time = time.time()
+        try:
+            reply = self.classifier.backend.generate(
+                self.classifier.model_name, prompt, timeout=self.timeout, format=format
+            )
+        except BackendTimeout:
+            self._count(errors=1)
+            return [{"error": "Таймаут при валидации"}] * len(products)
+        except BackendError as e:
+            self._count(errors=1)
+            return [{"error": f"Ошибка модели: {e}"}] * len(products)
+        self.classifier.record_eval("validate", reply)
+
+        elapsed_time = time.time() - start_time
+        return self._parse_response(reply.get("response", "").strip(), query, products, elapsed_time)
+
+    def _create_prompt(self, query: str, products: List[Dict[str, str]]) -> str:
+        """Промпт проверки товаров по запросу: инструкция - общий префикс, запрос и товары - в конце"""
+        products_text = ""
+        for i, product in enumerate(products, 1):
+            products_text += f"""
+{i}. {product.get('name', '')}
+   Описание: {product.get('description', '')}
+"""
+
+        prompt = f"""
+{VALIDATION_INSTRUCTIONS}
+
+Запрос пользователя: "{query}"
+
+Товары:
+{products_text}
+"""
+        return prompt.strip()
+
+    def _parse_response(self, response: str, query: str, products: List[Dict[str, str]],
+                        elapsed_time: float) -> List[Dict[str, Any]]:
+        """Разобрать ответ модели: индекс строится за один проход, по index и по названию"""
+        mapping = ResponseMapping.from_text(
+            response, len(products), names=[product.get("name", "") for product in products]
+        )
+        if not mapping.elements:
+            return [{"error": "Не удалось распарсить ответ"}] * len(products)
+
+        results = []
+        for i, product in enumerate(products):
+            verdict = mapping.get(i)
+            results.append({
+                "query": query,
+                "product_name": product.get("name", ""),
+                "is_valid": _is_valid(verdict.get("is_valid", False)) if verdict else False,
+                "reason": verdict.get("reason", "") if verdict else "Не найден в ответе",
+                "method": "ollama",
+                "processing_time": elapsed_time / len(products)
+            })
+        return results
+
+    def _count(self, **counts: int):
+        """Обновить счетчики"""
+        with self._lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика валидации"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["prefilter_rate"] = stats["prefiltered"] / stats["pairs"] if stats["pairs"] else 0.0
+        return stats
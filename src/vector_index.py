@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Vector Index - Классификация ближайшими соседями по эмбеддингам товаров
+by Morzh - Проект создан для развития валидатора товаров электроники
+"""
+
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+import numpy as np
+
+from backends import InferenceBackend
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXAMPLES_PATH = Path(__file__).parent.parent / "data" / "training_examples.json"
+DEFAULT_INDEX_PATH = Path(__file__).parent.parent / ".cache" / "vector_index"
+DEFAULT_EMBED_MODEL = "nomic-embed-text"
+
+
+def product_text(product: Dict[str, str]) -> str:
+    """Текст товара для эмбеддинга: название и описание"""
+    return f"{product.get('name', '')} {product.get('description', '')}".strip()
+
+
+def load_examples(path: Union[str, Path, None] = None) -> List[Tuple[str, str]]:
+    """Пары (товар, категория) из примеров для дообучения"""
+    with open(path or DEFAULT_EXAMPLES_PATH, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    examples = []
+    for item in data:
+        try:
+            category = json.loads(item["output"])["category"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        examples.append((item["input"], category))
+    return examples
+
+
+class VectorIndex:
+    """
+    Нормированные векторы с метками в одном массиве float32.
+
+    Поиск - одно матричное умножение на весь батч запросов. Массив растет
+    удвоением, поэтому добавление по одному примеру амортизированно дешевое.
+    Сохраняется в каталог (vectors.npy + labels.json), при загрузке векторы
+    отображаются в память и копируются только при первом добавлении.
+    """
+
+    def __init__(self, dim: Optional[int] = None, capacity: int = 1024):
+        self.dim = dim
+        self._vectors = np.empty((capacity, dim), dtype=np.float32) if dim else None
+        self._label_ids = np.empty(capacity, dtype=np.int32)
+        self.labels: List[str] = []
+        self.texts: List[str] = []
+        self.size = 0
+        # Произвольные сведения об индексе (например, модель эмбеддингов)
+        self.meta: Dict[str, Any] = {}
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _reserve(self, count: int):
+        """Обеспечить место под count новых векторов"""
+        capacity = 0 if self._vectors is None else len(self._vectors)
+        needed = self.size + count
+        if needed <= capacity and self._vectors.flags.writeable:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        vectors = np.empty((new_capacity, self.dim), dtype=np.float32)
+        label_ids = np.empty(new_capacity, dtype=np.int32)
+        if self.size:
+            vectors[:self.size] = self._vectors[:self.size]
+            label_ids[:self.size] = self._label_ids[:self.size]
+        self._vectors, self._label_ids = vectors, label_ids
+
+    def add(self, vectors: Any, categories: List[str], texts: Optional[List[str]] = None):
+        """Добавить примеры с категориями"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(categories):
+            raise ValueError("Ожидалась матрица векторов по одному на категорию")
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Размерность {vectors.shape[1]} вместо {self.dim}")
+
+        self._reserve(len(vectors))
+        positions = {label: i for i, label in enumerate(self.labels)}
+        ids = []
+        for category in categories:
+            if category not in positions:
+                positions[category] = len(self.labels)
+                self.labels.append(category)
+            ids.append(positions[category])
+
+        end = self.size + len(vectors)
+        self._vectors[self.size:end] = self._normalize(vectors)
+        self._label_ids[self.size:end] = ids
+        self.texts.extend(texts or [""] * len(vectors))
+        self.size = end
+
+    def search(self, queries: Any, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """Косинусная близость и номера k ближайших примеров для каждого запроса"""
+        queries = self._normalize(np.asarray(queries, dtype=np.float32))
+        k = min(k, self.size)
+        similarities = queries @ self._vectors[:self.size].T
+        if k < self.size:
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(self.size), (len(queries), self.size))
+        top_similarities = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_similarities, axis=1)
+        return np.take_along_axis(top_similarities, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+    def classify(self, queries: Any, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Категория голосованием k соседей, взвешенным близостью.
+        margin - разрыв между ближайшим соседом и ближайшим соседом другой
+        категории: чем он меньше, тем спорнее ответ.
+        """
+        if self.size == 0:
+            return [{"category": "unknown", "confidence": 0.0, "similarity": 0.0, "margin": 0.0}
+                    for _ in range(len(queries))]
+
+        similarities, neighbors = self.search(queries, k)
+        label_ids = self._label_ids[neighbors]
+        same = label_ids == label_ids[:, :1]
+        weights = np.clip(similarities, 0, None)
+        total = weights.sum(axis=1)
+        confidence = np.where(total > 0, (weights * same).sum(axis=1) / np.maximum(total, 1e-12), 0.0)
+        second = np.where(same, -1.0, similarities).max(axis=1)
+        margin = similarities[:, 0] - np.maximum(second, 0.0)
+
+        return [
+            {
+                "category": self.labels[label_ids[row, 0]],
+                "confidence": float(confidence[row]),
+                "similarity": float(similarities[row, 0]),
+                "margin": float(margin[row]),
+                "neighbor": self.texts[neighbors[row, 0]],
+            }
+            for row in range(len(similarities))
+        ]
+
+    def save(self, path: Union[str, Path]):
+        """Сохранить индекс в каталог"""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        vectors = path / "vectors.tmp.npy"
+        np.save(vectors, np.ascontiguousarray(self._vectors[:self.size]))
+        labels = path / "labels.tmp.json"
+        with open(labels, 'w', encoding='utf-8') as f:
+            json.dump({
+                "labels": self.labels,
+                "label_ids": self._label_ids[:self.size].tolist(),
+                "texts": self.texts,
+                "meta": self.meta,
+            }, f, ensure_ascii=False)
+        # Индекс только растет: метки заменяются первыми, и при сбое между заменами
+        # новых меток не меньше, чем векторов - load читает по числу векторов
+        labels.replace(path / "labels.json")
+        vectors.replace(path / "vectors.npy")
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "VectorIndex":
+        """Загрузить индекс; векторы отображаются в память без чтения файла целиком"""
+        path = Path(path)
+        vectors = np.load(path / "vectors.npy", mmap_mode="r" if mmap else None)
+        with open(path / "labels.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        index = cls(capacity=0)
+        index.dim = vectors.shape[1]
+        index._vectors = vectors
+        # Меток может быть больше, если сохранение прервалось между заменами файлов
+        index.size = min(len(vectors), len(meta["label_ids"]))
+        index._label_ids = np.asarray(meta["label_ids"][:index.size], dtype=np.int32)
+        index.labels = meta["labels"]
+        index.texts = meta["texts"][:index.size]
+        index.meta = meta.get("meta", {})
+        return index
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class EmbeddingKNN:
+    """
+    Классификатор ближайшими соседями: эмбеддинги через бэкенд Ollama
+    (/api/embed), поиск по VectorIndex. Результат с малым margin или низкой
+    близостью не возвращается - такой товар остается модели.
+    """
+
+    def __init__(self, backend: InferenceBackend, model: str = DEFAULT_EMBED_MODEL,
+                 index: Optional[VectorIndex] = None, path: Union[str, Path, None] = None,
+                 k: int = 5, min_margin: float = 0.15, min_similarity: float = 0.5,
+                 batch_size: int = 64, timeout: float = 60):
+        self.backend = backend
+        self.model = model
+        self.path = Path(path) if path else None
+        self.index = index if index is not None else VectorIndex()
+        self.index.meta.setdefault("model", model)
+        self.k = k
+        self.min_margin = min_margin
+        self.min_similarity = min_similarity
+        self.batch_size = batch_size
+        self.timeout = timeout
+        # Примеры для первоначального наполнения - эмбеддинги считаются при первом обращении
+        self._seed: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+        self.dirty = False
+
+    @classmethod
+    def open(cls, backend: InferenceBackend, path: Union[str, Path, None] = None,
+             examples: Union[str, Path, None] = None, **kwargs) -> "EmbeddingKNN":
+        """Загрузить индекс из каталога или собрать его из примеров для дообучения"""
+        path = Path(path or DEFAULT_INDEX_PATH)
+        knn = cls(backend, path=path, **kwargs)
+        if (path / "vectors.npy").exists():
+            index = VectorIndex.load(path)
+            if index.meta.get("model") == knn.model:
+                knn.index = index
+                return knn
+            logger.warning(f"⚠️ Индекс {path} построен другой моделью эмбеддингов, собираем заново")
+
+        knn._seed = load_examples(examples)
+        return knn
+
+    def _ensure_seeded(self):
+        """Наполнить пустой индекс примерами для дообучения"""
+        if not self._seed:
+            return
+        with self._lock:
+            if not self._seed:
+                return
+            products = [{"name": text} for text, _ in self._seed]
+            self.index.add(self.embed(products), [category for _, category in self._seed],
+                           [product_text(p) for p in products])
+            pairs, self._seed = self._seed, []
+            self.dirty = True
+        logger.info(f"🧭 Индекс соседей собран из {len(pairs)} примеров")
+
+    def embed(self, products: List[Dict[str, str]]) -> np.ndarray:
+        """Эмбеддинги товаров пачками по batch_size"""
+        texts = [product_text(product) for product in products]
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self.backend.embed(self.model, texts[start:start + self.batch_size],
+                                              timeout=self.timeout))
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+
+    def add(self, products: List[Dict[str, str]], categories: List[str]):
+        """Добавить размеченные товары (например, исправления) в индекс"""
+        if not products:
+            return
+        self._ensure_seeded()
+        vectors = self.embed(products)
+        with self._lock:
+            self.index.add(vectors, categories, [product_text(p) for p in products])
+            self.dirty = True
+
+    def classify(self, products: List[Dict[str, str]]) -> List[Optional[Dict[str, Any]]]:
+        """Категории уверенных товаров; None - решать моделью"""
+        self._ensure_seeded()
+        if not products or len(self.index) == 0:
+            return [None] * len(products)
+        vectors = self.embed(products)
+        with self._lock:
+            matches = self.index.classify(vectors, k=self.k)
+        results = []
+        for match in matches:
+            confident = match["margin"] >= self.min_margin and match["similarity"] >= self.min_similarity
+            results.append(match if confident else None)
+        return results
+
+    def save(self, path: Union[str, Path, None] = None):
+        """Сохранить индекс (по умолчанию туда, откуда он загружен)"""
+        with self._lock:
+            if len(self.index) == 0:
+                return
+            self.index.save(path or self.path or DEFAULT_INDEX_PATH)
+            self.dirty = False
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Тесты бэкендов инференса на заглушке Ollama
+by Morzh - Проект создан для развития валидатора товаров электроники
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import json
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "src"))
+
+from backends import BackendError, BackendHTTPError, HTTPBackend, SubprocessBackend
+from ollama_stub import OllamaStubServer
+
+MODEL = "t-pro-it-2.0-optimized"
+
+# `ollama run/list`, которые ходят в заглушку по адресу из OLLAMA_STUB_URL
+FAKE_OLLAMA = """#!{python}
+import json, os, sys, urllib.request
+
+url = os.environ["OLLAMA_STUB_URL"]
+args = sys.argv[1:]
+if args[0] == "list":
+    with urllib.request.urlopen(url + "/api/tags") as response:
+        models = json.load(response)["models"]
+    print("NAME ID SIZE MODIFIED")
+    for model in models:
+        print(model["name"], "0", "0", "now")
+    sys.exit(0)
+if args[0] == "run":
+    payload = {{"model": args[1], "prompt": args[-1], "stream": False}}
+    if "--format" in args:
+        payload["format"] = "json"
+    request = urllib.request.Request(url + "/api/generate", json.dumps(payload).encode(),
+                                     {{"Content-Type": "application/json"}})
+    try:
+        with urllib.request.urlopen(request) as response:
+            print(json.load(response)["response"])
+    except urllib.error.HTTPError as e:
+        print(json.load(e).get("error", ""), file=sys.stderr)
+        sys.exit(1)
+    sys.exit(0)
+sys.exit(2)
+"""
+
+
+def failing_responder(prompt, payload):
+    """Ответ заглушки: сбой модели на промптах со словом "сбой" """
+    if "сбой" in prompt:
+        raise RuntimeError("model runner crashed")
+    return json.dumps({"category": "iphone", "confidence": 0.9, "reasoning": "stub"})
+
+
+class HTTPBackendTest(unittest.TestCase):
+    """HTTPBackend: generate, chat и embed через Ollama API заглушки"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = OllamaStubServer(responder=failing_responder).start()
+        cls.backend = HTTPBackend(cls.stub.url, keep_alive="1m")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.backend.close()
+        cls.stub.stop()
+
+    def test_generate(self):
+        reply = self.backend.generate(MODEL, "Товар: iPhone 15", timeout=10, options={"num_predict": 64})
+        self.assertEqual(json.loads(reply["response"])["category"], "iphone")
+        self.assertIn("prompt_eval_count", reply)
+        request = self.stub.requests[-1]
+        self.assertEqual(request["path"], "/api/generate")
+        self.assertEqual(request["payload"]["keep_alive"], "1m")
+        self.assertEqual(request["payload"]["options"], {"num_predict": 64})
+
+    def test_chat(self):
+        reply = self.backend.chat(MODEL, [{"role": "user", "content": "Товар: iPhone 15"}], timeout=10)
+        self.assertEqual(json.loads(reply["response"])["category"], "iphone")
+        self.assertEqual(self.stub.requests[-1]["path"], "/api/chat")
+
+    def test_embed(self):
+        vectors = self.backend.embed("nomic-embed-text", ["iPhone 15", "RTX 4090"], timeout=10)
+        self.assertEqual(len(vectors), 2)
+        self.assertNotEqual(vectors[0], vectors[1])
+
+    def test_connection_reused(self):
+        before = self.stub.connections
+        for _ in range(3):
+            self.backend.generate(MODEL, "Товар: iPhone 15", timeout=10)
+        self.assertLessEqual(self.stub.connections - before, 1)
+
+    def test_server_error(self):
+        with self.assertRaises(BackendHTTPError) as context:
+            self.backend.generate(MODEL, "Товар: сбой", timeout=10)
+        self.assertEqual(context.exception.status, 500)
+        self.assertIn("crashed", str(context.exception))
+
+    def test_unknown_model(self):
+        with self.assertRaises(BackendHTTPError) as context:
+            self.backend.generate("no-such-model", "Товар: iPhone 15", timeout=10)
+        self.assertEqual(context.exception.status, 404)
+
+
+@unittest.skipIf(sys.platform == "win32", "исполняемый скрипт вместо ollama нужен POSIX")
+class SubprocessBackendTest(unittest.TestCase):
+    """SubprocessBackend: тот же сценарий через `ollama run`, который ходит в заглушку"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = OllamaStubServer(responder=failing_responder).start()
+        cls.directory = tempfile.TemporaryDirectory()
+        executable = Path(cls.directory.name) / "ollama"
+        executable.write_text(FAKE_OLLAMA.format(python=sys.executable), encoding='utf-8')
+        executable.chmod(executable.stat().st_mode | stat.S_IXUSR)
+        os.environ["OLLAMA_STUB_URL"] = cls.stub.url
+        cls.backend = SubprocessBackend(str(executable))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+        cls.directory.cleanup()
+        os.environ.pop("OLLAMA_STUB_URL", None)
+
+    def test_generate(self):
+        reply = self.backend.generate(MODEL, "Товар: iPhone 15", timeout=30, format="json")
+        self.assertEqual(json.loads(reply["response"])["category"], "iphone")
+        self.assertEqual(self.stub.requests[-1]["payload"]["format"], "json")
+
+    def test_chat(self):
+        messages = [{"role": "system", "content": "Классификатор"}, {"role": "user", "content": "Товар: iPhone 15"}]
+        reply = self.backend.chat(MODEL, messages, timeout=30)
+        self.assertEqual(json.loads(reply["response"])["category"], "iphone")
+        self.assertTrue(self.stub.requests[-1]["payload"]["prompt"].startswith("Классификатор"))
+
+    def test_embed_unsupported(self):
+        with self.assertRaises(BackendError):
+            self.backend.embed("nomic-embed-text", ["iPhone 15"])
+
+    def test_list_models(self):
+        self.assertTrue(self.backend.has_model(MODEL))
+
+    def test_server_error(self):
+        with self.assertRaises(BackendError) as context:
+            self.backend.generate(MODEL, "Товар: сбой", timeout=30)
+        self.assertIn("crashed", str(context.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()